@@ -0,0 +1,253 @@
+import asyncio
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a request or stage cannot be admitted within the wait budget."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _Limiter:
+    """Counting semaphore that tracks queue depth, wait time and service time."""
+
+    def __init__(self, name, capacity, max_waiting, wait_budget):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_waiting = max_waiting
+        self.wait_budget = wait_budget
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._ewma_service = None
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def estimated_wait(self):
+        """Rough time until a newly queued caller gets a slot."""
+        if self._active < self.capacity:
+            return 0.0
+        if self._ewma_service is None:
+            return 0.0  # no history yet; the wait itself is still bounded by the budget
+        return (self._waiting + 1) / self.capacity * self._ewma_service
+
+    def acquire(self):
+        with self._cond:
+            estimate = self.estimated_wait()
+            if self._active >= self.capacity and (
+                    self._waiting >= self.max_waiting or estimate > self.wait_budget):
+                self.rejected += 1
+                raise Overloaded(f"{self.name} queue full", retry_after=estimate or 1)
+
+            start = time.monotonic()
+            deadline = start + self.wait_budget
+            self._waiting += 1
+            try:
+                while self._active >= self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Overloaded(f"{self.name} wait budget exceeded",
+                                         retry_after=self.estimated_wait())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._active += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            return time.monotonic()
+
+    def release(self, started):
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._active -= 1
+            if self._ewma_service is None:
+                self._ewma_service = elapsed
+            else:
+                self._ewma_service = 0.8 * self._ewma_service + 0.2 * elapsed
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        started = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+                "max_wait_seconds": round(self.max_wait, 4),
+                "ewma_service_seconds": round(self._ewma_service, 4) if self._ewma_service else None,
+            }
+
+
+class _AsyncLimiter(_Limiter):
+    """_Limiter for coroutines: waiting suspends the task instead of blocking a thread."""
+
+    def __init__(self, name, capacity, max_waiting, wait_budget):
+        super().__init__(name, capacity, max_waiting, wait_budget)
+        self._semaphore = None  # bound to the running loop on first use
+
+    async def acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.capacity)
+        estimate = self.estimated_wait()
+        if self._active >= self.capacity and (
+                self._waiting >= self.max_waiting or estimate > self.wait_budget):
+            self.rejected += 1
+            raise Overloaded(f"{self.name} queue full", retry_after=estimate or 1)
+
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait_budget)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"{self.name} wait budget exceeded", retry_after=self.estimated_wait())
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - start
+        self._active += 1
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return time.monotonic()
+
+    def release(self, started):
+        elapsed = time.monotonic() - started
+        self._active -= 1
+        if self._ewma_service is None:
+            self._ewma_service = elapsed
+        else:
+            self._ewma_service = 0.8 * self._ewma_service + 0.2 * elapsed
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        started = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+
+class AdmissionController:
+    """
+    Bounded admission for whole requests plus per-stage concurrency budgets.
+
+    - requests: how many verifications run at once in this worker
+    - cpu: OCR and face detection, sized to the core count
+    - llm: concurrent OpenRouter calls, sized to the provider rate limit
+
+    The request queue only sees load the server hands over: under gunicorn's
+    gthread worker, --threads must be ADMISSION_MAX_INFLIGHT plus the queue
+    (render.yaml runs 12 threads for 2 in flight and 10 queued). With no more
+    threads than in-flight slots, excess requests wait in gunicorn's backlog,
+    where they are never shed with a 429.
+    """
+
+    limiter_class = _Limiter
+
+    def __init__(self, max_inflight, max_queue, wait_budget, cpu_slots, llm_slots):
+        self.wait_budget = wait_budget
+        self.stages = {
+            "requests": self.limiter_class("requests", max_inflight, max_queue, wait_budget),
+            "cpu": self.limiter_class("cpu", cpu_slots, max_queue, wait_budget),
+            "llm": self.limiter_class("llm", llm_slots, max_queue, wait_budget),
+        }
+
+    @classmethod
+    def from_env(cls):
+        cores = os.cpu_count() or 1
+        return cls(
+            max_inflight=_env_int("ADMISSION_MAX_INFLIGHT", 8),
+            max_queue=_env_int("ADMISSION_MAX_QUEUE", 16),
+            wait_budget=_env_float("ADMISSION_WAIT_BUDGET", 20.0),
+            cpu_slots=_env_int("CPU_STAGE_CONCURRENCY", cores),
+            llm_slots=_env_int("LLM_MAX_CONCURRENCY", 4),
+        )
+
+    def stage(self, name):
+        """Context manager holding one slot of the named stage budget."""
+        return self.stages[name].slot()
+
+    def guard(self, view):
+        """Decorator admitting a Flask view through the request queue."""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.stage("requests"):
+                return view(*args, **kwargs)
+        return wrapper
+
+    def metrics(self):
+        return {name: limiter.metrics() for name, limiter in self.stages.items()}
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    The same budgets for the asyncio service, where stage() is an async
+    context manager. Requests waiting on I/O hold no thread, so the request
+    budget can be far larger than the threaded server's.
+    """
+
+    limiter_class = _AsyncLimiter
+
+    @classmethod
+    def from_env(cls):
+        cores = os.cpu_count() or 1
+        return cls(
+            max_inflight=_env_int("ASYNC_MAX_INFLIGHT", 256),
+            max_queue=_env_int("ASYNC_MAX_QUEUE", 512),
+            wait_budget=_env_float("ADMISSION_WAIT_BUDGET", 20.0),
+            cpu_slots=_env_int("CPU_STAGE_CONCURRENCY", cores),
+            llm_slots=_env_int("LLM_MAX_CONCURRENCY", 4),
+        )
+
+    def guard(self, view):
+        """Decorator admitting an async view through the request queue."""
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            async with self.stage("requests"):
+                return await view(*args, **kwargs)
+        return wrapper
+
+
+admission = AdmissionController.from_env()
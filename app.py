@@ -1,19 +1,30 @@
-from flask import Flask, request, jsonify
-from werkzeug.utils import secure_filename
-import base64, cv2, io
+from flask import Flask, request, jsonify, send_file
+import io, os, time
 from extract_agent import ExtractionAgent
 from compare_agent import DocumentComparator
 from firebase_service import FirebaseService
-from face_comparator import compare_faces
+from face_matcher import match_face, FACE_MATCH_PRIOR, FACE_MATCH_MAX_PRIOR
 from flask_cors import CORS
 import logging
 from doc_validator import DocumentValidator
-from PIL import Image
-import numpy as np
+from batch_validator import validate_request, BatchTooLarge
+from admission import admission, Overloaded
+from llm_backends import pool as llm_pool, verification_deadline, DeadlineExceeded
+from local_llm import batcher as llm_batcher
+from personal_details import normalize_personal_details
+from document_context import DocumentContext
+from document_reader import PageBudgetExceeded, PoorImageQuality
+from stage_graph import StageGraph
+from pipeline_planner import plan_request, costs as stage_costs
+import request_profiler
+from verification_store import store as verification_store, authorized as verification_authorized
+from shared_cache import cache as shared_cache
+from response_builder import allowed_file, build_verification_response, convert_ndarray_to_list, matched_document_face
+from structured_logging import setup_logging, bind_request_id, current_request_id, log_payload
 
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -21,50 +32,138 @@ CORS(app)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB limit
-ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+VERIFICATION_DEADLINE = float(os.environ.get('VERIFICATION_DEADLINE', 120))
 
 
 # Initialize services
 firebase_service = FirebaseService()
 extraction_agent = ExtractionAgent()
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def image_bytes_to_base64(image_bytes):
-    """Convert image bytes (JPEG/PNG) to base64 string"""
+@app.before_request
+def assign_request_id():
+    bind_request_id(request.headers.get('X-Request-ID'))
+
+
+@app.after_request
+def echo_request_id(response):
+    response.headers['X-Request-ID'] = current_request_id()
+    return response
+
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    logger.warning("Rejecting request under load: %s", e)
+    response = jsonify({'error': 'Server busy, retry later', 'details': str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline(e):
+    logger.warning("Verification deadline exceeded: %s", e)
+    return jsonify({'error': 'Verification timed out', 'details': str(e)}), 504
+
+
+@app.errorhandler(PageBudgetExceeded)
+def handle_page_budget(e):
+    logger.warning("Document rejected by page budget: %s", e)
+    return jsonify({'error': 'Document too large to process', 'details': str(e)}), 413
+
+
+@app.errorhandler(PoorImageQuality)
+def handle_poor_quality(e):
+    logger.info("Photo rejected by quality gate: %s", e, extra={"quality": e.metrics})
+    return jsonify({'error': 'Image quality too low', 'reasons': e.reasons, 'metrics': e.metrics}), 422
+
+
+# === REQUEST STAGES ===
+def analyze_document(doc_ctx, plan=None):
+    """OCR and the planned face/signature detection; None when the document cannot be processed."""
     try:
-        img_np = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
-        if img_np is None:
-            logger.error("Failed to decode image bytes for base64 conversion")
-            return None
-        _, buffer = cv2.imencode('.jpg', img_np)
-        return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+        analysis = extraction_agent.analyze_shared(doc_ctx, plan)
+        if plan is not None:
+            plan.observe_analysis(analysis[0]["pipeline_stats"])
+        return analysis
+    except (Overloaded, DeadlineExceeded, PageBudgetExceeded, PoorImageQuality):
+        raise
     except Exception as e:
-        logger.error(f"Error converting image bytes to base64: {str(e)}")
+        logger.error("Document processing failed: %s", e)
         return None
-def bytes_to_base64_in_dict(d):
-    if isinstance(d, dict):
-        return {k: bytes_to_base64_in_dict(v) for k, v in d.items()}
-    elif isinstance(d, list):
-        return [bytes_to_base64_in_dict(i) for i in d]
-    elif isinstance(d, bytes):
-        return base64.b64encode(d).decode('utf-8')
-    else:
-        return d
-    
-def convert_ndarray_to_list(obj):
-    if isinstance(obj, dict):
-        return {k: convert_ndarray_to_list(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_ndarray_to_list(i) for i in obj]
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
+
+
+def extract_details(analysis, profile_data, doc_type, plan):
+    """LLM extraction of the planned fields; skipped when there is no text or nothing to verify against."""
+    if analysis is None or not profile_data:
+        return None
+    extracted_data, text = analysis
+    if plan.needs_llm(profile_data):
+        started = time.monotonic()
+        if extraction_agent.add_personal_details(extracted_data, text, doc_type, plan.llm_fields):
+            stage_costs.observe("llm", (time.monotonic() - started) * 1000)
+        elif extracted_data["personal_details"]:
+            plan.skip("llm", "the PDF text layer had every field")
+    return extracted_data
+
+
+def compare_profile(extracted_data, profile_data, doc_type):
+    if extracted_data is None:
+        return None
+    normalized_details = normalize_personal_details(extracted_data.get("personal_details", {}))
+
+    log_payload(logger, "Profile data", profile_data)
+    log_payload(logger, "Extracted raw details", extracted_data.get("personal_details", {}))
+    log_payload(logger, "Normalized document data", normalized_details)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Profile keys: %s; document keys: %s",
+                     list(profile_data), list(extracted_data.get("personal_details", {})))
+
+    comparator = DocumentComparator(profile_data, normalized_details, doc_type)
+    return comparator.compare_fields()
+
+
+def decode_uploaded_face(face_ctx):
+    """Decode the uploaded face once; returns its data URL (None if undecodable)."""
+    if face_ctx.face_gray is None:
+        return None
+    return face_ctx.data_url
+
+
+def load_prior_faces(user_id, doc_hash):
+    """Faces of the applicant's earlier documents, when FACE_MATCH_PRIOR is enabled."""
+    if not FACE_MATCH_PRIOR:
+        return []
+    return verification_store.prior_faces(user_id, doc_hash, FACE_MATCH_MAX_PRIOR)
+
+
+def compare_document_face(analysis, uploaded_face, prior_faces, doc_ctx, face_ctx):
+    """ORB match of the uploaded face against every document face -> (face_result, face_images)."""
+    face_result = {"photoMatch": "no face detected", "faceSimilarity": None}
+    face_images = {"document_face": None, "uploaded_face": uploaded_face}
+    extracted_data = analysis[0] if analysis else {}
+
+    # Face crops are reused from the request context when available, else decoded from their JPEGs
+    faces = extracted_data.get("faces") or []
+    if faces:
+        np_uploaded_face = face_ctx.face_gray
+        np_document_faces = [doc_ctx.face(i, face) for i, face in enumerate(faces)]
+
+        if np_uploaded_face is not None and all(face is not None for face in np_document_faces):
+            face_result = match_face(np_uploaded_face, np_document_faces, prior_faces)
+            face_result = convert_ndarray_to_list(face_result)  # Convert ndarrays to lists
+            face_images["document_face"] = matched_document_face(extracted_data, face_result)
+        else:
+            face_images["document_face"] = extracted_data.get("face_image_base64")
+            face_result["photoMatch"] = "invalid face images"
     else:
-        return obj
+        face_result["photoMatch"] = "no face detected in document"
+    return face_result, face_images
 
 
 @app.route('/upload-and-verify', methods=['POST'])
+@admission.guard
+@request_profiler.profiled(lambda req: f"upload-and-verify:{req.form.get('docType') or 'unknown'}")
+@verification_deadline(VERIFICATION_DEADLINE)
 def upload_and_verify():
     logger.info("Received upload request")
 
@@ -76,7 +175,7 @@ def upload_and_verify():
     user_id = request.form.get('uid')
     doc_type = request.form.get('docType')
     doc_number = request.form.get('docNumber')
-    logger.info(f"Received docType: {doc_type}")
+    logger.info("Received docType: %s", doc_type)
 
     if not user_id:
         return jsonify({'error': 'User ID (uid) is required'}), 400
@@ -87,180 +186,148 @@ def upload_and_verify():
     try:
         file_data = file.read()
         filename = file.filename
+        doc_ctx = DocumentContext(file_data, filename)
 
-        # Get user profile
-        profile_data = firebase_service.get_user_profile(user_id)
+        # Stages run as soon as their inputs are ready: the profile fetch, OCR/face
+        # detection and selfie decoding overlap, and the face comparison runs
+        # while the LLM call is outstanding.
+        # Only the stages this docType and these flags need are planned
+        require_face_comparison = request.form.get('requireFaceComparison', 'false').lower() == 'true'
+        compare_face = bool(require_face_comparison and extra_img_file and extra_img_file.filename != '')
+        plan = plan_request(doc_type, compare_face)
+
+        graph = StageGraph()
+        graph.stage("profile", lambda: firebase_service.get_user_profile(user_id))
+        stored = verification_store.find_extraction(user_id, doc_ctx.sha256, doc_type)
+        if stored is not None and not plan.covers(stored):
+            stored = None  # extracted under a plan that skipped something this request needs
+        if stored is None:
+            graph.stage("analyze", lambda: analyze_document(doc_ctx, plan))
+            graph.stage("llm", lambda analysis, profile: extract_details(analysis, profile, doc_type, plan),
+                        after=("analyze", "profile"))
+        else:
+            # The same user already had these exact bytes extracted: no OCR, no LLM call
+            graph.stage("analyze", lambda: (stored, ""))
+            graph.stage("llm", lambda analysis, profile: analysis[0] if profile else None,
+                        after=("analyze", "profile"))
+        graph.stage("compare", lambda extracted, profile: compare_profile(extracted, profile, doc_type),
+                    after=("llm", "profile"))
+
+        if compare_face:
+            face_ctx = DocumentContext(extra_img_file.read(), extra_img_file.filename)
+            graph.stage("selfie", lambda: decode_uploaded_face(face_ctx))
+            graph.stage("prior_faces", lambda: load_prior_faces(user_id, doc_ctx.sha256))
+            graph.stage("face", lambda analysis, uploaded, prior: compare_document_face(
+                analysis, uploaded, prior, doc_ctx, face_ctx), after=("analyze", "selfie", "prior_faces"))
+
+        stages = graph.run()
+        timings = graph.report()
+        logger.info("Stage timings", extra={"timings": timings})
+
+        profile_data = stages["profile"]
         if not profile_data:
             return jsonify({'error': 'User profile not found'}), 404
 
-        # Process the main document bytes directly (no disk save)
-        extracted_data = extraction_agent.process_bytes(file_data, filename)
+        extracted_data = stages["llm"]
         if not extracted_data:
             return jsonify({'error': 'Document processing failed'}), 400
-        
-        safe_extracted_data = bytes_to_base64_in_dict(extracted_data)
-
-
-        def flatten_dict(d, parent_key='', sep='_'):
-            items = {}
-            for k, v in d.items():
-                new_key = f"{parent_key}{sep}{k}" if parent_key else k
-                if isinstance(v, dict) and v is not None:
-                    items.update(flatten_dict(v, new_key, sep=sep))
-                else:
-                    items[new_key] = v
-            return items
-
-        KEY_MAPPING = {
-            "Personal Information_Full Name": "name",
-            "Personal Information_Father's Name": "father_name",
-            "Personal Information_Mother's Name": "mother_name",
-            "Personal Information_Date of Birth": "date_of_birth",
-            "Contact Information_Phone Number(s)": "contact",
-            "Contact Information_Email Address(es)": "email",
-            "Contact Information_Full Address": "full_address",
-            "Document Identifiers_Aadhaar Number": "aadhaar_number",
-            "Document Identifiers_PAN Number": "pan_number",
-            "personal information_gender": "gender",
-            "personal information_nationality": "nationality",
-            "personal information_religion": "religion",
-            "personal information_caste / Category": "category",
-            "personal information_marital Status": "marital_status",
-            "personal information_full Name": "name",
-            "personal information_identification Marks": "id_marks",
-            "personal information_father's Name": "father_name",
-            "personal information_mother's Name": "mother_name",
-            "personal information_date of Birth": "date_of_birth",
-            "contact information_phone Number(s)": "contact",
-            "contact information_email Address(es)": "email",
-            "contact information_full Address": "full_address",
-            "document identifiers_aadhaar Number": "aadhaar_number",
-            "document identifiers_pan Number": "pan_number",
-            "personal information_gender": "gender"
-        }
-
-        from datetime import datetime
-
-        def normalize_personal_details(flat_details, key_mapping):
-            normalized = {}
-            for original_key, value in flat_details.items():
-                mapped_key = key_mapping.get(original_key)
-                if mapped_key:
-                    if isinstance(value, list):
-                        normalized[mapped_key] = value[0] if len(value) > 0 else None
-                    else:
-                        normalized[mapped_key] = value
-            dob = normalized.get("date_of_birth")
-            if dob:
-                try:
-                    dt = datetime.strptime(dob, "%d/%m/%Y")
-                    normalized["date_of_birth"] = dt.strftime("%Y-%m-%d")
-                except Exception:
-                    pass
-            return normalized
-
-        raw_details = extracted_data.get("personal_details", {})
-        flat_details = flatten_dict(raw_details)
-        normalized_details = normalize_personal_details(flat_details, KEY_MAPPING)
-
-        logger.info("=== Profile Data ===")
-        logger.info(profile_data)
-        logger.info("=== Extracted Raw Details ===")
-        logger.info(extracted_data.get("personal_details", {}))
-        logger.info("=== Normalized Document Data ===")
-        logger.info(normalized_details)
-        logger.info(f"Profile keys: {list(profile_data.keys())}")
-        logger.info(f"Document keys: {list(extracted_data.get('personal_details', {}).keys())}")
-
-        comparator = DocumentComparator(profile_data, normalized_details, doc_type)
-        result = comparator.compare_fields()
-
-        face_result = {"photoMatch": "no face detected", "faceSimilarity": None}
-        face_images = {"document_face": None, "uploaded_face": None}
-        
-        
-
-        validation = None
-        if doc_type == 'aadhaar':
-            validation = DocumentValidator.validate_aadhaar(doc_number)
-        elif doc_type == 'pan':
-            validation = DocumentValidator.validate_pan(doc_number)
-        elif doc_type == 'passport':
-            validation = DocumentValidator.validate_passport(doc_number)
-        elif doc_type == 'driving_license':
-            validation = DocumentValidator.validate_driving_license(doc_number)
-        elif doc_type == 'caste_certificate':
-            validation = DocumentValidator.validate_caste_certificate(doc_number)
-        elif doc_type == 'voter_id':
-            validation = DocumentValidator.validate_voter_id(doc_number)
-        elif doc_type == 'income_certificate':
-            validation = DocumentValidator.validate_income_certificate(doc_number)
-
-        # Face comparison using in-memory bytes
-        require_face_comparison = request.form.get('requireFaceComparison', 'false').lower() == 'true'
-        if require_face_comparison and extra_img_file and extra_img_file.filename != '':
-            uploaded_face_bytes = extra_img_file.read()
-            face_images["uploaded_face"] = image_bytes_to_base64(uploaded_face_bytes)
-
-            # For extracted face image, your extraction_agent should return face image bytes or base64
-            # We'll assume extracted_data contains face image bytes under key "face_image_bytes"
-            extracted_face_bytes = extracted_data.get("face_image_bytes")
-            if extracted_face_bytes:
-                face_images["document_face"] = image_bytes_to_base64(extracted_face_bytes)
-
-                # Compare faces using your compare_faces function that supports bytes or paths
-                # We must save temporarily or modify compare_faces to accept bytes. 
-                # Here let's save to memory files using cv2.imdecode and then compare with bytes:
-
-                # Decode images to numpy arrays
-                np_uploaded_face = cv2.imdecode(np.frombuffer(uploaded_face_bytes, np.uint8), cv2.IMREAD_COLOR)
-                np_extracted_face = cv2.imdecode(np.frombuffer(extracted_face_bytes, np.uint8), cv2.IMREAD_COLOR)
-
-                if np_uploaded_face is not None and np_extracted_face is not None:
-                    face_result = compare_faces(np_extracted_face, np_uploaded_face)
-                    face_result = convert_ndarray_to_list(face_result)  # Convert ndarrays to lists
-                    logger.info(f"Face comparison result: {face_result}")
-                    
-                else:
-                    face_result["photoMatch"] = "invalid face images"
-            else:
-                face_result["photoMatch"] = "no face detected in document"
-
-        response_data = {
-            'results': [{
-                'extracted_data': safe_extracted_data,
-                'comparison_result': {
-                    'verdict': result['verdict'],
-                    'similarity_score': result.get('similarity_score', 0),
-                    'details': result.get('details', {})
-                },
-                'face_comparison': face_result,
-                'face_images': face_images,
-                'file_name': filename,
-                'document_type': doc_type,
-                'document_number': doc_number,
-                'personal_details': extracted_data.get("personal_details", {}),
-                'validation': {
-                    'status': validation[0] if validation else None,
-                    'message': validation[1] if validation else "No validation performed"
-                }
-            }]
-        }
-
-        logger.info(f"Verification completed for user {user_id}")
-        return jsonify(convert_ndarray_to_list(response_data))
-
+        extracted_data["pipeline_stats"]["stages"] = timings
+        if stored is None:
+            extracted_data["pipeline_stats"]["plan"] = plan.report()
+
+        result = stages["compare"]
+        validation = DocumentValidator.validate(doc_type, doc_number)
+        face_result, face_images = stages.get("face") or (
+            {"photoMatch": "no face detected", "faceSimilarity": None},
+            {"document_face": None, "uploaded_face": None})
+
+        response_data = build_verification_response(
+            extracted_data, result, face_result, face_images,
+            filename, doc_type, doc_number, validation)
+        verification_store.save(
+            user_id, doc_ctx.sha256, extracted_data, result, face_result, face_images,
+            filename, doc_type, doc_number, validation)
+
+        logger.info("Document context", extra={"document": doc_ctx.stats()})
+        logger.info("Verification completed for user %s", user_id)
+        return jsonify(response_data)
+
+    except (Overloaded, DeadlineExceeded, PageBudgetExceeded, PoorImageQuality):
+        raise
     except Exception as e:
-        logger.error(f"Error during verification: {str(e)}", exc_info=True)
+        logger.error("Error during verification: %s", e, exc_info=True)
         return jsonify({'error': 'Verification failed', 'details': str(e)}), 500
 
 
+@app.route("/validate-batch", methods=["POST"])
+def validate_batch():
+    try:
+        return jsonify(validate_request(request.get_json(silent=True))), 200
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({"admission": admission.metrics(), "llm_backends": llm_pool.metrics(),
+                    "llm_batching": llm_batcher.metrics(), "shared_cache": shared_cache.metrics()}), 200
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    if not request_profiler.authorized(request.headers):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({"profiles": request_profiler.store.list()}), 200
+
+
+@app.route("/profiles/<trace_id>", methods=["GET"])
+def download_profile(trace_id):
+    if not request_profiler.authorized(request.headers):
+        return jsonify({'error': 'Forbidden'}), 403
+    path = request_profiler.store.path_for(trace_id)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+
+@app.route("/verifications/<uid>", methods=["GET"])
+def list_verifications(uid):
+    if not verification_authorized(request.headers):
+        return jsonify({'error': 'Forbidden'}), 403
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    verifications = verification_store.list(
+        uid, request.args.get('docType'), limit, request.args.get('before', type=float))
+    return jsonify({"uid": uid, "verifications": verifications}), 200
+
+
+@app.route("/verifications/<uid>/<doc>", methods=["GET"])
+def get_verification(uid, doc):
+    if not verification_authorized(request.headers):
+        return jsonify({'error': 'Forbidden'}), 403
+    record = verification_store.get(uid, doc)
+    if record is None:
+        return jsonify({'error': 'Verification not found'}), 404
+    return jsonify(record), 200
+
+
+@app.route("/verifications/<uid>/<doc>/<artifact>", methods=["GET"])
+def get_verification_artifact(uid, doc, artifact):
+    if not verification_authorized(request.headers):
+        return jsonify({'error': 'Forbidden'}), 403
+    found = verification_store.artifact(uid, doc, artifact)
+    if found is None:
+        return jsonify({'error': 'Artifact not found'}), 404
+    content_type, data = found
+    return send_file(io.BytesIO(data), mimetype=content_type, download_name=artifact)
+
+
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(debug=False, host="0.0.0.0", port=port)
@@ -0,0 +1,324 @@
+"""
+Asyncio variant of the verification service.
+
+Exposes the same routes as app.py, but the OpenRouter and Firestore waits
+are awaited on the event loop instead of holding a worker thread, and OCR,
+Haar cascades and ORB run in a process pool. One worker process can keep
+hundreds of verifications in flight:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8080 --workers 1
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import cpu_tasks
+from admission import AsyncAdmissionController, Overloaded
+from async_llm import run_llm_async, aclose as close_llm_client
+from batch_validator import validate_request, BatchTooLarge
+from compare_agent import DocumentComparator
+from doc_validator import DocumentValidator
+from document_reader import PageBudgetExceeded, PoorImageQuality
+from extract_agent import ExtractionAgent
+from face_matcher import FACE_MATCH_PRIOR, FACE_MATCH_MAX_PRIOR
+from firebase_service import FirebaseService
+from llm_backends import pool as llm_pool, verification_deadline, DeadlineExceeded
+from personal_details import normalize_personal_details
+from pipeline_planner import plan_request, costs as stage_costs
+from response_builder import allowed_file, build_verification_response, matched_document_face
+from shared_cache import cache as shared_cache
+from structured_logging import setup_logging, correlation_id
+from verification_store import store as verification_store, authorized as verification_authorized
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB limit, as in app.py
+VERIFICATION_DEADLINE = float(os.environ.get('VERIFICATION_DEADLINE', 120))
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 1))
+
+firebase_service = FirebaseService()
+admission = AsyncAdmissionController.from_env()
+cpu_pool = None
+
+
+async def run_cpu(fn, *args):
+    """Run a picklable CPU task in the process pool under the cpu stage budget."""
+    async with admission.stage("cpu"):
+        return await asyncio.get_running_loop().run_in_executor(cpu_pool, fn, *args)
+
+
+def error(message, status, details=None, headers=None):
+    body = {'error': message}
+    if details is not None:
+        body['details'] = details
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def handle_overloaded(request, e):
+    logger.warning("Rejecting request under load: %s", e)
+    return error('Server busy, retry later', 429, str(e), {'Retry-After': str(e.retry_after)})
+
+
+async def handle_deadline(request, e):
+    logger.warning("Verification deadline exceeded: %s", e)
+    return error('Verification timed out', 504, str(e))
+
+
+async def handle_page_budget(request, e):
+    logger.warning("Document rejected by page budget: %s", e)
+    return error('Document too large to process', 413, str(e))
+
+
+async def handle_poor_quality(request, e):
+    logger.info("Photo rejected by quality gate: %s", e, extra={"quality": e.metrics})
+    return JSONResponse({'error': 'Image quality too low', 'reasons': e.reasons, 'metrics': e.metrics}, 422)
+
+
+async def upload_and_verify(request):
+    with correlation_id(request.headers.get('X-Request-ID')) as request_id:
+        response = await _upload_and_verify(request)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+
+async def _upload_and_verify(request):
+    logger.info("Received upload request")
+    if int(request.headers.get('content-length') or 0) > MAX_CONTENT_LENGTH:
+        return error('File too large', 413)
+
+    async with admission.stage("requests"):
+        with verification_deadline(VERIFICATION_DEADLINE):
+            try:
+                return await asyncio.wait_for(verify(request), VERIFICATION_DEADLINE)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Verification deadline exceeded")
+
+
+async def verify(request):
+    form = await request.form()
+    file = form.get('file')
+    extra_img_file = form.get('face')
+    user_id = form.get('uid')
+    doc_type = form.get('docType')
+    doc_number = form.get('docNumber')
+    logger.info("Received docType: %s", doc_type)
+
+    if file is None or isinstance(file, str):
+        return error('No file uploaded', 400)
+
+    if not user_id:
+        return error('User ID (uid) is required', 400)
+
+    if not file.filename or not allowed_file(file.filename):
+        return error('Invalid or missing file', 400)
+
+    face_task = None
+    try:
+        file_data = await file.read()
+        filename = file.filename
+
+        # Only the stages this docType and these flags need are planned
+        require_face_comparison = (form.get('requireFaceComparison') or 'false').lower() == 'true'
+        compare_face = bool(require_face_comparison and extra_img_file is not None
+                            and not isinstance(extra_img_file, str) and extra_img_file.filename)
+        plan = plan_request(doc_type, compare_face)
+
+        doc_hash, stored = await asyncio.to_thread(find_stored_extraction, user_id, file_data, doc_type)
+        if stored is not None and not plan.covers(stored):
+            stored = None  # extracted under a plan that skipped something this request needs
+        if stored is None:
+            analyze = run_cpu(cpu_tasks.analyze_document, file_data, filename, plan)
+        else:
+            # The same user already had these exact bytes extracted: no OCR, no LLM call
+            analyze = asyncio.sleep(0, (stored, ""))
+
+        # Firestore lookup and OCR/face detection overlap
+        profile_data, analysis = await asyncio.gather(
+            firebase_service.get_user_profile_async(user_id),
+            analyze,
+            return_exceptions=True,
+        )
+        if isinstance(analysis, (Overloaded, PageBudgetExceeded, PoorImageQuality)):
+            raise analysis
+        if isinstance(profile_data, BaseException):
+            raise profile_data
+        if not profile_data:
+            return error('User profile not found', 404)
+        if isinstance(analysis, BaseException):
+            logger.error("Document analysis failed: %s", analysis)
+            return error('Document processing failed', 400)
+
+        extracted_data, text = analysis
+        if stored is None:
+            plan.observe_analysis(extracted_data["pipeline_stats"])
+        if compare_face:
+            # ORB comparison only needs the face crop, so it runs while the LLM call is out
+            prior_faces = await asyncio.to_thread(load_prior_faces, user_id, doc_hash)
+            face_task = asyncio.ensure_future(run_cpu(
+                cpu_tasks.compare_uploaded_face, extracted_data.get("faces"),
+                await extra_img_file.read(), extra_img_file.filename, prior_faces))
+
+        layout, missing = ExtractionAgent.layout_split(extracted_data, plan.llm_fields)
+        if stored is not None:
+            pass
+        elif not plan.needs_llm(profile_data):
+            logger.info("No profile values to verify; LLM extraction skipped.")
+        elif layout and not missing:
+            logger.info("All fields read from the PDF text layer; LLM extraction skipped.")
+            ExtractionAgent.apply_personal_details(extracted_data, {}, layout)
+            plan.skip("llm", "the PDF text layer had every field")
+        elif text.strip():
+            started = time.monotonic()
+            details = await run_llm_async(text, doc_type, admission, missing if layout else plan.llm_fields)
+            ExtractionAgent.apply_personal_details(extracted_data, details, layout)
+            stage_costs.observe("llm", (time.monotonic() - started) * 1000)
+        else:
+            logger.info("No text found for LLM processing.")
+        if stored is None:
+            extracted_data["pipeline_stats"]["plan"] = plan.report()
+
+        normalized_details = normalize_personal_details(extracted_data.get("personal_details", {}))
+        comparator = DocumentComparator(profile_data, normalized_details, doc_type)
+        result = comparator.compare_fields()
+        validation = DocumentValidator.validate(doc_type, doc_number)
+
+        face_result = {"photoMatch": "no face detected", "faceSimilarity": None}
+        face_images = {"document_face": None, "uploaded_face": None}
+        if face_task is not None:
+            face_result, face_images["uploaded_face"] = await face_task
+            face_images["document_face"] = matched_document_face(extracted_data, face_result)
+
+        response_data = build_verification_response(
+            extracted_data, result, face_result, face_images,
+            filename, doc_type, doc_number, validation)
+        await asyncio.to_thread(
+            verification_store.save, user_id, doc_hash, extracted_data, result, face_result, face_images,
+            filename, doc_type, doc_number, validation)
+        logger.info("Verification completed for user %s", user_id)
+        return JSONResponse(response_data)
+
+    except (Overloaded, DeadlineExceeded, PageBudgetExceeded, PoorImageQuality, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        logger.error("Error during verification: %s", e, exc_info=True)
+        return error('Verification failed', 500, str(e))
+    finally:
+        if face_task is not None and not face_task.done():
+            face_task.cancel()
+
+
+def find_stored_extraction(user_id, file_data, doc_type):
+    doc_hash = hashlib.sha256(file_data).hexdigest()
+    return doc_hash, verification_store.find_extraction(user_id, doc_hash, doc_type)
+
+
+def load_prior_faces(user_id, doc_hash):
+    """Faces of the applicant's earlier documents, when FACE_MATCH_PRIOR is enabled."""
+    if not FACE_MATCH_PRIOR:
+        return []
+    return verification_store.prior_faces(user_id, doc_hash, FACE_MATCH_MAX_PRIOR)
+
+
+async def list_verifications(request):
+    if not verification_authorized(request.headers):
+        return error('Forbidden', 403)
+    uid = request.path_params['uid']
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 200)
+        before = float(request.query_params['before']) if 'before' in request.query_params else None
+    except ValueError:
+        return error('Invalid limit or before', 400)
+    verifications = await asyncio.to_thread(
+        verification_store.list, uid, request.query_params.get('docType'), limit, before)
+    return JSONResponse({"uid": uid, "verifications": verifications})
+
+
+async def get_verification(request):
+    if not verification_authorized(request.headers):
+        return error('Forbidden', 403)
+    record = await asyncio.to_thread(
+        verification_store.get, request.path_params['uid'], request.path_params['doc'])
+    if record is None:
+        return error('Verification not found', 404)
+    return JSONResponse(record)
+
+
+async def get_verification_artifact(request):
+    if not verification_authorized(request.headers):
+        return error('Forbidden', 403)
+    params = request.path_params
+    found = await asyncio.to_thread(verification_store.artifact, params['uid'], params['doc'], params['artifact'])
+    if found is None:
+        return error('Artifact not found', 404)
+    content_type, data = found
+    return Response(data, media_type=content_type)
+
+
+async def validate_batch(request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    try:
+        return JSONResponse(await asyncio.to_thread(validate_request, payload))
+    except BatchTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+
+
+async def health_check(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request):
+    return JSONResponse({"admission": admission.metrics(), "llm_backends": llm_pool.metrics(),
+                         "shared_cache": shared_cache.metrics()})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global cpu_pool
+    cpu_pool = ProcessPoolExecutor(CPU_WORKERS, initializer=cpu_tasks.init_worker)
+    try:
+        yield
+    finally:
+        await close_llm_client()
+        cpu_pool.shutdown(cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/upload-and-verify', upload_and_verify, methods=['POST']),
+        Route('/validate-batch', validate_batch, methods=['POST']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/verifications/{uid}', list_verifications, methods=['GET']),
+        Route('/verifications/{uid}/{doc}', get_verification, methods=['GET']),
+        Route('/verifications/{uid}/{doc}/{artifact}', get_verification_artifact, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    exception_handlers={
+        Overloaded: handle_overloaded,
+        DeadlineExceeded: handle_deadline,
+        PageBudgetExceeded: handle_page_budget,
+        PoorImageQuality: handle_poor_quality,
+    },
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
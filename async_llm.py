@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+
+from llm_backends import pool, RetryableError, DeadlineExceeded, remaining_time
+from local_llm import STREAM, CACHE_SCOPE, prepare_request, finish_response, cacheable_reply, mark_cached
+from llm_stream import aread_stream, stream_stats
+from shared_cache import cache as shared_cache
+from single_flight import content_key
+
+_client = None
+_inflight = {}
+
+
+def _http_client():
+    """One pooled AsyncClient per process; timeouts are set per request."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def run_llm_async(doc_text, doc_type=None, admission=None, fields=None):
+    """
+    run_local_llm for the asyncio service. Identical texts already in flight
+    await the same task; `admission` is an AsyncAdmissionController whose
+    "llm" stage bounds concurrent requests (one slot per attempt, hedges
+    included); fields narrows the extraction.
+    The task runs under its starter's deadline; a caller that joined it and
+    still has time left starts its own call when that deadline runs out.
+    """
+    key = content_key(doc_text, doc_type, ",".join(fields or ()))
+    while True:
+        task = _inflight.get(key)
+        joined = task is not None
+        if not joined:
+            task = asyncio.ensure_future(shared_cache.aget_or_set(
+                "llm", content_key(CACHE_SCOPE, key), lambda: _run_llm_async(doc_text, doc_type, admission, fields),
+                cache_if=cacheable_reply, on_hit=mark_cached))
+            _inflight[key] = task
+            task.add_done_callback(lambda done: _inflight.pop(key) if _inflight.get(key) is done else None)
+        try:
+            # shield: one caller being cancelled must not cancel the call for the others
+            return dict(await asyncio.shield(task))
+        except DeadlineExceeded:
+            remaining = remaining_time()
+            if not joined or (remaining is not None and remaining <= 0):
+                raise
+            if _inflight.get(key) is task:
+                _inflight.pop(key)
+
+
+async def _run_llm_async(doc_text, doc_type, admission, fields=None):
+    prepared = prepare_request(doc_text, doc_type, fields)
+    if isinstance(prepared, dict):
+        return prepared
+    payload, fields, stats = prepared
+    client = _http_client()
+
+    async def post(backend, body, timeout):
+        request = client.build_request("POST", backend.url, headers=backend.headers(),
+                                       json=body, timeout=timeout)
+        return await client.send(request, stream=STREAM)
+
+    async def send(backend, timeout):
+        body = dict(payload, model=backend.model)
+        try:
+            response = await post(backend, body, timeout)
+            if response.status_code == 400:
+                text = (await response.aread()).decode(errors="replace")
+                if "response_format" in text:
+                    # Model does not support structured outputs; the parser still validates
+                    body.pop("response_format")
+                    response = await post(backend, body, timeout)
+        except httpx.HTTPError as e:
+            raise RetryableError(f"Request failed: {str(e)}")
+
+        if response.status_code != 200:
+            text = (await response.aread()).decode(errors="replace")
+            await response.aclose()
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableError(f"API Error {response.status_code}")
+            return {"error": f"API Error {response.status_code}",
+                    "message": text[:500]}, None, None
+
+        if STREAM:
+            return await aread_stream(response, fields, doc_type)
+        try:
+            body = response.json()
+        except ValueError as e:
+            raise RetryableError(f"JSON decode error: {str(e)}")
+        raw_content = body.get("choices", [{}])[0].get("message", {}).get("content", "") or ""
+        stream_stats.record_full(doc_type, len(raw_content))
+        return raw_content, body.get("usage") or {}, None
+
+    try:
+        slot = None if admission is None else lambda: admission.stage("llm")
+        (raw_content, usage, stream_info), call_info = await pool.acall(send, slot=slot)
+    except RetryableError as e:
+        return {"error": str(e)}
+
+    return finish_response(raw_content, usage, stream_info, call_info, fields, stats, doc_type)
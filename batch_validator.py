@@ -0,0 +1,289 @@
+"""
+Bulk document-number validation for compliance audits.
+
+DocumentValidator checks one number at a time in Python. validate_batch()
+checks whole arrays: the numbers become an (n x 16) matrix of character
+codes, each format is a precompiled per-position table of allowed characters
+looked up for every row at once, and the Aadhaar Verhoeff checksum runs as
+12 table lookups over the digit matrix. Status and message match
+DocumentValidator.validate row for row; the reason code says which check
+failed.
+
+    python batch_validator.py export.csv --out audit.csv
+    python batch_validator.py aadhaar.csv --doc-type aadhaar --number-column uid_number
+
+The input is a CSV with a header; --out gets the input columns plus status,
+reason and message. It is read and written in chunks, so exports of
+millions of rows run in bounded memory.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from doc_validator import DocumentValidator, VERHOEFF_D, VERHOEFF_P
+
+# Reason codes, in the order the checks run
+REASONS = ("ok", "missing", "length", "format", "checksum", "unsupported_type")
+OK, MISSING, LENGTH, FORMAT, CHECKSUM, UNSUPPORTED = range(len(REASONS))
+
+WIDTH = 16  # longest number any format accepts; longer ones fail on length alone
+VALIDATE_BATCH_MAX_ROWS = int(os.getenv("VALIDATE_BATCH_MAX_ROWS", "100000"))  # per /validate-batch request
+
+
+class BatchTooLarge(ValueError):
+    """A /validate-batch request has more rows than VALIDATE_BATCH_MAX_ROWS."""
+
+
+def _template(spec):
+    """Per-position table of allowed characters: 'A' is A-Z, '9' is 0-9, anything else itself."""
+    table = np.zeros((len(spec), 128), bool)
+    for position, char in enumerate(spec):
+        if char == "A":
+            table[position, ord("A"):ord("Z") + 1] = True
+        elif char == "9":
+            table[position, ord("0"):ord("9") + 1] = True
+        else:
+            table[position, ord(char)] = True
+    return table
+
+
+class _Format:
+    """One document type: length rule, accepted templates, checksum and DocumentValidator's messages."""
+
+    def __init__(self, templates, messages, exact_length=None, min_length=None, verhoeff=False):
+        self.templates = [_template(spec) for spec in templates]
+        self.exact_length = exact_length
+        self.min_length = min_length
+        self.verhoeff = verhoeff
+        self.messages = np.array([messages.get(REASONS[code], "") for code in range(len(REASONS))], object)
+        # Scalar fallback: message -> reason, the later (more specific) check winning
+        self.reason_of = {message: code for code, message in enumerate(self.messages) if message}
+
+
+_TOO_SHORT = "Too short (min 10 chars)"
+FORMATS = {
+    "aadhaar": _Format(["999999999999"], {"ok": "Valid Aadhaar", "missing": "Must be 12 digits",
+                                          "length": "Must be 12 digits", "format": "Must be 12 digits",
+                                          "checksum": "Invalid Aadhaar number"},
+                       exact_length=12, verhoeff=True),
+    "pan": _Format(["AAAAA9999A"], {"ok": "Valid PAN", "missing": "Format: ABCDE1234F",
+                                    "format": "Format: ABCDE1234F"}),
+    "passport": _Format(["A9999999"], {"ok": "Valid Passport", "missing": "Must be 8 characters",
+                                       "length": "Must be 8 characters", "format": "Format: A1234567"},
+                        exact_length=8),
+    "driving_license": _Format(["AA99A9999999", "AA99AA9999999"],
+                               {"ok": "Valid Driving License", "missing": _TOO_SHORT, "length": _TOO_SHORT,
+                                "format": "Format: AB12C3456789"}, min_length=10),
+    "caste_certificate": _Format(["CND" + "9" * 13], {"ok": "Valid Caste Certificate", "missing": _TOO_SHORT,
+                                                      "length": _TOO_SHORT, "format": "Format: CND1234567890123"},
+                                 min_length=10),
+    "voter_id": _Format(["AAA9999999"], {"ok": "Valid Voter ID", "missing": _TOO_SHORT, "length": _TOO_SHORT,
+                                         "format": "Format: ABC1234567"}, min_length=10),
+    "income_certificate": _Format(["IC" + "9" * 12], {"ok": "Valid Income Certificate", "missing": _TOO_SHORT,
+                                                      "length": _TOO_SHORT, "format": "Format: IC123456789012"},
+                                  min_length=10),
+}
+
+_STATUS = np.array(["valid"] + ["invalid"] * (len(REASONS) - 2) + ["unsupported"], object)
+_REASON_NAMES = np.array(REASONS, object)
+_VERHOEFF_D = np.array(VERHOEFF_D, np.uint8)
+_VERHOEFF_P = np.array(VERHOEFF_P, np.uint8)[np.arange(12) % 8]  # permutation of each position, from the right
+
+
+class BatchResult:
+    """Per-row status ('valid', 'invalid', 'unsupported'), reason code and message arrays."""
+
+    def __init__(self, status, reason, message):
+        self.status = status
+        self.reason = reason
+        self.message = message
+
+    def __len__(self):
+        return len(self.status)
+
+    def rows(self):
+        for status, reason, message in zip(self.status, self.reason, self.message):
+            yield {"status": status, "reason": reason, "message": message}
+
+    def summary(self):
+        return {"status": dict(Counter(self.status.tolist())), "reason": dict(Counter(self.reason.tolist()))}
+
+
+def _char_matrix(numbers):
+    """(numbers as str, codes, lengths, missing); codes are the upper-cased first WIDTH characters."""
+    missing = np.array([not number for number in numbers], bool)
+    numbers = ["" if not number else number if isinstance(number, str) else str(number) for number in numbers]
+    lengths = np.fromiter(map(len, numbers), np.int64, len(numbers))
+    codes = np.array(numbers, f"<U{WIDTH}").view(np.uint32)  # numpy truncates to WIDTH characters
+    codes = codes.reshape(len(numbers), WIDTH).copy()
+    lower = (codes >= ord("a")) & (codes <= ord("z"))
+    codes[lower] -= 32
+    return numbers, codes, lengths, missing
+
+
+def _check(fmt, codes, lengths, missing):
+    """Reason code of every row for one document type."""
+    reason = np.full(len(lengths), OK, np.int8)
+    matched = np.zeros(len(lengths), bool)
+    for table in fmt.templates:
+        size = len(table)
+        rows = np.flatnonzero(lengths == size)
+        if len(rows):
+            matched[rows[table[np.arange(size), codes[rows, :size]].all(axis=1)]] = True
+    reason[~matched] = FORMAT
+
+    if fmt.verhoeff:
+        rows = np.flatnonzero(matched)
+        digits = (codes[rows, 11::-1] - ord("0")).astype(np.intp)
+        permuted = _VERHOEFF_P[np.arange(12), digits]
+        checksum = np.zeros(len(rows), np.uint8)
+        for position in range(12):
+            checksum = _VERHOEFF_D[checksum, permuted[:, position]]
+        reason[rows[checksum != 0]] = CHECKSUM
+
+    if fmt.exact_length is not None:
+        reason[lengths != fmt.exact_length] = LENGTH
+    elif fmt.min_length is not None:
+        reason[lengths < fmt.min_length] = LENGTH
+    reason[missing] = MISSING
+    return reason
+
+
+def validate_batch(doc_types, numbers):
+    """
+    Validate many document numbers at once. doc_types is one docType for
+    every row or a sequence with one per row (case-insensitive); numbers may
+    contain None. Returns a BatchResult, row for row.
+    """
+    numbers = list(numbers)
+    count = len(numbers)
+    if isinstance(doc_types, str) or doc_types is None:
+        groups = {(doc_types or "").lower(): np.arange(count)}
+    else:
+        # Group rows by docType with a dict (np.unique would sort an object array)
+        index = {}
+        type_ids = np.fromiter((index.setdefault((doc_type or "").lower(), len(index)) for doc_type in doc_types),
+                               np.int64)
+        if len(type_ids) != count:
+            raise ValueError(f"{len(type_ids)} docTypes for {count} numbers")
+        groups = {doc_type: np.flatnonzero(type_ids == i) for doc_type, i in index.items()}
+
+    numbers, codes, lengths, missing = _char_matrix(numbers)
+    # Non-ASCII characters (which upper() or isdigit() treat specially) go through DocumentValidator,
+    # and so does a trailing newline, which the "$" of its patterns accepts
+    scalar = ((codes >= 128).any(axis=1) & (lengths <= WIDTH)) \
+        | np.fromiter((number.endswith("\n") for number in numbers), bool, count)
+    codes[codes >= 128] = 0
+
+    reason = np.full(count, UNSUPPORTED, np.int8)
+    message = np.full(count, "Unsupported docType", object)
+    for doc_type, rows in groups.items():
+        fmt = FORMATS.get(doc_type)
+        if fmt is None:
+            continue
+        reason[rows] = _check(fmt, codes[rows], lengths[rows], missing[rows])
+        for row in rows[scalar[rows]]:
+            try:
+                status, text = DocumentValidator.validate(doc_type, numbers[row])
+            except ValueError:  # e.g. a digit character int() rejects
+                status, text = "invalid", None
+            reason[row] = OK if status == "valid" else fmt.reason_of.get(text, FORMAT)
+        message[rows] = fmt.messages[reason[rows]]
+
+    return BatchResult(_STATUS[reason], _REASON_NAMES[reason], message)
+
+
+def validate_request(payload):
+    """
+    Response body of /validate-batch for a JSON payload of either
+    {"docType": ..., "numbers": [...]} or {"items": [{"docType", "docNumber"}, ...]}.
+    Raises ValueError for a malformed payload, BatchTooLarge above the row limit.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object")
+    if isinstance(payload.get("items"), list):
+        items = payload["items"]
+        if not all(isinstance(item, dict) for item in items):
+            raise ValueError("items must be objects with docType and docNumber")
+        doc_types = [item.get("docType") for item in items]
+        numbers = [item.get("docNumber") for item in items]
+    elif isinstance(payload.get("numbers"), list) and isinstance(payload.get("docType"), str):
+        doc_types, numbers = payload["docType"], payload["numbers"]
+    else:
+        raise ValueError("Provide docType and a numbers list, or an items list")
+    if len(numbers) > VALIDATE_BATCH_MAX_ROWS:
+        raise BatchTooLarge(f"{len(numbers)} rows exceeds the limit of {VALIDATE_BATCH_MAX_ROWS}")
+
+    result = validate_batch(doc_types, numbers)
+    return {"count": len(result), "summary": result.summary(), "results": list(result.rows())}
+
+
+# === CLI ===
+def _chunks(reader, size):
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk validation of stored document numbers.")
+    parser.add_argument("source", help="CSV file with a header row ('-' for stdin)")
+    parser.add_argument("--out", help="CSV to write the rows with status, reason and message to")
+    parser.add_argument("--doc-type", help="docType of every row (default: read from --type-column)")
+    parser.add_argument("--type-column", default="docType", help="column holding each row's docType")
+    parser.add_argument("--number-column", default="docNumber", help="column holding the document number")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="rows validated per batch")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.source == "-" else open(args.source, newline="", encoding="utf-8")
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else None
+    totals = Counter()
+    reasons = Counter()
+    started = time.perf_counter()
+    try:
+        reader = csv.DictReader(source)
+        columns = reader.fieldnames or []
+        if args.number_column not in columns or (not args.doc_type and args.type_column not in columns):
+            parser.error(f"input needs a {args.number_column!r} column"
+                         + ("" if args.doc_type else f" and a {args.type_column!r} column (or --doc-type)"))
+        writer = None
+        if out:
+            writer = csv.DictWriter(out, columns + ["status", "reason", "message"])
+            writer.writeheader()
+
+        for chunk in _chunks(reader, args.chunk_size):
+            doc_types = args.doc_type or [row[args.type_column] for row in chunk]
+            result = validate_batch(doc_types, [row[args.number_column] for row in chunk])
+            totals.update(result.status.tolist())
+            reasons.update(result.reason.tolist())
+            if writer:
+                for row, outcome in zip(chunk, result.rows()):
+                    row.update(outcome)
+                writer.writerows(chunk)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    print(f"{rows} numbers in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f}/s)", file=sys.stderr)
+    for status, count in totals.most_common():
+        print(f"  {status:<12} {count}", file=sys.stderr)
+    for reason, count in reasons.most_common():
+        print(f"  reason {reason:<17} {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
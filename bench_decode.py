@@ -0,0 +1,60 @@
+"""
+Benchmark full-resolution decoding against image_decode.decode_image on
+synthetic camera-sized JPEGs:
+
+    python bench_decode.py --megapixels 12 24 48
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from image_decode import FACE_MAX_SIDE, OCR_MAX_SIDE, THUMBNAIL_MAX_SIDE, decode_image
+
+
+def synthetic_photo(megapixels, seed=0):
+    """A 4:3 JPEG with photo-like noise and some text, encoded at camera quality."""
+    rng = np.random.default_rng(seed)
+    height = int((megapixels * 1_000_000 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for y in range(200, height - 200, height // 12):
+        cv2.putText(img, "GOVERNMENT OF INDIA 1234 5678 9012", (150, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, width / 1500, (20, 20, 20), max(2, width // 800))
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 24, 48])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    targets = [("full (cv2.imdecode)", None), ("ocr", OCR_MAX_SIDE), ("face", FACE_MAX_SIDE),
+               ("thumbnail", THUMBNAIL_MAX_SIDE)]
+    print(f"{'MP':>4} {'decode':<20} {'ms':>8} {'size':>11} {'raster MB':>10}")
+    for megapixels in args.megapixels:
+        data = synthetic_photo(megapixels)
+        for name, max_side in targets:
+            if max_side is None:
+                img, ms = timed(lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), args.repeat)
+            else:
+                img, ms = timed(lambda: decode_image(data, max_side), args.repeat)
+            size = f"{img.shape[1]}x{img.shape[0]}"
+            print(f"{megapixels:>4g} {name:<20} {ms:>8.1f} {size:>11} {img.nbytes / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
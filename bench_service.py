@@ -0,0 +1,168 @@
+"""
+Load benchmark for the Flask (app.py) and ASGI (asgi_app.py) services.
+
+Start a target with a fixture profile in place of Firestore (an artificial
+delay stands in for the Firestore round trip) and the mock LLM behind it:
+
+    python mock_llm_server.py --port 8099 --latency 2
+    LLM_API_URL=http://127.0.0.1:8099/v1/chat/completions OPENROUTER_API_KEY=x \\
+        python bench_service.py serve flask --port 5001 --threads 4
+    LLM_API_URL=http://127.0.0.1:8099/v1/chat/completions OPENROUTER_API_KEY=x \\
+        python bench_service.py serve asgi --port 5002
+
+then drive it:
+
+    python bench_service.py load http://127.0.0.1:5001 -c 64 -n 256
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+DEFAULT_PROFILE = {
+    "name": "Ravi Kumar", "father_name": "Mohan Kumar", "date_of_birth": "1990-01-01",
+    "contact": "9876543210", "address": "12 MG Road, Bengaluru",
+}
+
+
+# === SERVE ===
+def serve_flask(args, profile):
+    import app as flask_app
+    from gunicorn.app.base import BaseApplication
+
+    def get_user_profile(user_id):
+        time.sleep(args.profile_latency)
+        return dict(profile)
+    flask_app.firebase_service.get_user_profile = get_user_profile
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", 1)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("timeout", 300)
+
+        def load(self):
+            return flask_app.app
+
+    Server().run()
+
+
+def serve_asgi(args, profile):
+    import uvicorn
+    import asgi_app
+
+    async def get_user_profile_async(user_id):
+        await asyncio.sleep(args.profile_latency)
+        return dict(profile)
+    asgi_app.firebase_service.get_user_profile_async = get_user_profile_async
+    uvicorn.run(asgi_app.app, host=args.host, port=args.port, log_level="warning")
+
+
+# === LOAD ===
+def synthetic_pdf(i):
+    """A small text-layer PDF, unique per request so nothing is coalesced or cached."""
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), f"Name: Ravi Kumar\nFather: Mohan Kumar\nDOB: 01/01/1990\nRef: {i}")
+    return doc.tobytes()
+
+
+async def run_load(args):
+    import httpx
+
+    document = None
+    if args.file:
+        with open(args.file, "rb") as f:
+            document = f.read()
+    form = {"uid": "bench-user", "docType": args.doc_type, "docNumber": args.doc_number}
+    latencies, statuses = [], {}
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if document is None:
+                upload = ("bench.pdf", synthetic_pdf(i))
+            else:
+                upload = (args.file.rsplit("/", 1)[-1], document)
+            started = time.monotonic()
+            try:
+                response = await client.post(
+                    f"{args.url.rstrip('/')}/upload-and-verify", data=form, files={"file": upload})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.monotonic() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def pct(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)
+
+    report = {
+        "url": args.url,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_p50": pct(0.50),
+        "latency_p95": pct(0.95),
+        "latency_p99": pct(0.99),
+        "latency_mean": round(statistics.mean(latencies), 3),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the verification services.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run a service with a fixture profile")
+    serve.add_argument("target", choices=["flask", "asgi"])
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=5001)
+    serve.add_argument("--threads", type=int, default=4, help="gthread slots (flask)")
+    serve.add_argument("--profile", help="JSON file with the profile to serve for every uid")
+    serve.add_argument("--profile-latency", type=float, default=0.15,
+                       help="seconds to sleep per profile lookup, standing in for Firestore")
+
+    load = sub.add_parser("load", help="send concurrent verifications")
+    load.add_argument("url")
+    load.add_argument("--file", help="document to upload (default: a unique synthetic PDF per request)")
+    load.add_argument("--doc-type", default="aadhaar")
+    load.add_argument("--doc-number", default="")
+    load.add_argument("-c", "--concurrency", type=int, default=32)
+    load.add_argument("-n", "--requests", type=int, default=128)
+    load.add_argument("--timeout", type=float, default=300)
+
+    args = parser.parse_args()
+    if args.command == "load":
+        asyncio.run(run_load(args))
+        return
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+    (serve_flask if args.target == "flask" else serve_asgi)(args, profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark signature detection on synthetic full-page scans.
+
+Compares the previous whole-page contour loop with
+DocumentProcessor._find_signatures (ROI-restricted, connected components,
+numpy filtering, fragment merging):
+
+    python bench_signatures.py --pages 10 --dpi 300
+
+--compare reports what each finds instead of how fast: on synthetic sample
+documents (print only, print plus a signature, an ID card) it counts boxes
+on the signature and boxes elsewhere; image or PDF paths given after it are
+listed with their box counts (rendered at 150 dpi, like scanned pages).
+
+    python bench_signatures.py --compare scans/*.pdf
+"""
+import argparse
+import os
+import statistics
+import time
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from document_reader import DocumentProcessor
+
+A4_INCHES = (8.27, 11.69)
+
+
+def legacy_signature_boxes(gray_img):
+    """The per-contour implementation this benchmark measures against: (boxes, contour count)."""
+    blurred = cv2.GaussianBlur(gray_img, (5, 5), 0)
+    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    signatures = []
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        area = cv2.contourArea(cnt)
+        if 500 < area < 2000 and 0.7 < (w / h) < 4.0 and y > gray_img.shape[0] * 0.6:
+            signatures.append((x, y, w, h))
+    return signatures, len(contours)
+
+
+def draw_signature(page, ox, oy, scale):
+    """A few connected pen strokes starting at (ox, oy); returns their (x, y, w, h) box."""
+    t = np.linspace(0, 4 * np.pi, 400)
+    points = []
+    for stroke in range(3):
+        xs = ox + stroke * 90 * scale + 60 * scale * t / (4 * np.pi) + 25 * scale * np.sin(3 * t + stroke)
+        ys = oy + 30 * scale * np.sin(t + stroke) * np.cos(0.5 * t)
+        pts = np.stack([xs, ys], axis=1).astype(np.int32).reshape(-1, 1, 2)
+        cv2.polylines(page, [pts], False, 10, max(2, int(3 * scale)))
+        points.append(pts)
+    return cv2.boundingRect(np.concatenate(points))
+
+
+def synthetic_page(seed, dpi, signature=True):
+    """
+    Dense printed text over the whole page plus (optionally) one handwritten-style
+    signature near the bottom. Returns (page, signature box or None).
+    """
+    rng = np.random.default_rng(seed)
+    width, height = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    page = np.full((height, width), 245, np.uint8)
+    scale = dpi / 300
+    line_height = int(38 * scale)
+    words = ["Name", "Father", "Address", "Date", "of", "Birth", "Government", "India", "Number", "Issued"]
+    for y in range(int(120 * scale), int(height * 0.85), line_height):
+        line = " ".join(rng.choice(words, size=12))
+        cv2.putText(page, line, (int(80 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.9 * scale, 20, max(1, int(2 * scale)))
+
+    # Signature in the lower right
+    box = draw_signature(page, int(width * 0.62), int(height * 0.9), scale) if signature else None
+
+    noise = rng.normal(0, 6, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8), box
+
+
+def synthetic_card(seed, signature_scale=1.6):
+    """
+    An ID card at face-detection resolution (~19 px/mm): photo block, printed
+    fields, signature under the photo (about 5 mm tall at the default scale).
+    """
+    rng = np.random.default_rng(seed)
+    card = np.full((1010, 1600), 235, np.uint8)
+    cv2.rectangle(card, (60, 200), (420, 640), 90, -1)  # holder photo
+    words = ["NAME", "FATHER", "DOB", "01/01/1990", "INCOME", "TAX", "DEPARTMENT", "ABCPS1234K"]
+    for y in range(120, 900, 70):
+        line = " ".join(rng.choice(words, size=4))
+        cv2.putText(card, line, (480, y), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 25, 3)
+    box = draw_signature(card, 70, 820, signature_scale)
+    noise = rng.normal(0, 6, card.shape)
+    return np.clip(card + noise, 0, 255).astype(np.uint8), box
+
+
+def on_target(boxes, target):
+    """(boxes centred inside target, boxes elsewhere)."""
+    hits = 0
+    for x, y, w, h in boxes:
+        cx, cy = x + w / 2, y + h / 2
+        if target and target[0] <= cx <= target[0] + target[2] and target[1] <= cy <= target[1] + target[3]:
+            hits += 1
+    return hits, len(boxes) - hits
+
+
+def file_pages(path, dpi=150):
+    """Grayscale pages of an image or PDF file."""
+    if os.path.splitext(path)[1].lower() == ".pdf":
+        with fitz.open(path) as doc:
+            for page in doc:
+                pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                yield np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width).copy()
+    else:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is not None:
+            yield gray
+
+
+def compare(paths):
+    processor = DocumentProcessor()
+    samples = []
+    for dpi in (150, 200, 300):
+        for seed in range(3):
+            samples.append((f"page {dpi}dpi #{seed}", *synthetic_page(seed, dpi)))
+            samples.append((f"print only {dpi}dpi #{seed}", *synthetic_page(seed, dpi, signature=False)))
+    for seed in range(3):
+        samples.append((f"id card #{seed}", *synthetic_card(seed)))
+        samples.append((f"id card, small signature #{seed}", *synthetic_card(seed, 0.9)))
+    for path in paths:
+        for number, page in enumerate(file_pages(path)):
+            samples.append((f"{os.path.basename(path)} p{number + 1}", page, None))
+
+    print(f"{'sample':<32} {'legacy on/off signature':>24} {'new on/off signature':>21}")
+    for name, page, target in samples:
+        legacy = on_target(legacy_signature_boxes(page)[0], target)
+        new = on_target(processor._signature_boxes(page), target)
+        if target is None:
+            legacy, new = (f"{sum(legacy)} boxes",) * 1, (f"{sum(new)} boxes",)
+            print(f"{name:<32} {legacy[0]:>24} {new[0]:>21}")
+        else:
+            print(f"{name:<32} {legacy[0]:>16} / {legacy[1]:<5} {new[0]:>13} / {new[1]:<5}")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", nargs="*", metavar="FILE", help="compare detections instead of timing")
+    args = parser.parse_args()
+    if args.compare is not None:
+        compare(args.compare)
+        return
+
+    processor = DocumentProcessor()
+    legacy_ms, new_ms = [], []
+    print(f"{'page':>4} {'contours':>9} {'legacy ms':>10} {'legacy hits':>12} {'new ms':>8} {'new hits':>9}")
+    for i in range(args.pages):
+        page, _ = synthetic_page(i, args.dpi)
+        (legacy_hits, contours), legacy = timed(lambda: legacy_signature_boxes(page), args.repeat)
+        new_hits, new = timed(lambda: processor._find_signatures(page), args.repeat)
+        legacy_ms.append(legacy)
+        new_ms.append(new)
+        print(f"{i:>4} {contours:>9} {legacy:>10.1f} {len(legacy_hits):>12} {new:>8.1f} {len(new_hits):>9}")
+
+    legacy_med, new_med = statistics.median(legacy_ms), statistics.median(new_ms)
+    print(f"\n{args.pages} pages at {args.dpi} dpi: legacy {legacy_med:.1f} ms/page, "
+          f"new {new_med:.1f} ms/page ({legacy_med / new_med:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
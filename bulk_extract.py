@@ -0,0 +1,267 @@
+"""
+Offline bulk extraction and comparison.
+
+Runs the same pipeline as /upload-and-verify over many stored documents:
+
+    python bulk_extract.py ./scans --out results.jsonl --profiles profiles.json
+    python bulk_extract.py manifest.jsonl --out results.jsonl --firestore --workers 6
+
+The input is either a directory of .pdf/.jpg/.jpeg/.png files or a JSONL
+manifest with one {"id", "path", "uid", "docType", "profile"} object per line
+(only "path" is required). OCR and face detection run in a process pool; the
+LLM calls run on a thread pool in the parent so they overlap with CPU work.
+
+Results are appended to --out one line per document as soon as they finish.
+Re-running the same command skips ids already present in --out, so a crashed
+or interrupted run resumes where it stopped; documents that failed are
+dropped from --out and retried, leaving one record per id.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import cpu_tasks
+from compare_agent import DocumentComparator
+from personal_details import normalize_personal_details
+
+SUPPORTED = ('.jpg', '.jpeg', '.png', '.pdf')
+
+
+# === INPUT ===
+def load_jobs(source):
+    """Jobs from a directory listing or a JSONL manifest."""
+    if os.path.isdir(source):
+        jobs = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED):
+                    path = os.path.join(root, name)
+                    jobs.append({"id": os.path.relpath(path, source), "path": path})
+        return sorted(jobs, key=lambda job: job["id"])
+
+    jobs = []
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if "path" not in job:
+                raise ValueError(f"{source}:{line_no}: manifest entry has no 'path'")
+            if not os.path.isabs(job["path"]):
+                job["path"] = os.path.join(base, job["path"])
+            job.setdefault("id", job["path"])
+            jobs.append(job)
+    return jobs
+
+
+def completed_ids(out_path):
+    """
+    Ids already written to the output. Failed documents are removed from the
+    file (and not counted) so a re-run retries them without leaving their
+    error record behind; a torn last line from a crash is cut off too.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    kept, dropped = [], False
+    with open(out_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                record_id = record["id"]
+            except (ValueError, KeyError):
+                dropped = True
+                break
+            if "error" in record:
+                dropped = True
+            else:
+                done.add(record_id)
+                kept.append(line)
+    if dropped:
+        tmp = f"{out_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.writelines(kept)
+        os.replace(tmp, out_path)
+    return done
+
+
+class ProfileSource:
+    """Profiles from the manifest, a {uid: profile} JSON file or Firestore."""
+
+    def __init__(self, profiles_path=None, use_firestore=False):
+        self.profiles = {}
+        if profiles_path:
+            with open(profiles_path, encoding="utf-8") as f:
+                self.profiles = json.load(f)
+        self.firebase = None
+        if use_firestore:
+            from firebase_service import FirebaseService
+            self.firebase = FirebaseService()
+
+    def get(self, job):
+        if job.get("profile"):
+            return job["profile"]
+        uid = job.get("uid")
+        if not uid:
+            return None
+        if uid not in self.profiles and self.firebase:
+            self.profiles[uid] = self.firebase.get_user_profile(uid)
+        return self.profiles.get(uid)
+
+
+# === STAGES ===
+def analyze_job(job):
+    """CPU stage (worker process): text, faces and signatures of one file."""
+    started = time.monotonic()
+    result, text = cpu_tasks.analyze_file(job["path"])
+
+    # Crops stay out of the results file; keep counts only
+    result["faces"] = len(result["faces"])
+    result["signatures"] = len(result["signatures"])
+    result.pop("face_image_bytes", None)
+    result.pop("face_image_base64", None)
+    result["pipeline_stats"]["cpu_seconds"] = round(time.monotonic() - started, 3)
+    return result, text
+
+
+def llm_job(agent, job, result, text, profiles):
+    """LLM stage (parent thread): personal details and the profile comparison."""
+    agent.add_personal_details(result, text, job.get("docType"))
+    record = {
+        "id": job["id"],
+        "path": job["path"],
+        "uid": job.get("uid"),
+        "document_type": job.get("docType"),
+        "extracted_data": result,
+        "personal_details": normalize_personal_details(result.get("personal_details", {})),
+        "comparison_result": None,
+    }
+    profile = profiles.get(job)
+    if profile:
+        comparator = DocumentComparator(profile, record["personal_details"], job.get("docType"))
+        record["comparison_result"] = comparator.compare_fields()
+    return record
+
+
+# === OUTPUT ===
+class ResultWriter:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class Progress:
+    def __init__(self, total, every=5.0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.every = every
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def update(self, ok=True, force=False):
+        self.done += 1
+        self.failed += 0 if ok else 1
+        now = time.monotonic()
+        if not force and now - self._last < self.every and self.done < self.total:
+            return
+        self._last = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        print(f"📦 {self.done}/{self.total} done ({self.failed} failed) | "
+              f"{rate:.2f} docs/s | ETA {eta:,.0f}s", flush=True)
+
+
+# === DRIVER ===
+def run(args):
+    from extract_agent import ExtractionAgent
+
+    jobs = load_jobs(args.source)
+    done = completed_ids(args.out)
+    todo = [job for job in jobs if job["id"] not in done]
+    print(f"🗂️ {len(jobs)} documents, {len(done)} already in {args.out}, {len(todo)} to process")
+    if not todo:
+        return 0
+
+    profiles = ProfileSource(args.profiles, args.firestore)
+    agent = ExtractionAgent()  # LLM stage only; CPU work happens in the workers
+    writer = ResultWriter(args.out)
+    progress = Progress(len(todo))
+    window = args.workers * 2
+    queue = iter(todo)
+    pending = {}
+
+    def fail(job, error):
+        writer.write({"id": job["id"], "path": job["path"], "uid": job.get("uid"), "error": str(error)})
+        progress.update(ok=False)
+
+    with ProcessPoolExecutor(args.workers, initializer=cpu_tasks.init_worker) as cpu_pool, \
+            ThreadPoolExecutor(args.llm_workers, thread_name_prefix="bulk-llm") as llm_pool:
+
+        def refill():
+            cpu_in_flight = sum(1 for stage, _ in pending.values() if stage == "cpu")
+            while cpu_in_flight < window:
+                job = next(queue, None)
+                if job is None:
+                    return
+                pending[cpu_pool.submit(analyze_job, job)] = ("cpu", job)
+                cpu_in_flight += 1
+
+        try:
+            refill()
+            while pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, job = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        print(f"❌ {job['id']}: {e}")
+                        fail(job, e)
+                        continue
+                    if stage == "cpu":
+                        result, text = outcome
+                        pending[llm_pool.submit(llm_job, agent, job, result, text, profiles)] = ("llm", job)
+                    else:
+                        writer.write(outcome)
+                        progress.update()
+                refill()
+        except KeyboardInterrupt:
+            print("⏹️ Interrupted; re-run the same command to resume.")
+            for future in pending:
+                future.cancel()
+            return 130
+        finally:
+            writer.close()
+
+    print(f"✅ Finished {progress.done} documents ({progress.failed} failed) "
+          f"in {time.monotonic() - progress.started:,.1f}s -> {args.out}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk document extraction and profile comparison.")
+    parser.add_argument("source", help="directory of documents or JSONL manifest")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL results file (also the resume checkpoint)")
+    parser.add_argument("--profiles", help="JSON file mapping uid -> profile")
+    parser.add_argument("--firestore", action="store_true", help="fetch missing profiles from Firestore")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="CPU stage processes")
+    parser.add_argument("--llm-workers", type=int, default=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                        help="concurrent LLM calls")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Calibrate the image quality gate (DocumentProcessor.assess_quality) on a
+synthetic corpus of ID-card photos, page photos and flatbed scans, each
+rendered clean and with usable (mild) and hopeless degradations:
+
+    python calibrate_quality.py --samples 12
+
+For every metric the threshold that best separates usable images from the
+ones hopeless in that respect is printed, followed by the false-reject and
+catch rates of the thresholds currently configured.
+"""
+import argparse
+import statistics
+
+import cv2
+import numpy as np
+
+import document_reader
+from document_reader import DocumentProcessor
+from image_decode import decode_image, image_size
+
+FRAME = (2000, 1500)  # synthetic camera resolution (width, height)
+WORDS = ["NAME", "Ravi", "Kumar", "DOB", "01/01/1990", "Father", "Address", "Government", "of", "India",
+         "MALE", "1234", "5678", "9012", "Bengaluru", "Karnataka", "Issued", "Permanent", "Account"]
+
+
+# === CORPUS ===
+def _text_lines(img, rng, box, line_height, scale, color):
+    x0, y0, x1, y1 = box
+    for y in range(y0 + line_height, y1, line_height):
+        line = " ".join(rng.choice(WORDS, size=int(rng.integers(3, 8))))
+        cv2.putText(img, line, (x0, y), cv2.FONT_HERSHEY_SIMPLEX, scale, color, max(1, int(scale * 2)))
+
+
+def _card(rng):
+    width, height = 1712, 1080
+    card = np.zeros((height, width, 3), np.uint8)
+    card[:] = rng.integers(170, 245, 3)
+    cv2.rectangle(card, (0, 0), (width, 140), tuple(int(c) for c in rng.integers(60, 160, 3)), -1)
+    cv2.putText(card, "GOVERNMENT OF INDIA", (420, 95), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (255, 255, 255), 5)
+    cv2.rectangle(card, (80, 220), (480, 720), (90, 90, 110), -1)  # photo
+    cv2.ellipse(card, (280, 420), (110, 140), 0, 0, 360, (150, 160, 190), -1)
+    _text_lines(card, rng, (560, 200, 1650, 900), 95, 1.6, (25, 25, 25))
+    cv2.putText(card, "1234 5678 9012", (560, 1010), cv2.FONT_HERSHEY_SIMPLEX, 2.6, (10, 10, 10), 6)
+    return card
+
+
+def _page(rng):
+    width, height = 1654, 2339
+    page = np.full((height, width, 3), 248, np.uint8)
+    _text_lines(page, rng, (120, 150, 1500, 2150), 62, 1.2, (30, 30, 30))
+    return page
+
+
+def _into_scene(doc, rng, fill):
+    """Warp a document into a textured background so that it spans `fill` of the frame width."""
+    width, height = FRAME
+    small = rng.integers(40, 140, (height // 50, width // 50, 3), dtype=np.uint8)
+    scene = cv2.resize(small, FRAME, interpolation=cv2.INTER_CUBIC)
+    dh, dw = doc.shape[:2]
+    out_w = fill * width
+    out_h = min(out_w * dh / dw, 0.9 * height)
+    out_w = out_h * dw / dh
+    cx, cy = width / 2 + rng.uniform(-0.05, 0.05) * width, height / 2 + rng.uniform(-0.05, 0.05) * height
+    jitter = rng.uniform(-0.04, 0.04, (4, 2)) * [out_w, out_h]
+    dst = np.float32([[cx - out_w / 2, cy - out_h / 2], [cx + out_w / 2, cy - out_h / 2],
+                      [cx + out_w / 2, cy + out_h / 2], [cx - out_w / 2, cy + out_h / 2]]) + jitter
+    src = np.float32([[0, 0], [dw, 0], [dw, dh], [0, dh]])
+    matrix = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+    cv2.warpPerspective(doc, matrix, FRAME, scene, borderMode=cv2.BORDER_TRANSPARENT)
+    return scene
+
+
+def base_images(rng):
+    """(kind, BGR image) pairs for one seed."""
+    card = _into_scene(_card(rng), rng, rng.uniform(0.55, 0.85))
+    page_photo = _into_scene(_page(rng), rng, rng.uniform(0.5, 0.65))
+    scan = _page(rng)
+    return [("card photo", card), ("page photo", page_photo), ("scan", scan)]
+
+
+def _glare(img, rng, radius_fraction):
+    height, width = img.shape[:2]
+    cx, cy = width * rng.uniform(0.35, 0.65), height * rng.uniform(0.35, 0.65)
+    yy, xx = np.mgrid[0:height, 0:width]
+    radius = radius_fraction * max(width, height)
+    blob = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * (radius / 2) ** 2)) * 600
+    return np.clip(img.astype(np.float32) + blob[..., None], 0, 255).astype(np.uint8)
+
+
+def _motion(img, length):
+    kernel = np.zeros((length, length), np.float32)
+    kernel[length // 2, :] = 1 / length
+    return cv2.filter2D(img, -1, kernel)
+
+
+def _resize_to(img, long_side):
+    scale = long_side / max(img.shape[:2])
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+# name -> (degradation, the metric it must trip, or None for usable variants)
+DEGRADATIONS = {
+    "clean": (lambda img, rng: img, None),
+    "sensor noise": (lambda img, rng: np.clip(img + rng.normal(0, 8, img.shape), 0, 255).astype(np.uint8), None),
+    "mild blur": (lambda img, rng: cv2.GaussianBlur(img, (0, 0), 1.2), None),
+    "dim": (lambda img, rng: (img * 0.55).astype(np.uint8), None),
+    "small glare": (lambda img, rng: _glare(img, rng, 0.03), None),
+    "medium resolution": (lambda img, rng: _resize_to(img, 1000), None),
+    "heavy blur": (lambda img, rng: cv2.GaussianBlur(img, (0, 0), 7), "sharpness"),
+    "motion blur": (lambda img, rng: _motion(img, 45), "sharpness"),
+    "dark": (lambda img, rng: np.clip(img * 0.12 + rng.normal(0, 3, img.shape), 0, 255).astype(np.uint8),
+             "brightness"),
+    "washed out": (lambda img, rng: (205 + img * 0.15).astype(np.uint8), "contrast"),
+    "glare": (lambda img, rng: _glare(img, rng, 0.12), "glare"),
+    "low resolution": (lambda img, rng: _resize_to(img, 380), "document_side_px"),
+}
+
+# Direction of each metric: True when larger values are better
+HIGHER_IS_BETTER = {"sharpness": True, "brightness": True, "contrast": True, "glare": False,
+                    "document_side_px": True}
+CONFIG = {"sharpness": "QUALITY_MIN_SHARPNESS", "brightness": "QUALITY_MIN_BRIGHTNESS",
+          "contrast": "QUALITY_MIN_CONTRAST", "glare": "QUALITY_MAX_GLARE",
+          "document_side_px": "QUALITY_MIN_DOCUMENT_SIDE"}
+
+
+def assess(processor, img):
+    """Run the gate the way ExtractionAgent does: JPEG upload -> grayscale thumbnail decode."""
+    data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    return processor.assess_quality(decode_image(data, document_reader.QUALITY_MAX_SIDE, gray=True), image_size(data))
+
+
+def best_threshold(good, bad, higher_is_better):
+    """Threshold maximizing balanced accuracy between usable and hopeless values."""
+    candidates = sorted(set(good) | set(bad))
+    best = (0, None)
+    for low, high in zip(candidates, candidates[1:]):
+        # Metrics spanning orders of magnitude split best on a log scale
+        t = (low * high) ** 0.5 if low > 0 else (low + high) / 2
+        if higher_is_better:
+            accuracy = (sum(v >= t for v in good) / len(good) + sum(v < t for v in bad) / len(bad)) / 2
+        else:
+            accuracy = (sum(v <= t for v in good) / len(good) + sum(v > t for v in bad) / len(bad)) / 2
+        if accuracy > best[0]:
+            best = (accuracy, t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=8, help="seeds per document kind")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor()
+    rows = []  # (kind, degradation, expected metric, report)
+    for seed in range(args.samples):
+        rng = np.random.default_rng(seed)
+        for kind, img in base_images(rng):
+            for name, (degrade, metric) in DEGRADATIONS.items():
+                rows.append((kind, name, metric, assess(processor, degrade(img, rng))))
+
+    usable = [r for r in rows if r[2] is None]
+    print(f"{len(rows)} images ({len(usable)} usable), gate "
+          f"{statistics.median(r[3]['metrics']['ms'] for r in rows):.1f} ms median\n")
+
+    print(f"{'metric':<18} {'usable (min-max)':>22} {'hopeless (min-max)':>22} {'best':>9} {'bal.acc':>8} "
+          f"{'configured':>11}")
+    for metric, higher in HIGHER_IS_BETTER.items():
+        good = [r[3]["metrics"][metric] for r in usable]
+        bad = [r[3]["metrics"][metric] for r in rows if r[2] == metric]
+        accuracy, threshold = best_threshold(good, bad, higher)
+        configured = getattr(document_reader, CONFIG[metric])
+        print(f"{metric:<18} {min(good):>10.4g} - {max(good):<9.4g} {min(bad):>10.4g} - {max(bad):<9.4g} "
+              f"{threshold:>9.4g} {accuracy:>8.3f} {configured:>11g}")
+
+    print("\nWith the configured thresholds:")
+    print(f"{'degradation':<20} {'rejected':>9}  reasons")
+    for name, (_, metric) in DEGRADATIONS.items():
+        reports = [r[3] for r in rows if r[1] == name]
+        rejected = sum(not report["ok"] for report in reports)
+        reasons = sorted({reason.split(".")[0] for report in reports for reason in report["reasons"]})
+        label = "usable" if metric is None else "hopeless"
+        print(f"{name:<20} {rejected:>4}/{len(reports):<4}  ({label}) {'; '.join(reasons)}")
+
+
+if __name__ == "__main__":
+    main()
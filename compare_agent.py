@@ -1,8 +1,77 @@
+import logging
 from rapidfuzz import fuzz
 from datetime import datetime
 import re
 
+from structured_logging import log_payload
+
+logger = logging.getLogger(__name__)
+
 class DocumentComparator:
+    # Document-specific field mappings
+    DOCUMENT_FIELD_MAPPINGS = {
+        "aadhaar": {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "date_of_birth": ["DOB", "Date of Birth", "Year of Birth"],
+            "contact": ["Mobile", "Phone", "Contact Number", "Mobile:", "Phone Number", "Phone Numbers", "Contact","contact"],
+            "address": ["Address", "Residential Address"],
+            "aadhar_number": ["Aadhar No", "UID", "Unique ID", "Aadhaar Number", "Aadhaar No", "Aadhaar","aadhaar"],
+        },
+        "passport": {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "date_of_birth": ["DOB", "Date of Birth"],
+            "passport_number": ["Passport No", "Document Number"],
+            "nationality": ["Nationality"],
+            "place_of_birth": ["Place of Birth"]
+        },
+        "bonafide": {
+            "name": ["Name", "Student Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "university": ["University", "University Name"],
+            "college": ["College", "College Name", "Institution"],
+            "course": ["Course", "Degree"],
+            "year": ["Year", "Academic Year"]
+        },
+        'driving_license': {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "date_of_birth": ["DOB", "Date of Birth"],
+        },
+        "caste_certificate": {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "caste": ["Caste", "Caste Category", "Caste Name"],
+            "date_of_birth": ["DOB", "Date of Birth", "Year of Birth"],
+        },
+        "voter_id": {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "date_of_birth": ["DOB", "Date of Birth"],
+        },
+        "income_certificate": {
+            "name": ["Name", "Full Name", "Holder's Name"],
+            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+            "date_of_birth": ["DOB", "Date of Birth"],
+        }
+        
+    }
+    
+    # Default field mapping (used when no specific document type is specified)
+    DEFAULT_FIELD_MAP = { 
+        "name": ["Name", "Full Name", "Holder's Name", "Student Name"],
+        'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
+        "motherName": ["Mother", "Mother Name", "Mother's Name", "D/O"],
+        "date_of_birth": ["DOB", "Date of Birth", "Birth Date", "Date of Issue","dob"],
+        "contact": ["Mobile", "Phone", "Contact Number", "Mobile:"],
+        "address": ["Address", "Residential Address"],
+        "category": ["Category", "Caste", "Caste Category"],
+        "previousSchool_College": ["School", "College", "Institution"],
+        "YearOfPassing": ["Year of Passing", "Passing Year"],
+        "Marks_Grade": ["Grade", "Marks", "Percentage"]
+    }
+
     def __init__(self, profile_data: dict, extracted_data: dict, document_type: str = None, threshold: int = 60):
         self.profile_data = profile_data
         self.document_data = extracted_data
@@ -10,70 +79,17 @@ class DocumentComparator:
         self.extracted = self.flatten_nested(extracted_data)
         self.threshold = threshold
         self.document_type = document_type.lower() if document_type else None
-        print(f"[DocumentComparator] Initialized with document type: {self.document_type} and threshold: {self.threshold}")
-        # Document-specific field mappings
-        self.document_field_mappings = {
-            "aadhaar": {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "date_of_birth": ["DOB", "Date of Birth", "Year of Birth"],
-                "contact": ["Mobile", "Phone", "Contact Number", "Mobile:", "Phone Number", "Phone Numbers", "Contact","contact"],
-                "address": ["Address", "Residential Address"],
-                "aadhar_number": ["Aadhar No", "UID", "Unique ID", "Aadhaar Number", "Aadhaar No", "Aadhaar","aadhaar"],
-            },
-            "passport": {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "date_of_birth": ["DOB", "Date of Birth"],
-                "passport_number": ["Passport No", "Document Number"],
-                "nationality": ["Nationality"],
-                "place_of_birth": ["Place of Birth"]
-            },
-            "bonafide": {
-                "name": ["Name", "Student Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "university": ["University", "University Name"],
-                "college": ["College", "College Name", "Institution"],
-                "course": ["Course", "Degree"],
-                "year": ["Year", "Academic Year"]
-            },
-            'driving_license': {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "date_of_birth": ["DOB", "Date of Birth"],
-            },
-            "caste_certificate": {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "caste": ["Caste", "Caste Category", "Caste Name"],
-                "date_of_birth": ["DOB", "Date of Birth", "Year of Birth"],
-            },
-            "voter_id": {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "date_of_birth": ["DOB", "Date of Birth"],
-            },
-            "income_certificate": {
-                "name": ["Name", "Full Name", "Holder's Name"],
-                'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-                "date_of_birth": ["DOB", "Date of Birth"],
-            }
-            
-        }
-        
-        # Default field mapping (used when no specific document type is specified)
-        self.default_field_map = { 
-            "name": ["Name", "Full Name", "Holder's Name", "Student Name"],
-            'father_name': ['father_name', 'fatherName', 'father', 'Father', "Father's Name", "F/O", "S/O"],
-            "motherName": ["Mother", "Mother Name", "Mother's Name", "D/O"],
-            "date_of_birth": ["DOB", "Date of Birth", "Birth Date", "Date of Issue","dob"],
-            "contact": ["Mobile", "Phone", "Contact Number", "Mobile:"],
-            "address": ["Address", "Residential Address"],
-            "category": ["Category", "Caste", "Caste Category"],
-            "previousSchool_College": ["School", "College", "Institution"],
-            "YearOfPassing": ["Year of Passing", "Passing Year"],
-            "Marks_Grade": ["Grade", "Marks", "Percentage"]
-        }
+        logger.debug("Initialized with document type: %s and threshold: %s", self.document_type, self.threshold)
+        self.document_field_mappings = self.DOCUMENT_FIELD_MAPPINGS
+        self.default_field_map = self.DEFAULT_FIELD_MAP
+
+    @classmethod
+    def field_map_for(cls, document_type: str = None) -> dict:
+        """Field mapping for a document type without building a comparator"""
+        document_type = document_type.lower() if document_type else None
+        if document_type and document_type in cls.DOCUMENT_FIELD_MAPPINGS:
+            return cls.DOCUMENT_FIELD_MAPPINGS[document_type]
+        return cls.DEFAULT_FIELD_MAP
 
     def get_field_map(self):
         """Return the appropriate field mapping based on document type"""
@@ -158,9 +174,10 @@ class DocumentComparator:
         if profile_field in field_map:
             candidate_keys.extend(field_map[profile_field])
 
-        print(f"[DEBUG] Searching for profile field: '{profile_field}'")
-        print(f"[DEBUG] Candidate keys from field map: {candidate_keys}")
-        print(f"[DEBUG] Extracted keys available: {list(self.extracted.keys())[:10]}")  # show sample keys
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Searching for profile field %r; candidate keys %s; extracted keys (sample) %s",
+                         profile_field, candidate_keys, list(self.extracted)[:10])
 
         # Check all extracted keys if they contain any candidate key substring
         for candidate in candidate_keys:
@@ -168,7 +185,7 @@ class DocumentComparator:
                 if candidate.lower() in k.lower():
                     val = self.extracted.get(k, "")
                     if isinstance(val, str) and val.strip():
-                        print(f"[DEBUG] Match found for '{profile_field}': key='{k}', value='{val}'")
+                        logger.debug("Match found for %r: key=%r", profile_field, k)
                         return val.strip()
 
         # Fallback: try keys containing profile_field itself
@@ -176,66 +193,54 @@ class DocumentComparator:
             if profile_field.lower() in k.lower():
                 val = self.extracted.get(k, "")
                 if isinstance(val, str) and val.strip():
-                    print(f"[DEBUG] Fallback match for '{profile_field}': key='{k}', value='{val}'")
+                    logger.debug("Fallback match for %r: key=%r", profile_field, k)
                     return val.strip()
 
-        print(f"[DEBUG] No match found for '{profile_field}'")
+        if debug:
+            logger.debug("No match found for %r", profile_field)
         return ""
 
-    def compare_fields(self):
-        results = {}
-        matched_fields = 0
-        field_map = self.get_field_map()
-        
-        # Determine fields to compare based on document type or profile keys
+    def fields_to_compare(self):
+        """Fields scored for this document type (or the profile's own keys)"""
         if self.document_type and self.document_type in self.document_field_mappings:
-            fields_to_compare = list(field_map.keys())
-        else:
-            fields_to_compare = list(self.profile.keys())
-            
-        total_fields = len(fields_to_compare)
+            return list(self.get_field_map().keys())
+        return list(self.profile.keys())
 
-        for profile_field in fields_to_compare:
-            if profile_field not in self.profile:
-                continue
-                
-            profile_value = self.profile[profile_field]
-            extracted_value = self.find_best_match(profile_field)
-            cleaned_profile = self.clean_text(profile_value, profile_field)
-            cleaned_extracted = self.clean_text(extracted_value, profile_field)
-
-            # Log actual comparison values
-            print(f"Comparing field: {profile_field}")
-            print(f"  Profile Value (cleaned): '{cleaned_profile}'")
-            print(f"  Extracted Value (cleaned): '{cleaned_extracted}'")
-
-            # Skip empty profile values
-            if not cleaned_profile:
-                results[profile_field] = {
-                    "profile_value": profile_value,
-                    "extracted_value": extracted_value,
-                    "similarity": 0,
-                    "match": False
-                }
-                continue
+    def compare_field(self, profile_field):
+        """Score one profile field against the extracted data"""
+        profile_value = self.profile[profile_field]
+        extracted_value = self.find_best_match(profile_field)
+        cleaned_profile = self.clean_text(profile_value, profile_field)
+        cleaned_extracted = self.clean_text(extracted_value, profile_field)
 
-            # Special comparison for dates (exact match)
-            if "date" in profile_field.lower() or "dob" in profile_field.lower():
-                similarity = 100 if cleaned_profile == cleaned_extracted else 0
-            else:
-                similarity = fuzz.token_sort_ratio(cleaned_profile, cleaned_extracted)
+        # Values are personal data: only logged with LOG_PAYLOADS at DEBUG
+        log_payload(logger, f"Comparing field: {profile_field}",
+                    {"profile": cleaned_profile, "extracted": cleaned_extracted})
 
-            is_match = similarity >= self.threshold
-            if is_match:
-                matched_fields += 1
-
-            results[profile_field] = {
+        # Skip empty profile values
+        if not cleaned_profile:
+            return {
                 "profile_value": profile_value,
                 "extracted_value": extracted_value,
-                "similarity": similarity,
-                "match": is_match
+                "similarity": 0,
+                "match": False
             }
 
+        # Special comparison for dates (exact match)
+        if "date" in profile_field.lower() or "dob" in profile_field.lower():
+            similarity = 100 if cleaned_profile == cleaned_extracted else 0
+        else:
+            similarity = fuzz.token_sort_ratio(cleaned_profile, cleaned_extracted)
+
+        return {
+            "profile_value": profile_value,
+            "extracted_value": extracted_value,
+            "similarity": similarity,
+            "match": similarity >= self.threshold
+        }
+
+    def summarize(self, results, total_fields):
+        matched_fields = sum(1 for detail in results.values() if detail["match"])
         overall_score = (matched_fields / total_fields * 100) if total_fields else 0
         verdict = "correct" if overall_score >= self.threshold else "incorrect"
 
@@ -247,3 +252,30 @@ class DocumentComparator:
             "document_type": self.document_type,
             "details": results
         }
+
+    def compare_fields(self):
+        fields_to_compare = self.fields_to_compare()
+        results = {field: self.compare_field(field) for field in fields_to_compare if field in self.profile}
+        return self.summarize(results, len(fields_to_compare))
+
+    def changed_fields(self, previous: dict) -> list:
+        """Fields whose profile value differs from the one a previous compare_fields() result used"""
+        details = previous.get("details", {})
+        return [field for field in self.fields_to_compare()
+                if field in self.profile
+                and (field not in details or details[field].get("profile_value") != self.profile[field])]
+
+    def recompare(self, previous: dict, fields: list = None):
+        """
+        Update a previous compare_fields() result for this profile, scoring only
+        `fields` (default: the changed ones) and reusing the other field results
+        """
+        fields = set(self.changed_fields(previous) if fields is None else fields)
+        details = previous.get("details", {})
+        fields_to_compare = self.fields_to_compare()
+        results = {}
+        for field in fields_to_compare:
+            if field not in self.profile:
+                continue
+            results[field] = self.compare_field(field) if field in fields or field not in details else details[field]
+        return self.summarize(results, len(fields_to_compare))
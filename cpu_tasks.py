@@ -0,0 +1,45 @@
+"""
+Process-pool entry points for the CPU-bound stages (OCR, Haar cascades, ORB).
+
+Each worker process builds its own ExtractionAgent once in init_worker; the
+functions below take and return only picklable values.
+"""
+import os
+
+from document_context import DocumentContext
+from face_matcher import match_face
+
+_agent = None
+
+
+def init_worker():
+    global _agent
+    from extract_agent import ExtractionAgent
+    _agent = ExtractionAgent()
+
+
+def analyze_document(file_data, filename, plan=None):
+    """ExtractionAgent.analyze (through the shared cache) on raw bytes under a StagePlan; returns (result, text)."""
+    return _agent.analyze_cached(DocumentContext(file_data, filename), plan)
+
+
+def analyze_file(path):
+    """analyze_document for a file on disk, so only the path crosses the process boundary."""
+    with open(path, "rb") as f:
+        return analyze_document(f.read(), os.path.basename(path))
+
+
+def compare_uploaded_face(document_faces_jpeg, face_data, face_filename, prior_faces=()):
+    """
+    Decode the uploaded face and ORB-match it against every document face crop
+    (and prior faces). Returns (face_result, uploaded_face_data_url).
+    """
+    face_ctx = DocumentContext(face_data, face_filename)
+    uploaded_face = face_ctx.data_url if face_ctx.face_image is not None else None
+    if not document_faces_jpeg:
+        return {"photoMatch": "no face detected in document", "faceSimilarity": None}, uploaded_face
+
+    document_faces = [DocumentContext(face).image for face in document_faces_jpeg]
+    if face_ctx.face_gray is None or any(face is None for face in document_faces):
+        return {"photoMatch": "invalid face images", "faceSimilarity": None}, uploaded_face
+    return match_face(face_ctx.face_gray, document_faces, prior_faces), uploaded_face
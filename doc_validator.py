@@ -1,6 +1,38 @@
 import re
 from datetime import datetime
 
+# Verhoeff tables: dihedral group D5 multiplication and position permutations
+VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+PAN_PATTERN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$')
+PASSPORT_PATTERN = re.compile(r'^[A-Z]{1}[0-9]{7}$')
+DRIVING_LICENSE_PATTERN = re.compile(r'^[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{7}$')
+CASTE_CERTIFICATE_PATTERN = re.compile(r'^CND\d{13}$')
+VOTER_ID_PATTERN = re.compile(r'^[A-Z]{3}[0-9]{7}$')
+INCOME_CERTIFICATE_PATTERN = re.compile(r'^IC\d{12}$')
+
+
 class DocumentValidator:
     @staticmethod
     def validate_aadhaar(number):
@@ -17,8 +49,7 @@ class DocumentValidator:
     @staticmethod
     def validate_pan(number):
         """Validate PAN card format"""
-        pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$'
-        if not re.match(pattern, number.upper()):
+        if not PAN_PATTERN.match(number.upper()):
             return 'invalid', "Format: ABCDE1234F"
         
         # Validate checksum letter (5th character should match)
@@ -30,7 +61,7 @@ class DocumentValidator:
         if not number or len(number) != 8:
             return 'invalid', "Must be 8 characters"
         
-        if not re.match(r'^[A-Z]{1}[0-9]{7}$', number.upper()):
+        if not PASSPORT_PATTERN.match(number.upper()):
             return 'invalid', "Format: A1234567"
         
         return 'valid', "Valid Passport"
@@ -40,7 +71,7 @@ class DocumentValidator:
         """Validate Indian Driving License"""
         if not number or len(number) < 10:
             return 'invalid', "Too short (min 10 chars)"
-        if not re.match(r'^[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{7}$', number.upper()):
+        if not DRIVING_LICENSE_PATTERN.match(number.upper()):
             return 'invalid', "Format: AB12C3456789"
         
         # Additional format checks for specific states
@@ -50,7 +81,7 @@ class DocumentValidator:
         """Validate Caste Certificate"""
         if not number or len(number) < 10:
             return 'invalid', "Too short (min 10 chars)"
-        if not re.match(r'^CND\d{13}$', number.upper()):
+        if not CASTE_CERTIFICATE_PATTERN.match(number.upper()):
             return 'invalid', "Format: CND1234567890123"
         
         # Additional format checks for specific states
@@ -60,7 +91,7 @@ class DocumentValidator:
         """Validate Voter ID"""
         if not number or len(number) < 10:
             return 'invalid', "Too short (min 10 chars)"
-        if not re.match(r'^[A-Z]{3}[0-9]{7}$', number.upper()):
+        if not VOTER_ID_PATTERN.match(number.upper()):
             return 'invalid', "Format: ABC1234567"
         
         # Additional format checks for specific states
@@ -70,7 +101,7 @@ class DocumentValidator:
         """Validate Income Certificate"""
         if not number or len(number) < 10:
             return 'invalid', "Too short (min 10 chars)"
-        if not re.match(r'^IC\d{12}$', number.upper()):
+        if not INCOME_CERTIFICATE_PATTERN.match(number.upper()):
             return 'invalid', "Format: IC123456789012"
         
         # Additional format checks for specific states
@@ -80,38 +111,27 @@ class DocumentValidator:
     @staticmethod
     def _verhoeff_validate(number):
         """Verhoeff algorithm for Aadhaar validation"""
-        d = [
-            [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
-            [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
-            [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
-            [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
-            [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
-            [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
-            [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
-            [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
-            [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
-            [9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
-        ]
-        
-        p = [
-            [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
-            [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
-            [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
-            [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
-            [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
-            [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
-            [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
-            [7, 0, 4, 6, 9, 1, 3, 2, 5, 8]
-        ]
-        
-        inv = [0, 4, 3, 2, 1, 5, 6, 7, 8, 9]
-        
         c = 0
         for i, digit in enumerate(reversed(number)):
-            c = d[c][p[i % 8][int(digit)]]
+            c = VERHOEFF_D[c][VERHOEFF_P[i % 8][int(digit)]]
         
         return c == 0
     @staticmethod
+    def validate(doc_type, number):
+        """Run the validator for doc_type; None when the type has no validator."""
+        validators = {
+            'aadhaar': DocumentValidator.validate_aadhaar,
+            'pan': DocumentValidator.validate_pan,
+            'passport': DocumentValidator.validate_passport,
+            'driving_license': DocumentValidator.validate_driving_license,
+            'caste_certificate': DocumentValidator.validate_caste_certificate,
+            'voter_id': DocumentValidator.validate_voter_id,
+            'income_certificate': DocumentValidator.validate_income_certificate,
+        }
+        validator = validators.get(doc_type)
+        return validator(number) if validator else None
+
+    @staticmethod
     def get_validation_details(doc_type, doc_number):
         # Placeholder implementation — customize as needed
         return {"info": f"Details for {doc_type} - {doc_number}"}
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import os
+import time
+
+import cv2
+import numpy as np
+
+from image_decode import FACE_MAX_SIDE, OCR_MAX_SIDE, THUMBNAIL_MAX_SIDE, decode_image, downscale, image_size
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF", "application/pdf"),
+)
+
+
+class DocumentContext:
+    """
+    Per-request view of one uploaded file.
+
+    Decoded arrays, grayscale copies and encoded artifacts are built lazily on
+    first use and then shared by extraction, face comparison and response
+    building, so each conversion happens at most once per request.
+    """
+
+    def __init__(self, data: bytes, filename: str = None):
+        self.data = data
+        self.filename = filename
+        self.ext = os.path.splitext(filename)[1].lower() if filename else None
+        self.faces = []  # face crops (BGR arrays) found during extraction
+        self._cache = {}
+        self.counters = {"decodes": 0, "encodes": 0}
+        self._cpu_start = time.thread_time()
+
+    def _memo(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    # === DECODED FORMS ===
+    @property
+    def image(self):
+        """Upright BGR array of an image upload at OCR resolution (None if undecodable)."""
+        def decode():
+            self.counters["decodes"] += 1
+            return decode_image(self.data, OCR_MAX_SIDE)
+        return self._memo("image", decode)
+
+    @property
+    def gray(self):
+        def convert():
+            img = self.image
+            return None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return self._memo("gray", convert)
+
+    def thumbnail_gray(self, max_side):
+        """Grayscale upload decoded straight to max_side, without the OCR-resolution decode."""
+        def decode():
+            self.counters["decodes"] += 1
+            return decode_image(self.data, max_side, gray=True)
+        return self._memo(("thumbnail_gray", max_side), decode)
+
+    @property
+    def face_image(self):
+        """The upload at face-detection resolution; shrinks image when already decoded, else decodes smaller."""
+        def build():
+            if "image" in self._cache:
+                return downscale(self.image, FACE_MAX_SIDE)
+            self.counters["decodes"] += 1
+            return decode_image(self.data, FACE_MAX_SIDE)
+        return self._memo("face_image", build)
+
+    @property
+    def face_gray(self):
+        def convert():
+            img = self.face_image
+            return None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return self._memo("face_gray", convert)
+
+    def face(self, index, encoded=None):
+        """Face crop from extraction, or a one-time decode of its JPEG bytes."""
+        if index < len(self.faces):
+            return self.faces[index]
+
+        def decode():
+            if not encoded:
+                return None
+            self.counters["decodes"] += 1
+            return cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR)
+        return self._memo(("face", index), decode)
+
+    # === ENCODED ARTIFACTS ===
+    @property
+    def mime(self):
+        for magic, mime in _MAGIC:
+            if self.data.startswith(magic):
+                return mime
+        return "application/octet-stream"
+
+    @property
+    def data_url(self):
+        """
+        Data URL for the response: the original bytes when they are a small
+        JPEG/PNG, otherwise a thumbnail decoded at reduced resolution.
+        """
+        def build():
+            mime = self.mime
+            size = image_size(self.data)
+            if size is None:
+                return None
+            if mime in ("image/jpeg", "image/png") and max(size) <= THUMBNAIL_MAX_SIDE:
+                payload = self.data
+            else:
+                self.counters["decodes"] += 1
+                thumbnail = decode_image(self.data, THUMBNAIL_MAX_SIDE)
+                if thumbnail is None:
+                    return None
+                mime, payload = "image/jpeg", self.encode_jpeg("thumbnail", thumbnail)
+            return f"data:{mime};base64,{base64.b64encode(payload).decode('utf-8')}"
+        return self._memo("data_url", build)
+
+    @property
+    def sha256(self):
+        """Hex digest of the original bytes; identifies the document in the verification store."""
+        return self._memo("sha256", lambda: hashlib.sha256(self.data).hexdigest())
+
+    def encode_jpeg(self, key, array):
+        """JPEG bytes for an array, encoded once per key."""
+        def encode():
+            self.counters["encodes"] += 1
+            success, buffer = cv2.imencode(".jpg", array)
+            if not success:
+                raise ValueError("Failed to encode image to JPEG")
+            return buffer.tobytes()
+        return self._memo(("jpeg", key), encode)
+
+    def stats(self):
+        return dict(self.counters, cpu_ms=round((time.thread_time() - self._cpu_start) * 1000, 1))
@@ -1,18 +1,36 @@
 import os
+import logging
+import time
 import cv2
 import base64
 import numpy as np
 from io import BytesIO
 from PIL import Image
 import fitz  # PyMuPDF
-from document_reader import DocumentProcessor
+from document_reader import (DocumentProcessor, MemoryProbe, PoorImageQuality, QUALITY_GATE, QUALITY_MAX_SIDE,
+                             OCR_EARLY_STOP)
+from field_detector import missing_fields
+from pdf_layout import PDF_LAYOUT, extract_fields as layout_fields
 from local_llm import run_local_llm
+from single_flight import SingleFlight, content_key
+from shared_cache import cache as shared_cache
+from admission import admission
+from llm_backends import DeadlineExceeded
+from document_context import DocumentContext
+from image_decode import image_size
+
+# Resolution for pages that must be rasterized for face detection
+RENDER_DPI = int(os.getenv("FACE_RENDER_DPI", "150"))
+
+logger = logging.getLogger(__name__)
 
 
 class ExtractionAgent:
     def __init__(self):
         self.processor = DocumentProcessor()
         self.supported_formats = ('.jpg', '.jpeg', '.png', '.pdf')
+        # A leader's DeadlineExceeded is its own; waiters retry under their deadlines
+        self._flight = SingleFlight("extract", retry_on=(DeadlineExceeded,))
 
     def _image_to_bytes(self, img):
         """Encode OpenCV image to JPEG bytes."""
@@ -21,8 +39,44 @@ class ExtractionAgent:
             raise ValueError("Failed to encode image to JPEG")
         return buffer.tobytes()
 
-    def process_bytes(self, file_data: bytes, filename: str):
-        ext = os.path.splitext(filename)[1].lower()
+    def _collect_faces(self, img_np, result, ctx, gray=None, plan=None):
+        """Run the planned face/signature detection on one image and append the crops to result."""
+        with admission.stage("cpu"):
+            faces, sigs = self.processor.detect_face_signatures_from_image(
+                img_np, gray, faces=plan is None or plan.faces, signatures=plan is None or plan.signatures,
+                timings=result["pipeline_stats"])
+        for face in faces:
+            ctx.faces.append(face)
+            result["faces"].append(ctx.encode_jpeg(("face", len(ctx.faces)), face))
+        result["signatures"].extend(sigs)
+
+    def analyze_shared(self, ctx: DocumentContext, plan=None):
+        """analyze(); concurrent uploads of identical content under the same plan share one run."""
+        key = content_key(ctx.data, ctx.ext, "analyze", plan.key if plan else None)
+        return self._flight.do(key, lambda: self.analyze_cached(ctx, plan))
+
+    def analyze_cached(self, ctx: DocumentContext, plan=None):
+        """analyze() through the shared cache, so other workers and instances reuse the result."""
+        key = content_key(ctx.data, ctx.ext, "analyze", plan.key if plan else None)
+        return shared_cache.get_or_set("analysis", key, lambda: self.analyze(ctx, plan), on_hit=self._mark_cached)
+
+    @staticmethod
+    def _mark_cached(analysis):
+        result, text = analysis
+        result["pipeline_stats"]["shared_cache"] = True
+        return result, text
+
+    def analyze(self, ctx: DocumentContext, plan=None):
+        """
+        CPU stage of extraction: text (text layer or OCR), faces and signatures.
+        Returns (result, text) without calling the LLM; raises on unusable input.
+        A pipeline_planner.StagePlan can skip face and/or signature detection,
+        and scanned PDF pages are only read until its llm_fields are all found.
+        With a plan, llm_fields printed as "label: value" in a PDF's text layer
+        are read directly into result["layout_fields"].
+        """
+        ext = ctx.ext
+        detect = plan is None or plan.faces or plan.signatures
 
         result = {
             "file_type": ext[1:].upper(),
@@ -30,70 +84,144 @@ class ExtractionAgent:
             "signatures": [],
             "personal_details": {},
             "face_image_bytes": None,
-            "face_image_base64": None
+            "face_image_base64": None,
+            "llm_usage": None,
+            "layout_fields": {},
+            "quality": None,
+            "pipeline_stats": {"embedded_images": 0, "pages_rendered": 0, "pages_ocr": 0, "pages_skipped": 0}
         }
+        probe = MemoryProbe()
+
+        logger.info("Processing in-memory file: %s", ctx.filename)
+
+        # ------------------------------
+        # PDF Processing (in-memory)
+        # ------------------------------
+        if ext == ".pdf":
+            with fitz.open(stream=ctx.data, filetype="pdf") as doc:
+                photo_pages = set()
+
+                # Faces come from embedded photo XObjects, decoded at detection resolution
+                for page_num, img_np in (self.processor.iter_pdf_photos(doc) if detect else ()):
+                    photo_pages.add(page_num)
+                    result["pipeline_stats"]["embedded_images"] += 1
+                    self._collect_faces(img_np, result, ctx, plan=plan)
+
+                page_texts = {page.number: page.get_text() for page in doc}
+                scanned = [num for num, page_text in page_texts.items() if not page_text.strip()]
 
-        print(f"\n📄 Processing in-memory file: {filename}")
-
-        try:
-            # ------------------------------
-            # PDF Processing (in-memory)
-            # ------------------------------
-            if ext == ".pdf":
-                doc = fitz.open(stream=file_data, filetype="pdf")
-                text = ""
-                for page_num, page in enumerate(doc):
-                    text += page.get_text()
-
-                    # Use first page as image for face/signature detection
-                    if page_num == 0:
-                        pix = page.get_pixmap()
-                        img_bytes = pix.tobytes("jpg")
-                        img_np = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-                        if img_np is not None:
-                            faces, sigs = self.processor.detect_face_signatures_from_image(img_np)
-                            for face in faces:
-                                result["faces"].append(self._image_to_bytes(face))
-                            result["signatures"].extend(sigs)
-
-            # ------------------------------
-            # Image File Processing (in-memory)
-            # ------------------------------
-            elif ext in ['.jpg', '.jpeg', '.png']:
-                img_np = cv2.imdecode(np.frombuffer(file_data, np.uint8), cv2.IMREAD_COLOR)
-                if img_np is None:
+                # Born-digital pages: pair labels with values from word positions
+                if PDF_LAYOUT and plan is not None and plan.llm_fields and len(scanned) < len(page_texts):
+                    started = time.perf_counter()
+                    result["layout_fields"] = layout_fields(doc, plan.llm_fields)
+                    result["pipeline_stats"]["layout_ms"] = (time.perf_counter() - started) * 1000
+                required = plan.llm_fields if plan is not None and OCR_EARLY_STOP else None
+
+                def complete():
+                    """Whether the text so far has every required field and each planned detection a hit."""
+                    return bool(required) and not missing_fields("\n".join(page_texts.values()), required) \
+                        and (not plan.faces or result["faces"]) and (not plan.signatures or result["signatures"])
+
+                # Scanned pages have no text layer: page by page, render them for faces and
+                # signatures (digital pages and pages with an embedded photo carry none to
+                # find) and OCR them, one raster at a time, until complete()
+                pages = () if complete() else self.processor.iter_pdf_pages(doc, pages=scanned, probe=probe)
+                for page_num, gray in pages:
+                    if detect and page_num not in photo_pages:
+                        result["pipeline_stats"]["pages_rendered"] += 1
+                        self._collect_faces(self.processor.render_page(doc[page_num], dpi=RENDER_DPI),
+                                            result, ctx, plan=plan)
+                    started = time.perf_counter()
+                    with admission.stage("cpu"):
+                        page_texts[page_num] = self.processor.ocr_image(None, gray)
+                    result["pipeline_stats"]["pages_ocr"] += 1
+                    result["pipeline_stats"]["ocr_ms"] = (result["pipeline_stats"].get("ocr_ms", 0.0)
+                                                          + (time.perf_counter() - started) * 1000)
+                    if complete():
+                        break
+                result["pipeline_stats"]["pages_skipped"] = len(scanned) - result["pipeline_stats"]["pages_ocr"]
+                if result["pipeline_stats"]["pages_skipped"]:
+                    logger.info("Required fields found after %d of %d scanned pages",
+                                result["pipeline_stats"]["pages_ocr"], len(scanned))
+            text = "\n".join(page_texts[num] for num in sorted(page_texts))
+
+        # ------------------------------
+        # Image File Processing (in-memory)
+        # ------------------------------
+        elif ext in ['.jpg', '.jpeg', '.png']:
+            # Reject photos OCR cannot read before paying for the OCR-resolution decode,
+            # OCR and the LLM: the gate only needs a thumbnail
+            if QUALITY_GATE:
+                thumbnail = ctx.thumbnail_gray(QUALITY_MAX_SIDE)
+                if thumbnail is None:
                     raise ValueError("Could not decode image bytes.")
-                # OCR text from image
-                text = self.processor.ocr_image(img_np)
-                faces, sigs = self.processor.detect_face_signatures_from_image(img_np)
-                for face in faces:
-                    result["faces"].append(self._image_to_bytes(face))
-                result["signatures"].extend(sigs)
-
-            else:
-                raise ValueError("Unsupported file format")
-
-            # ------------------------------
-            # Run Local LLM for structured data
-            # ------------------------------
-            if text.strip():
-                print(f"🧠 Extracting personal details via local LLM")
-                result["personal_details"] = run_local_llm(text)
-            else:
-                print("⚠️ No text found for LLM processing.")
-
-            # ------------------------------
-            # First face encoding
-            # ------------------------------
-            if result['faces']:
-                result['face_image_bytes'] = result['faces'][0]
-                base64_str = base64.b64encode(result['face_image_bytes']).decode('utf-8')
-                result['face_image_base64'] = f"data:image/jpeg;base64,{base64_str}"
-                print("📸 First face encoded to base64.")
-
-            print(f"✅ Finished in-memory processing for {filename}")
-            return result
-
-        except Exception as e:
-            print(f"❌ Error in process_bytes: {e}")
-            return None
+                result["quality"] = self.processor.assess_quality(thumbnail, image_size(ctx.data))
+                if not result["quality"]["ok"]:
+                    raise PoorImageQuality(result["quality"]["reasons"], result["quality"]["metrics"])
+            img_np = ctx.image
+            if img_np is None:
+                raise ValueError("Could not decode image bytes.")
+            # OCR text from image; faces and signatures at detection resolution,
+            # like rendered PDF pages
+            with admission.stage("cpu"):
+                text = self.processor.ocr_image(img_np, ctx.gray)
+            if detect:
+                self._collect_faces(ctx.face_image, result, ctx, ctx.face_gray, plan)
+
+        else:
+            raise ValueError("Unsupported file format")
+
+        # ------------------------------
+        # First face encoding
+        # ------------------------------
+        if result['faces']:
+            result['face_image_bytes'] = result['faces'][0]
+            base64_str = base64.b64encode(result['face_image_bytes']).decode('utf-8')
+            result['face_image_base64'] = f"data:image/jpeg;base64,{base64_str}"
+            logger.debug("First face encoded to base64.")
+
+        for key in ("face_detection_ms", "signature_detection_ms", "ocr_ms", "layout_ms"):
+            if key in result["pipeline_stats"]:
+                result["pipeline_stats"][key] = round(result["pipeline_stats"][key], 1)
+        result["pipeline_stats"].update(probe.report())
+        return result, text
+
+    def add_personal_details(self, result, text, doc_type: str = None, fields=None):
+        """
+        LLM stage: fill result["personal_details"] and result["llm_usage"] from text.
+        Fields already read from the PDF text layer are not asked for; returns
+        whether the LLM was called.
+        """
+        layout, missing = self.layout_split(result, fields)
+        if fields and layout and not missing:
+            logger.info("All %d fields read from the PDF text layer; LLM extraction skipped.", len(layout))
+            self.apply_personal_details(result, {}, layout)
+            return False
+        if text.strip():
+            logger.debug("Extracting personal details via local LLM")
+            self.apply_personal_details(result, run_local_llm(text, doc_type, missing if layout else fields), layout)
+            return True
+        logger.warning("No text found for LLM processing.")
+        return False
+
+    @staticmethod
+    def layout_split(result, fields):
+        """(values read from the PDF text layer, fields the LLM still has to extract)."""
+        layout = result.get("layout_fields") or {}
+        return layout, [field for field in fields or () if field not in layout]
+
+    @staticmethod
+    def apply_personal_details(result, details, layout=None):
+        """
+        Store an LLM reply on the result, splitting off its usage stats. Text-layer
+        values fill the fields the LLM did not return; they never replace its values.
+        """
+        result["llm_usage"] = details.pop("_llm", None)
+        result["personal_details"] = dict(layout or {})
+        result["personal_details"].update(
+            (key, value) for key, value in details.items() if value or key not in result["personal_details"])
+        if result["llm_usage"]:
+            usage = result["llm_usage"]
+            logger.info("LLM tokens: prompt=%s completion=%s (input %s -> %s chars)",
+                        usage.get('prompt_tokens'), usage.get('completion_tokens'),
+                        usage['input_chars_raw'], usage['input_chars_clean'])
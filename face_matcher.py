@@ -0,0 +1,159 @@
+"""
+1:N face matching: the uploaded selfie against every face found in the
+document, and optionally against the faces of the applicant's earlier
+verifications.
+
+The first Haar detection on a card is often an emblem or hologram, so
+scoring only faces[0] misses the real photo. All candidates are scored in
+one vectorized pass: their ORB descriptors are stacked, Hamming distances to
+the selfie's descriptors come from a single matrix product over the
+descriptor bits, and cross-checked matches and top-50 mean distances are
+reduced per candidate with numpy. Per pair, the score is the one
+face_comparator.compare_faces computes, ties between equidistant
+descriptors included.
+"""
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from face_comparator import load_image
+from shared_cache import cache as shared_cache, hash_key
+
+FACE_MATCH_PRIOR = os.getenv("FACE_MATCH_PRIOR", "false").lower() == "true"
+FACE_MATCH_MAX_PRIOR = int(os.getenv("FACE_MATCH_MAX_PRIOR", "8"))
+FACE_SIZE = (250, 250)
+ORB_FEATURES = 1500
+TOP_MATCHES = 50
+MATCH_THRESHOLD = 0.35  # normalized similarity above which faces match
+METHOD = "ORB_feature_matching"
+
+logger = logging.getLogger(__name__)
+
+
+def face_descriptors(img_input):
+    """ORB descriptors (N x 32 uint8) of a face crop, as compare_faces prepares it; None if unusable."""
+    if not shared_cache.enabled:
+        return _face_descriptors(img_input)
+    if isinstance(img_input, np.ndarray):
+        key = hash_key(img_input.tobytes(), img_input.shape, img_input.dtype.str, ORB_FEATURES)
+    elif isinstance(img_input, bytes):
+        key = hash_key(img_input, ORB_FEATURES)
+    else:
+        return _face_descriptors(img_input)
+    return shared_cache.get_or_set("face", key, lambda: _face_descriptors(img_input),
+                                   cache_if=lambda descriptors: descriptors is not None)
+
+
+def _face_descriptors(img_input):
+    img = load_image(img_input)
+    if img is None:
+        return None
+    img = cv2.equalizeHist(cv2.resize(img, FACE_SIZE))
+    _, descriptors = cv2.ORB_create(nfeatures=ORB_FEATURES).detectAndCompute(img, None)
+    return descriptors
+
+
+def _signed_bits(descriptors):
+    """Descriptor bits as +-1 floats, so that Hamming(a, b) = (bits - a . b) / 2."""
+    return np.unpackbits(descriptors, axis=1).astype(np.float32) * 2 - 1
+
+
+def score_candidates(query, candidates):
+    """
+    Similarity (0-1) of query descriptors to each candidate's descriptors, or
+    None for candidates without any, plus the match count of each. Matches
+    are mutual nearest neighbours within a candidate (BFMatcher crossCheck);
+    a score is 1 - mean of the TOP_MATCHES smallest distances / 100.
+    """
+    scores = [None] * len(candidates)
+    usable = [i for i, d in enumerate(candidates) if d is not None and len(d)]
+    if query is None or not len(query) or not usable:
+        return scores, [0] * len(candidates)
+
+    counts = np.array([len(candidates[i]) for i in usable])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    owner = np.repeat(np.arange(len(usable)), counts)  # candidate of each stacked descriptor
+    # One BLAS product gives every stacked-descriptor x query Hamming distance; the
+    # reductions below work on it directly (a larger product is a smaller distance)
+    product = _signed_bits(np.concatenate([candidates[i] for i in usable])) @ _signed_bits(query).T
+
+    # Cross-check: stacked descriptor j and query i match when each is the other's nearest
+    # within j's candidate, ties going to the lowest index on both sides as in BFMatcher
+    nearest_query = product.argmax(axis=1)
+    ends = np.append(starts[1:], len(owner))
+    nearest_stacked = np.stack([start + product[start:end].argmax(axis=0)
+                                for start, end in zip(starts, ends)])  # candidate x query
+    stacked = np.arange(len(owner))
+    mutual = nearest_stacked[owner, nearest_query] == stacked
+    match_owner = owner[mutual]
+    match_distance = (query.shape[1] * 8 - product[stacked, nearest_query][mutual]) * 0.5
+
+    # TOP_MATCHES smallest distances per candidate
+    order = np.lexsort((match_distance, match_owner))
+    match_owner, match_distance = match_owner[order], match_distance[order]
+    group_start = np.searchsorted(match_owner, np.arange(len(usable)))
+    rank = np.arange(len(match_owner)) - group_start[match_owner]
+    keep = rank < TOP_MATCHES
+    sums = np.bincount(match_owner[keep], weights=match_distance[keep], minlength=len(usable))
+    kept = np.bincount(match_owner[keep], minlength=len(usable))
+    matches = np.bincount(match_owner, minlength=len(usable))
+
+    match_counts = [0] * len(candidates)
+    for k, i in enumerate(usable):
+        match_counts[i] = int(matches[k])
+        scores[i] = max(0.0, 1 - sums[k] / kept[k] / 100) if kept[k] else 0.0
+    return scores, match_counts
+
+
+def match_face(selfie, document_faces, prior_faces=()):
+    """
+    Score a selfie against every document face and prior face in one pass.
+
+    document_faces are crops (arrays or JPEG bytes); prior_faces are dicts
+    with "image" plus identifying keys (verification_id, doc_type, name).
+    The verdict and faceSimilarity come from the best document face, like
+    compare_faces; priorSimilarity is the best earlier face, and candidates
+    lists every score.
+    """
+    try:
+        query = face_descriptors(selfie)
+        if query is None:
+            logger.warning("No features detected in the uploaded face.")
+            return {"photoMatch": "error", "error": "No features detected"}
+
+        sources = [{"source": "document", "index": i} for i in range(len(document_faces))]
+        sources += [{"source": "prior", **{k: v for k, v in face.items() if k != "image"}} for face in prior_faces]
+        images = list(document_faces) + [face["image"] for face in prior_faces]
+        scores, match_counts = score_candidates(query, [face_descriptors(img) for img in images])
+    except Exception as e:
+        logger.exception("Error during face matching")
+        return {"photoMatch": "error", "error": str(e)}
+
+    candidates = []
+    for source, score, count in zip(sources, scores, match_counts):
+        similarity = None if score is None else float(round(score * 100, 2))
+        candidates.append(dict(source, faceSimilarity=similarity, matches=count))
+
+    def best(source):
+        scored = [c for c in candidates if c["source"] == source and c["faceSimilarity"] is not None]
+        return max(scored, key=lambda c: c["faceSimilarity"], default=None)
+
+    best_document, best_prior = best("document"), best("prior")
+    if best_document is None:
+        result = {"photoMatch": "error", "error": "No features detected", "faceSimilarity": None}
+    else:
+        result = {
+            "photoMatch": "success" if best_document["faceSimilarity"] > MATCH_THRESHOLD * 100 else "failed",
+            "faceSimilarity": best_document["faceSimilarity"],
+            "matchedFaceIndex": best_document["index"],
+        }
+    result.update({
+        "method": METHOD,
+        "priorSimilarity": best_prior["faceSimilarity"] if best_prior else None,
+        "candidates": candidates,
+    })
+    logger.info("Face match: %s (best document face %s of %d, %d prior)", result["photoMatch"],
+                result.get("matchedFaceIndex"), len(document_faces), len(prior_faces))
+    return result
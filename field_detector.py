@@ -0,0 +1,42 @@
+"""
+Cheap detection of which comparator fields a piece of OCR text contains.
+
+Used to stop OCR of multi-page documents early: the fields
+DocumentComparator scores are almost always on the first page, so once the
+text read so far shows a label or a value shape for every required field,
+the remaining pages need not be rendered or OCR'd. A field counts as present
+when its label (e.g. "Father", "S/O") or its value shape (a date, a 12-digit
+number) appears; the LLM still extracts the value. Fields without a pattern
+are never reported present, so documents that need them are read in full.
+"""
+import re
+
+FIELD_PATTERNS = {
+    "name": r"(?im)^(?!.*\b(?:father|mother|husband|guardian)).*\bname\b",
+    "father_name": r"(?i)\b(?:father|s/o|d/o|w/o|c/o|son of|daughter of|wife of)\b",
+    "mother_name": r"(?i)\bmother\b",
+    "date_of_birth": r"(?i)\b(?:dob|d\.o\.b|date of birth|year of birth)\b"
+                     r"|\b\d{1,2}[/\-.]\d{1,2}[/\-.](?:19|20)\d{2}\b",
+    "contact": r"(?i)\b(?:mobile|phone|contact)\b|(?<!\d)[6-9]\d{9}(?!\d)",
+    "address": r"(?i)\baddress\b|\bpin\s*(?:code)?\s*[:\-]?\s*\d{6}\b",
+    "aadhar_number": r"(?<!\d)\d{4}\s?\d{4}\s?\d{4}(?!\d)",
+    "passport_number": r"\b[A-Z][0-9]{7}\b",
+    "nationality": r"(?i)\bnationality\b",
+    "place_of_birth": r"(?i)\bplace of birth\b",
+    "university": r"(?i)\buniversity\b",
+    "college": r"(?i)\b(?:college|institute|institution)\b",
+    "course": r"(?i)\b(?:course|degree|programme|program|branch)\b",
+    "year": r"(?i)\bacademic year\b|\b(?:19|20)\d{2}\s*[-/]\s*(?:19|20)?\d{2}\b",
+    "caste": r"(?i)\bcaste\b",
+    "category": r"\b(?:SC|ST|OBC)\b|(?i:\bcategory\b)",
+    "previous_school": r"(?i)\b(?:school|college|vidyalaya)\b",
+    "year_of_passing": r"(?i)\b(?:year of passing|passing year|passed)\b",
+    "marks": r"(?i)\b(?:marks|grade|percentage|cgpa|sgpa)\b|\d{1,3}(?:\.\d+)?\s?%",
+}
+
+_COMPILED = {field: re.compile(pattern) for field, pattern in FIELD_PATTERNS.items()}
+
+
+def missing_fields(text, fields):
+    """The fields (in order) that text shows no sign of; unknown fields are always missing."""
+    return [field for field in fields if field not in _COMPILED or not _COMPILED[field].search(text)]
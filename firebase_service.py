@@ -95,26 +95,46 @@
 #     #         return False
 
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from typing import Optional, Dict, Any
 import os
 import json
+import logging
 from dotenv import load_dotenv
 
+from shared_cache import cache as shared_cache
+from structured_logging import log_payload
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class FirebaseService:
+    FIELD_MAPPING = {
+        'name': ['name', 'fullName'],
+        'father_name': ['father_name', 'fatherName', 'father'],
+        'mother_name': ['mother_name', 'motherName', 'mother'],
+        'date_of_birth': ['date_of_birth', 'dob', 'birthDate'],
+        'contact': ['contact', 'phone', 'mobile', 'phoneNumber'],
+        'address': ['address', 'fullAddress', 'residentialAddress'],
+        'category': ['category', 'casteCategory', 'caste'],
+        'previous_school': ['previous_school', 'previousSchool','previousSchool_College'],
+        'year_of_passing': ['year_of_passing', 'passingYear','YearOfPassing'],
+        'marks': ['marks', 'grades', 'percentage','Marks_Grade']
+    }
+
     def __init__(self):
+        self._async_db = None
         try:
             # Try multiple credential sources
             cred = self._get_firebase_credentials()
             
             if not firebase_admin._apps:
                 firebase_admin.initialize_app(cred)
-                print("Firebase initialized successfully.")
+                logger.info("Firebase initialized successfully.")
             self.db = firestore.client()
         except Exception as e:
-            print(f"Firebase initialization error: {e}")
+            logger.error("Firebase initialization error: %s", e)
             self.db = None
     
     def _get_firebase_credentials(self):
@@ -152,45 +172,66 @@ class FirebaseService:
             return None
 
         try:
-            FIELD_MAPPING = {
-                'name': ['name', 'fullName'],
-                'father_name': ['father_name', 'fatherName', 'father'],
-                'mother_name': ['mother_name', 'motherName', 'mother'],
-                'date_of_birth': ['date_of_birth', 'dob', 'birthDate'],
-                'contact': ['contact', 'phone', 'mobile', 'phoneNumber'],
-                'address': ['address', 'fullAddress', 'residentialAddress'],
-                'category': ['category', 'casteCategory', 'caste'],
-                'previous_school': ['previous_school', 'previousSchool','previousSchool_College'],
-                'year_of_passing': ['year_of_passing', 'passingYear','YearOfPassing'],
-                'marks': ['marks', 'grades', 'percentage','Marks_Grade']
-            }
-
             users_ref = self.db.collection("applications")
             query = users_ref.where("userId", "==", user_id).limit(1).stream()
             
             for doc in query:
                 user_data = doc.to_dict()
-                print(f"Raw Firestore data: {user_data}")
-                
-                standardized_data = {}
-                for standard_field, possible_names in FIELD_MAPPING.items():
-                    for name in possible_names:
-                        if name in user_data:
-                            standardized_data[standard_field] = user_data[name]
-                            break
-                    else:
-                        standardized_data[standard_field] = ""
-                
-                print(f"Standardized user data: {standardized_data}")
+                log_payload(logger, "Raw Firestore data", user_data)
+
+                standardized_data = self.standardize_profile(user_data)
+                log_payload(logger, "Standardized user data", standardized_data)
                 return standardized_data
                 
             return None
         except Exception as e:
-            print(f"Error fetching user data: {e}")
+            logger.error("Error fetching user data for %s: %s", user_id, e)
+            return None
+
+    @classmethod
+    def standardize_profile(cls, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Map an application document onto the standard profile field names."""
+        standardized_data = {}
+        for standard_field, possible_names in cls.FIELD_MAPPING.items():
+            for name in possible_names:
+                if name in user_data:
+                    standardized_data[standard_field] = user_data[name]
+                    break
+            else:
+                standardized_data[standard_field] = ""
+        return standardized_data
+
+    @property
+    def async_db(self):
+        """Lazily created AsyncClient for the ASGI app; created on first use."""
+        if self.db is None:
+            return None
+        if self._async_db is None:
+            self._async_db = firestore_async.client()
+        return self._async_db
+
+    async def get_user_profile_async(self, user_id: str) -> Optional[Dict]:
+        """get_user_profile over the asyncio Firestore client."""
+        if not self.async_db:
+            return None
+        return await shared_cache.aget_or_set("profile", user_id, lambda: self._fetch_profile_async(user_id),
+                                              cache_if=bool)
+
+    async def _fetch_profile_async(self, user_id: str) -> Optional[Dict]:
+        try:
+            query = self.async_db.collection("applications").where("userId", "==", user_id).limit(1)
+            async for doc in query.stream():
+                return self.standardize_profile(doc.to_dict())
+            return None
+        except Exception as e:
+            logger.error("Error fetching user data for %s: %s", user_id, e)
             return None
 
     def get_user_profile(self, user_id: str) -> Optional[Dict]:
-        return self.get_user_data(user_id)
+        """Standardized profile, through the shared cache (missing profiles are not cached)."""
+        if not self.db:
+            return None
+        return shared_cache.get_or_set("profile", user_id, lambda: self.get_user_data(user_id), cache_if=bool)
 
     def save_verification_result(self, user_id: str, result: Dict) -> bool:
         if not self.db:
@@ -209,5 +250,5 @@ class FirebaseService:
             })
             return True
         except Exception as e:
-            print(f"Error saving verification: {e}")
+            logger.error("Error saving verification for %s: %s", user_id, e)
             return False
\ No newline at end of file
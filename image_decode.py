@@ -0,0 +1,103 @@
+"""
+Image decoding at the resolution a stage needs.
+
+Phone photos arrive at 12-48 MP, but OCR, face detection and the thumbnails
+in the response need far less. decode_image() reads the header first (PIL,
+no pixel data) and, for JPEGs, has libjpeg decode directly at 1/2, 1/4 or
+1/8 scale (DCT-domain scaling, the same mechanism as PIL's draft mode but
+through OpenCV's faster decoder), so the full-resolution raster is never
+materialized; the result is then resized to the exact cap. Other formats
+are decoded in full and downscaled. EXIF orientation is applied in every
+case.
+"""
+import io
+import logging
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Longest side, in pixels, each stage works at
+OCR_MAX_SIDE = int(os.getenv("DECODE_OCR_MAX_SIDE", "3000"))  # ~300 dpi across an A4 page or card photo
+FACE_MAX_SIDE = int(os.getenv("DECODE_FACE_MAX_SIDE", "1600"))  # Haar face and signature detection
+THUMBNAIL_MAX_SIDE = int(os.getenv("DECODE_THUMBNAIL_MAX_SIDE", "1024"))  # images returned in the response
+
+_ORIENTATION = 0x0112
+
+# DCT-domain reduced JPEG decoding (libjpeg scales while decoding)
+_REDUCED = {
+    False: {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+    True: {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+}
+
+# The per-image budget is Image.MAX_IMAGE_PIXELS (set in document_reader). PIL
+# emits DecompressionBombWarning between it and twice it, and those images are
+# decoded reduced like any other; above twice it PIL refuses to open them and
+# they are rejected with PageBudgetExceeded before any pixels are decoded.
+
+logger = logging.getLogger(__name__)
+
+
+class PageBudgetExceeded(ValueError):
+    """A document would expand beyond the configured page or megapixel budget."""
+
+
+def _header(data):
+    """
+    (format, width, height, orientation) from the image header, without decoding
+    pixels; None if unreadable. Raises PageBudgetExceeded for decompression bombs.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            return im.format, im.size[0], im.size[1], im.getexif().get(_ORIENTATION, 1)
+    except Image.DecompressionBombError as e:
+        raise PageBudgetExceeded(str(e)) from e
+    except (OSError, ValueError):
+        return None
+
+
+def image_size(data):
+    """(width, height) as displayed (after EXIF rotation), from the header only; None if unreadable."""
+    header = _header(data)
+    if header is None:
+        return None
+    _, width, height, orientation = header
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def downscale(img, max_side):
+    """Shrink an array so its longest side is at most max_side (no-op when already smaller)."""
+    if img is None or not max_side:
+        return img
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return img
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # Area averaging for large reductions; bilinear is enough (and much cheaper) below 2x
+    interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+    return cv2.resize(img, size, interpolation=interpolation)
+
+
+def decode_image(data, max_side=None, gray=False):
+    """
+    BGR (or grayscale) array of encoded image bytes with EXIF orientation
+    applied and the longest side capped at max_side; None if undecodable.
+    Raises PageBudgetExceeded for images beyond twice the pixel budget.
+    """
+    flag = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    header = _header(data)
+    if header is None:
+        # Formats PIL cannot parse may still be readable by OpenCV (e.g. some embedded PDF images)
+        return downscale(cv2.imdecode(np.frombuffer(data, np.uint8), flag), max_side)
+
+    image_format, width, height, _ = header
+    if max_side and image_format == "JPEG":
+        # Largest 1/2^n reduction that keeps the longest side >= max_side
+        for factor in (8, 4, 2):
+            if max(width, height) / factor >= max_side:
+                flag = _REDUCED[gray][factor]
+                break
+    # imdecode applies the EXIF orientation in every mode
+    return downscale(cv2.imdecode(np.frombuffer(data, np.uint8), flag), max_side)
@@ -0,0 +1,421 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, nullcontext
+
+from admission import Overloaded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "amazon/nova-2-lite-v1:free"
+
+
+class RetryableError(Exception):
+    """Transport failure, timeout, HTTP 429 or 5xx: worth trying another attempt."""
+
+
+class DeadlineExceeded(Exception):
+    """The verification ran out of its overall time budget."""
+
+
+class _Superseded(Exception):
+    """An attempt got its slot after another attempt of the same call had won."""
+
+
+# === PER-VERIFICATION DEADLINE ===
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def verification_deadline(seconds):
+    """Bound every LLM attempt made inside the block by one overall deadline."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time(default=None):
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return deadline - time.monotonic()
+
+
+# === HEALTH TRACKING ===
+class CircuitBreaker:
+    """Open after consecutive failures; allow one probe after the cooldown."""
+
+    def __init__(self, failure_threshold=3, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Give back an allow() whose attempt was never sent."""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyTracker:
+    """EWMA plus a sliding window for percentile estimates."""
+
+    def __init__(self, window=100, alpha=0.2):
+        self.alpha = alpha
+        self.ewma = None
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.ewma = seconds if self.ewma is None else (1 - self.alpha) * self.ewma + self.alpha * seconds
+
+    def percentile(self, q):
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Backend:
+    def __init__(self, name, url, model, api_key_env="OPENROUTER_API_KEY", timeout=60.0):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key_env = api_key_env
+        self.timeout = float(timeout)
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+        )
+        self.latency = LatencyTracker()
+
+    @property
+    def api_key(self):
+        key = os.getenv(self.api_key_env) if self.api_key_env else None
+        return key.strip() if key else None
+
+    @property
+    def usable(self):
+        return not self.api_key_env or bool(self.api_key)
+
+    def headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def metrics(self):
+        p95 = self.latency.percentile(0.95)
+        return {
+            "model": self.model,
+            "state": self.breaker.state,
+            "ewma_seconds": round(self.latency.ewma, 3) if self.latency.ewma else None,
+            "p95_seconds": round(p95, 3) if p95 else None,
+        }
+
+
+class BackendPool:
+    """
+    Several OpenAI-compatible endpoints behind one call.
+
+    Backends are tried fastest-first (by EWMA latency) while their circuit
+    breaker allows it. If the first attempt has not finished after the
+    primary's p95 latency, a hedged request goes to the next backend and the
+    first success wins. Retryable failures move on to the next backend with a
+    short jittered backoff, all bounded by the verification deadline. A slot()
+    (e.g. an admission stage) is held per attempt, so a hedge needs a slot of
+    its own.
+    """
+
+    def __init__(self, backends, max_attempts=3, hedge_min=1.0, hedge_max=15.0):
+        self.backends = backends
+        self.max_attempts = max_attempts
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+
+    @classmethod
+    def from_env(cls):
+        """
+        LLM_BACKENDS is a JSON list of {"name", "url", "model", "api_key_env",
+        "timeout"}; without it the single OpenRouter backend is used.
+        """
+        raw = os.getenv("LLM_BACKENDS")
+        if raw:
+            specs = json.loads(raw)
+        else:
+            specs = [{
+                "name": "openrouter",
+                "url": os.getenv("LLM_API_URL", DEFAULT_URL),
+                "model": os.getenv("LLM_MODEL", DEFAULT_MODEL),
+            }]
+        backends = [Backend(**spec) for spec in specs]
+        return cls(
+            backends,
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            hedge_min=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0")),
+            hedge_max=float(os.getenv("LLM_HEDGE_MAX_DELAY", "15.0")),
+        )
+
+    @property
+    def usable(self):
+        return any(b.usable for b in self.backends)
+
+    def _candidates(self, exclude):
+        return sorted(
+            (b for b in self.backends if b.usable and b.name not in exclude),
+            key=lambda b: b.latency.ewma if b.latency.ewma is not None else 0.0,
+        )
+
+    def _hedge_delay(self, backend):
+        p95 = backend.latency.percentile(0.95)
+        if p95 is None:
+            return self.hedge_max
+        return min(self.hedge_max, max(self.hedge_min, p95))
+
+    def _next_backend(self, tried):
+        """(backend, timeout) for the next attempt, or None if every circuit is open; raises once the deadline passed."""
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("LLM deadline exceeded")
+        for backend in self._candidates(tried):
+            if not backend.breaker.allow():
+                continue
+            tried.add(backend.name)
+            return backend, backend.timeout if remaining is None else min(backend.timeout, remaining)
+        return None
+
+    def _attempt(self, backend, send, timeout, slot=None, finished=None):
+        try:
+            with slot() if slot else nullcontext():
+                if finished is not None and finished.is_set():
+                    raise _Superseded()
+                started = time.monotonic()
+                try:
+                    result = send(backend, timeout)
+                except Exception:
+                    backend.breaker.record_failure()
+                    raise
+                if finished is not None:
+                    finished.set()  # before the slot is released, so a queued hedge sees the win
+        except (Overloaded, _Superseded):
+            backend.breaker.release_probe()
+            raise
+        backend.breaker.record_success()
+        backend.latency.observe(time.monotonic() - started)
+        return result
+
+    def _retry_cycle_done(self, tried):
+        return len(tried) >= sum(1 for b in self.backends if b.usable)
+
+    def call(self, send, slot=None):
+        """
+        Run send(backend, timeout) until one attempt succeeds, holding slot()
+        around each attempt.
+
+        send raises RetryableError for failures worth retrying elsewhere.
+        Returns (result, info) where info names the winning backend; Overloaded
+        from slot() is raised unless another attempt is still out.
+        """
+        tried, pending, last_error = set(), {}, None
+        attempts, hedged = 0, False
+        finished = threading.Event()
+
+        def launch():
+            nonlocal attempts
+            picked = self._next_backend(tried)
+            if picked is None:
+                return False
+            backend, timeout = picked
+            attempts += 1
+            # Attempts run in a copy of the caller's context so their logs keep its correlation id
+            future = self._executor.submit(contextvars.copy_context().run, self._attempt, backend, send, timeout,
+                                           slot, finished)
+            pending[future] = backend
+            return True
+
+        if not launch():
+            raise RetryableError("No LLM backend available (all circuits open)")
+
+        try:
+            while pending:
+                primary = next(iter(pending.values()))
+                wait_for = self._hedge_delay(primary) if not hedged and len(pending) == 1 else None
+                remaining = remaining_time()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise DeadlineExceeded("LLM deadline exceeded")
+                    wait_for = remaining if wait_for is None else min(wait_for, remaining)
+
+                done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+                if not done:
+                    if not hedged and attempts < self.max_attempts and launch():
+                        hedged = True
+                        logger.info("Hedging LLM request after %.2fs", wait_for)
+                    continue
+
+                for future in done:
+                    backend = pending.pop(future)
+                    try:
+                        result = future.result()
+                        return result, {"backend": backend.name, "attempts": attempts, "hedged": hedged}
+                    except RetryableError as e:
+                        last_error = e
+                        logger.warning("LLM backend %s failed: %s", backend.name, e)
+                    except Overloaded:
+                        if not pending:
+                            raise
+                        logger.info("LLM attempt on %s not admitted; waiting on the other", backend.name)
+                    except _Superseded:
+                        pass  # the winner is still in `pending`
+
+                if not pending and attempts < self.max_attempts:
+                    if self._retry_cycle_done(tried):
+                        tried.clear()  # cycle through the pool again
+                    time.sleep(random.uniform(0.1, 0.4))
+                    launch()
+        finally:
+            finished.set()
+
+        raise last_error or RetryableError("All LLM attempts failed")
+
+    async def _aattempt(self, backend, send, timeout, slot=None, finished=None):
+        try:
+            async with slot() if slot else nullcontext():
+                if finished is not None and finished.is_set():
+                    raise _Superseded()
+                started = time.monotonic()
+                try:
+                    result = await send(backend, timeout)
+                except Exception:
+                    backend.breaker.record_failure()
+                    raise
+                if finished is not None:
+                    finished.set()
+        except (Overloaded, _Superseded, asyncio.CancelledError):
+            backend.breaker.release_probe()
+            raise
+        backend.breaker.record_success()
+        backend.latency.observe(time.monotonic() - started)
+        return result
+
+    async def acall(self, send, slot=None):
+        """
+        call() for the asyncio service: send(backend, timeout) is a coroutine
+        and slot() an async context manager.
+
+        Same ordering, hedging, retries and deadline; attempts still pending
+        when one wins are cancelled rather than left to finish.
+        """
+        tried, pending, last_error = set(), {}, None
+        attempts, hedged = 0, False
+        finished = asyncio.Event()
+
+        def launch():
+            nonlocal attempts
+            picked = self._next_backend(tried)
+            if picked is None:
+                return False
+            backend, timeout = picked
+            attempts += 1
+            pending[asyncio.ensure_future(self._aattempt(backend, send, timeout, slot, finished))] = backend
+            return True
+
+        if not launch():
+            raise RetryableError("No LLM backend available (all circuits open)")
+
+        try:
+            while pending:
+                primary = next(iter(pending.values()))
+                wait_for = self._hedge_delay(primary) if not hedged and len(pending) == 1 else None
+                remaining = remaining_time()
+                if remaining is not None:
+                    if remaining <= 0:
+                        raise DeadlineExceeded("LLM deadline exceeded")
+                    wait_for = remaining if wait_for is None else min(wait_for, remaining)
+
+                done, _ = await asyncio.wait(list(pending), timeout=wait_for,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not hedged and attempts < self.max_attempts and launch():
+                        hedged = True
+                        logger.info("Hedging LLM request after %.2fs", wait_for)
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        result = task.result()
+                        return result, {"backend": backend.name, "attempts": attempts, "hedged": hedged}
+                    except RetryableError as e:
+                        last_error = e
+                        logger.warning("LLM backend %s failed: %s", backend.name, e)
+                    except Overloaded:
+                        if not pending:
+                            raise
+                        logger.info("LLM attempt on %s not admitted; waiting on the other", backend.name)
+                    except _Superseded:
+                        pass
+
+                if not pending and attempts < self.max_attempts:
+                    if self._retry_cycle_done(tried):
+                        tried.clear()
+                    await asyncio.sleep(random.uniform(0.1, 0.4))
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error or RetryableError("All LLM attempts failed")
+
+    def metrics(self):
+        return {b.name: b.metrics() for b in self.backends}
+
+
+pool = BackendPool.from_env()
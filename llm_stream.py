@@ -0,0 +1,167 @@
+import json
+import re
+import threading
+import time
+
+# A completed top-level "field": value pair (string, null, number or boolean)
+_PAIR = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*("(?:[^"\\]|\\.)*"|null|true|false|-?\d+(?:\.\d+)?)(?=\s*[,}])')
+
+
+class IncrementalFieldParser:
+    """
+    Pick finished fields out of a JSON object while it is still being streamed.
+
+    Only flat objects are expected (the prompt contract asks for string|null
+    values), so a pair counts as finished once its value is closed and followed
+    by ',' or '}'.
+    """
+
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.values = {}
+        self.buffer = ""
+        self._scan_from = 0
+
+    def feed(self, chunk):
+        """Add streamed text; return the names of fields completed by it."""
+        self.buffer += chunk
+        completed = []
+        for match in _PAIR.finditer(self.buffer, self._scan_from):
+            key = json.loads(f'"{match.group(1)}"')
+            if key in self.fields and key not in self.values:
+                self.values[key] = json.loads(match.group(2))
+                completed.append(key)
+            self._scan_from = match.end()
+        return completed
+
+    @property
+    def complete(self):
+        return self.fields.issubset(self.values)
+
+    def as_json(self):
+        return json.dumps(self.values)
+
+
+_DONE = object()
+
+
+def parse_sse_line(line):
+    """JSON payload of one SSE line, _DONE at the end marker, None for anything else."""
+    if not line or not line.startswith("data:"):
+        return None  # keep-alives and comments
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _DONE
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        return None
+
+
+def iter_sse_events(response):
+    """Yield decoded JSON payloads from an OpenAI-compatible SSE stream."""
+    for line in response.iter_lines(decode_unicode=True):
+        event = parse_sse_line(line)
+        if event is _DONE:
+            return
+        if event is not None:
+            yield event
+
+
+class StreamStats:
+    """Running per-docType size of full completions, used to estimate savings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._full_chars = {}
+
+    def record_full(self, doc_type, chars):
+        with self._lock:
+            prev = self._full_chars.get(doc_type)
+            self._full_chars[doc_type] = chars if prev is None else 0.8 * prev + 0.2 * chars
+
+    def typical_chars(self, doc_type):
+        with self._lock:
+            return self._full_chars.get(doc_type)
+
+
+stream_stats = StreamStats()
+
+
+class StreamReader:
+    """Accumulates streamed completion events until every required field is present."""
+
+    def __init__(self, fields, doc_type=None):
+        self.parser = IncrementalFieldParser(fields)
+        self.doc_type = doc_type
+        self.started = time.monotonic()
+        self.first_field_at = None
+        self.chars = 0
+        self.usage = {}
+        self.early_stop = False
+
+    def feed_event(self, event):
+        """Consume one SSE payload; True once the stream can be closed."""
+        if event.get("usage"):
+            self.usage = event["usage"]
+        for choice in event.get("choices") or []:
+            delta = (choice.get("delta") or {}).get("content") or ""
+            if not delta:
+                continue
+            self.chars += len(delta)
+            if self.parser.feed(delta) and self.first_field_at is None:
+                self.first_field_at = time.monotonic()
+        if self.parser.complete:
+            self.early_stop = True
+        return self.early_stop
+
+    def result(self):
+        stats = {
+            "streamed": True,
+            "early_stop": self.early_stop,
+            "completion_chars": self.chars,
+            "time_to_first_field_ms": round((self.first_field_at - self.started) * 1000, 1)
+            if self.first_field_at else None,
+            "stream_ms": round((time.monotonic() - self.started) * 1000, 1),
+            "estimated_tokens_saved": None,
+        }
+        if self.early_stop:
+            typical = stream_stats.typical_chars(self.doc_type)
+            if typical:
+                stats["estimated_tokens_saved"] = max(0, int((typical - self.chars) / 4))
+            return self.parser.as_json(), self.usage, stats
+
+        stream_stats.record_full(self.doc_type, self.chars)
+        return self.parser.buffer, self.usage, stats
+
+
+def read_stream(response, fields, doc_type=None):
+    """
+    Consume a streamed chat completion until every required field is present.
+
+    Returns (raw_content, usage, stats). When the stream is closed early the
+    raw content is rebuilt from the fields parsed so far.
+    """
+    reader = StreamReader(fields, doc_type)
+    try:
+        for event in iter_sse_events(response):
+            if reader.feed_event(event):
+                break
+    finally:
+        response.close()
+    return reader.result()
+
+
+async def aread_stream(response, fields, doc_type=None):
+    """read_stream for an httpx.AsyncClient streaming response."""
+    reader = StreamReader(fields, doc_type)
+    try:
+        async for line in response.aiter_lines():
+            event = parse_sse_line(line)
+            if event is _DONE:
+                break
+            if event is not None and reader.feed_event(event):
+                break
+    finally:
+        await response.aclose()
+    return reader.result()
@@ -1,132 +1,198 @@
 import requests
-import json
-import re
 import os
-from tenacity import retry, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 load_dotenv()
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def run_local_llm(doc_text):
+from single_flight import SingleFlight, content_key
+from admission import admission
+from llm_backends import pool, RetryableError, DeadlineExceeded
+from llm_batcher import LLM_BATCH, MicroBatcher
+import prompts
+from prompts import (build_messages, build_batch_messages, parse_fields, parse_batch, response_format_for,
+                     batch_response_format, estimate_tokens)
+from llm_stream import read_stream, stream_stats
+from shared_cache import cache as shared_cache
+
+_llm_flight = SingleFlight("llm", cache_if=lambda details: cacheable_reply(details), retry_on=(DeadlineExceeded,))
+# Cached replies are only reused under the same prompt and models
+CACHE_SCOPE = content_key(prompts.SYSTEM_PROMPT, prompts.USER_TEMPLATE, *(b.model for b in pool.backends))
+
+MAX_INPUT_CHARS = int(os.getenv("LLM_MAX_INPUT_CHARS", "4000"))
+STREAM = os.getenv("LLM_STREAM", "false").lower() == "true"
+
+
+def run_local_llm(doc_text, doc_type=None, fields=None):
+    """
+    Extract structured details; identical texts in flight share one API call,
+    and with LLM_BATCH different ones arriving under load share a batch.
+    fields narrows the extraction (default: prompts.fields_for(doc_type)).
+    """
+    key = content_key(doc_text, doc_type, ",".join(fields or ()))
+    if LLM_BATCH and not STREAM and doc_text.strip():
+        call = lambda: batcher.submit(doc_text, doc_type, fields)
+    else:
+        call = lambda: _run_local_llm(doc_text, doc_type, fields)
+    return _llm_flight.do(key, lambda: shared_cache.get_or_set(
+        "llm", content_key(CACHE_SCOPE, key), call, cache_if=cacheable_reply, on_hit=mark_cached))
+
+
+def cacheable_reply(details):
+    """Only successful extractions go to the shared cache."""
+    return isinstance(details, dict) and "error" not in details
+
+
+def mark_cached(details):
+    """A reply served from the shared cache: no tokens were spent on it."""
+    if details.get("_llm"):
+        details["_llm"] = dict(details["_llm"], shared_cache=True)
+    return details
+
+
+def prepare_request(doc_text, doc_type=None, fields=None):
+    """
+    Payload for one extraction call: (payload, fields, stats), or an error dict
+    when there is nothing to send.
+    """
     if not doc_text.strip():
         return {"error": "No text found in document"}
-    
-    prompt = f"""
-You are a highly intelligent document understanding assistant.
-
-Your task is to extract *every possible identifiable and relevant detail* from a given block of unstructured or semi-structured text. This text may be from official Indian documents such as Aadhaar cards, school certificates, income certificates, caste certificates, government forms, ID cards, etc.
-
-Please analyze the content and extract *all useful information, returning it in a clean and structured **JSON format*. Do not make up values—only return what is found in the document.
-
-Include fields such as (but not limited to):
-
-- Personal Information:
-  - Full Name
-  - Father's Name
-  - Mother's Name
-  - Date of Birth
-  - Gender
-  - Nationality
-  - Religion
-  - Caste / Category (SC/ST/OBC/General/etc.)
-  - Marital Status
-  - Identification Marks (if any)
-
-- Contact Information:
-  - Phone Number(s) — *only extract numbers that begin with 6, 7, 8, or 9* and are 10 digits long
-  - Email Address(es)
-  - Full Address
-
-- Educational Details:
-  - Institution Name
-  - Exam or Class Name
-  - Roll Number / Registration Number
-  - Marks / Grades
-  - Year of Passing
-  - Certificate/Marksheet Number
-
-- Document Identifiers:
-  - Aadhaar Number
-  - PAN Number
-  - Certificate Numbers
-  - Application/Reference Numbers
-  - Issuing Authority
-  - Issue Date and Place
-
-- Income / Employment / Caste Information:
-  - Occupation
-  - Income Details
-  - Caste/Tribe Name
-  - Certificate Type (e.g., Caste Certificate, Income Certificate)
-  - Validity Period (if any)
-
-- Any additional key-value data or tabular information found.
-- Images and Digital Signatures:
-  - Describe any images or digital signatures found in the document.
-  - Provide their locations or metadata if available.
-
-Represent all information as structured JSON. Group related information into nested objects where appropriate. If information is not available, omit that field. Do not fabricate values.
-
-Here is the content to analyze:
-{doc_text}
-
-Return structured JSON with fields for:
-- Personal Information
-- Contact Information 
-- Educational Details
-- Document Identifiers
-- Employment/Income Details
-"""
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
+
+    messages, fields, stats = build_messages(doc_text, doc_type, max_chars=MAX_INPUT_CHARS, fields=fields)
+
+    if not pool.usable:
         return {"error": "API key not found. Set the OPENROUTER_API_KEY environment variable."}
-    api_key=api_key.strip()
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
 
     payload = {
-        "model": "amazon/nova-2-lite-v1:free",
-        "messages": [
-            {"role": "system", "content": "Extract structured personal data from documents."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.1
+        "messages": messages,
+        "temperature": 0.1,
+        "response_format": response_format_for(fields)
     }
+    if STREAM:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    return payload, fields, stats
+
+
+def finish_response(raw_content, usage, stream_info, call_info, fields, stats, doc_type=None):
+    """Parse the winning completion and attach the usage/backend stats as data["_llm"]."""
+    if isinstance(raw_content, dict):
+        return raw_content  # non-retryable API error
+
+    stats.update(call_info)
+    stats.update(stream_info or {})
+    stats.update({
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens", estimate_tokens(raw_content)),
+        "total_tokens": usage.get("total_tokens"),
+        "doc_type": doc_type,
+    })
+
+    data, error = parse_fields(raw_content, fields)
+    if error:
+        return {"error": error, "raw_response": raw_content[:500], "_llm": stats}
+
+    data["_llm"] = stats
+    return data
+
+
+def _call(payload, fields, doc_type=None, stream=STREAM):
+    """
+    POST a prepared payload through the backend pool: (raw_content, usage,
+    stream_info, call_info). raw_content is an error dict for non-retryable
+    API errors; RetryableError means every attempt failed.
+    """
+    def send(backend, timeout):
+        body = dict(payload, model=backend.model)
+        try:
+            response = requests.post(backend.url, headers=backend.headers(), json=body,
+                                     timeout=timeout, stream=stream)
+            if response.status_code == 400 and "response_format" in response.text:
+                # Model does not support structured outputs; the parser still validates
+                body.pop("response_format")
+                response = requests.post(backend.url, headers=backend.headers(), json=body,
+                                         timeout=timeout, stream=stream)
+        except requests.RequestException as e:
+            raise RetryableError(f"Request failed: {str(e)}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableError(f"API Error {response.status_code}")
+        if response.status_code != 200:
+            return {"error": f"API Error {response.status_code}",
+                    "message": response.text[:500]}, None, None
+
+        if stream:
+            return read_stream(response, fields, doc_type)
+        try:
+            body = response.json()
+        except ValueError as e:
+            raise RetryableError(f"JSON decode error: {str(e)}")
+        raw_content = body.get("choices", [{}])[0].get("message", {}).get("content", "") or ""
+        return raw_content, body.get("usage") or {}, None
+
+    # The llm stage budget is taken per attempt, so a hedged request holds a slot of its own
+    (raw_content, usage, stream_info), call_info = pool.call(send, slot=lambda: admission.stage("llm"))
+    return raw_content, usage, stream_info, call_info
+
+
+def _run_local_llm(doc_text, doc_type=None, fields=None):
+    prepared = prepare_request(doc_text, doc_type, fields)
+    if isinstance(prepared, dict):
+        return prepared
+    payload, fields, stats = prepared
 
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
+        raw_content, usage, stream_info, call_info = _call(payload, fields, doc_type)
+    except RetryableError as e:
+        return {"error": str(e)}
+    if not STREAM and isinstance(raw_content, str):
+        stream_stats.record_full(doc_type, len(raw_content))
 
-        if response.status_code != 200:
-            return {"error": f"API Error {response.status_code}",
-                    "message": response.text[:500]}
+    return finish_response(raw_content, usage, stream_info, call_info, fields, stats, doc_type)
 
-        raw_content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "")
 
-        # Attempt to extract only the JSON part from the response
-        match = re.search(r'\{[\s\S]*\}', raw_content)
-        if not match:
-            return {
-                "error": "No JSON object found in response.",
-                "raw_response": raw_content[:500]
-            }
+def _share(tokens, fraction):
+    return None if tokens is None else round(tokens * fraction)
 
-        json_str = match.group(0)
 
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            return {
-                "error": "Failed to parse response as JSON.",
-                "raw_json": json_str[:500]
-            }
-    except requests.RequestException as e:
-        return {"error": f"Request failed: {str(e)}"}
-    except json.JSONDecodeError as e:
-        return {"error": f"JSON decode error: {str(e)}"}
+def _run_batch(documents):
+    """
+    One API call for several (doc_text, doc_type, fields): a result per document in
+    run_local_llm's shape, None where the document must be sent alone.
+    """
+    if not pool.usable:
+        return [None] * len(documents)  # single calls report the missing key
+    messages, field_lists, doc_stats = build_batch_messages(documents, max_chars=MAX_INPUT_CHARS)
+    payload = {
+        "messages": messages,
+        "temperature": 0.1,
+        "response_format": batch_response_format(field_lists),
+    }
+    try:
+        raw_content, usage, _, call_info = _call(payload, None, stream=False)
+    except RetryableError as e:
+        # Every backend failed; single calls now would only add to the rate limiting
+        return [{"error": str(e)} for _ in documents]
+    if isinstance(raw_content, dict):
+        # e.g. the model rejected the combined request; the documents may still pass alone
+        return [None] * len(documents)
+
+    total_chars = sum(stats["input_chars_clean"] for stats in doc_stats) or 1
+    results = []
+    for (_, doc_type, _), data, stats in zip(documents, parse_batch(raw_content, field_lists), doc_stats):
+        if data is None:
+            results.append(None)
+            continue
+        share = stats["input_chars_clean"] / total_chars
+        stats.update(call_info)
+        stats.update({
+            # Usage is reported for the whole batch; each document is charged its share of the input
+            "prompt_tokens": _share(usage.get("prompt_tokens"), share),
+            "completion_tokens": _share(usage.get("completion_tokens", estimate_tokens(raw_content)), share),
+            "total_tokens": _share(usage.get("total_tokens"), share),
+            "doc_type": doc_type,
+            "batch_size": len(documents),
+        })
+        data["_llm"] = stats
+        results.append(data)
+    return results
+
+
+batcher = MicroBatcher(_run_batch, _run_local_llm, size_of=lambda text: min(len(text), MAX_INPUT_CHARS))
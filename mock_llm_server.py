@@ -0,0 +1,105 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Serves both plain JSON and server-sent-event (stream=true) replies so the LLM
+client can be exercised without OpenRouter:
+
+    python mock_llm_server.py --port 8099 --chunk-delay 0.05 --extra-fields 40
+    LLM_API_URL=http://127.0.0.1:8099/v1/chat/completions LLM_STREAM=true python app.py
+
+The reply fills every field requested in the response_format schema (per
+document for multi-document batch schemas) and then keeps emitting optional
+"extra_*" fields, mimicking a model that rambles on after the required
+fields are done.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fill(schema, extra_fields):
+    fields = schema.get("properties", {}) or {"name": {}}
+    reply = {field: fill(sub, extra_fields) if sub.get("type") == "object" else f"sample {field.replace('_', ' ')}"
+             for field, sub in fields.items()}
+    if not any(sub.get("type") == "object" for sub in fields.values()):
+        for i in range(extra_fields):
+            reply[f"extra_{i}"] = "optional detail " * 4
+    return reply
+
+
+def build_reply(payload, extra_fields):
+    schema = (payload.get("response_format") or {}).get("json_schema", {}).get("schema", {})
+    return json.dumps(fill(schema, extra_fields))
+
+
+def chunk_text(text, size=12):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    options = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        opts = self.options
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if opts.latency:
+            time.sleep(opts.latency * random.uniform(0.5, 1.5))
+        if opts.fail_rate and random.random() < opts.fail_rate:
+            self.send_response(opts.fail_status)
+            self.end_headers()
+            self.wfile.write(b'{"error": "injected failure"}')
+            return
+
+        content = build_reply(payload, opts.extra_fields)
+        usage = {"prompt_tokens": 100, "completion_tokens": len(content) // 4,
+                 "total_tokens": 100 + len(content) // 4}
+
+        if not payload.get("stream"):
+            body = json.dumps({"choices": [{"message": {"content": content}}], "usage": usage}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for piece in chunk_text(content):
+                event = {"choices": [{"delta": {"content": piece}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(opts.chunk_delay)
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client closed the stream early
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--extra-fields", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean delay before replying")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    Handler.options = parser.parse_args()
+    server = ThreadingHTTPServer((Handler.options.host, Handler.options.port), Handler)
+    print(f"Mock LLM listening on http://{Handler.options.host}:{Handler.options.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
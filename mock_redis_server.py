@@ -0,0 +1,174 @@
+"""
+Local stand-in for a Redis server, for exercising the shared cache tier
+without one:
+
+    python mock_redis_server.py --port 6399
+    SHARED_CACHE_URL=redis://127.0.0.1:6399/0 gunicorn -w 4 app:app
+
+Speaks RESP2 and implements the commands shared_cache.RedisBackend sends
+(GET, SET with EX/PX/NX/XX, DEL, AUTH, SELECT, and EVAL of its two lock
+scripts) plus PING, EXISTS, TTL/PTTL and FLUSHDB. Data lives in memory per
+database and expires lazily.
+"""
+import argparse
+import asyncio
+import time
+
+from shared_cache import RELEASE_SCRIPT, RENEW_SCRIPT
+
+
+class Store:
+    def __init__(self, password=None):
+        self.password = password
+        self.dbs = {}  # db -> {key: (value, expires_at or None)}
+
+    def _live(self, db, key):
+        entry = self.dbs.setdefault(db, {}).get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.dbs[db][key]
+            return None
+        return entry
+
+    def execute(self, session, args):
+        command = args[0].upper().decode() if args else ""
+        if self.password and not session["authed"] and command not in ("AUTH", "PING"):
+            return Error("NOAUTH Authentication required.")
+        handler = getattr(self, "cmd_" + command.lower(), None)
+        if handler is None:
+            return Error(f"ERR unknown command '{command}'")
+        try:
+            return handler(session, *args[1:])
+        except (TypeError, ValueError):
+            return Error(f"ERR wrong number or type of arguments for '{command.lower()}' command")
+
+    def cmd_ping(self, session, message=None):
+        return message if message is not None else Simple("PONG")
+
+    def cmd_auth(self, session, *credentials):
+        if not self.password or credentials[-1].decode() == self.password:
+            session["authed"] = True
+            return Simple("OK")
+        return Error("WRONGPASS invalid username-password pair")
+
+    def cmd_select(self, session, db):
+        session["db"] = int(db)
+        return Simple("OK")
+
+    def cmd_get(self, session, key):
+        entry = self._live(session["db"], key)
+        return None if entry is None else entry[0]
+
+    def cmd_set(self, session, key, value, *options):
+        options = [option.upper() for option in options]
+        expires = None
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                expires = time.monotonic() + int(options[options.index(unit) + 1]) * scale
+        exists = self._live(session["db"], key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return None
+        self.dbs[session["db"]][key] = (value, expires)
+        return Simple("OK")
+
+    def cmd_del(self, session, *keys):
+        return sum(self.dbs.setdefault(session["db"], {}).pop(key, None) is not None
+                   for key in keys if self._live(session["db"], key) is not None)
+
+    def cmd_eval(self, session, script, numkeys, key, token, *args):
+        # No Lua here: the known compare-and-act scripts are run natively
+        if script.decode() not in (RENEW_SCRIPT, RELEASE_SCRIPT):
+            return Error("ERR the mock only runs shared_cache's lock scripts")
+        entry = self._live(session["db"], key)
+        if entry is None or entry[0] != token:
+            return 0
+        if script.decode() == RELEASE_SCRIPT:
+            return self.cmd_del(session, key)
+        self.dbs[session["db"]][key] = (entry[0], time.monotonic() + int(args[0]) / 1000)
+        return 1
+
+    def cmd_exists(self, session, *keys):
+        return sum(self._live(session["db"], key) is not None for key in keys)
+
+    def cmd_pttl(self, session, key):
+        entry = self._live(session["db"], key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.monotonic()) * 1000)
+
+    def cmd_ttl(self, session, key):
+        ttl = self.cmd_pttl(session, key)
+        return ttl if ttl < 0 else ttl // 1000
+
+    def cmd_flushdb(self, session):
+        self.dbs[session["db"]] = {}
+        return Simple("OK")
+
+
+class Simple(str):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def encode(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Error):
+        return b"-%s\r\n" % reply.encode()
+    if isinstance(reply, Simple):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, str):
+        reply = reply.encode()
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command (e.g. typed into telnet)
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    parser.add_argument("--password")
+    args = parser.parse_args()
+    store = Store(args.password)
+
+    async def handle(reader, writer):
+        session = {"db": 0, "authed": False}
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                writer.write(encode(store.execute(session, command)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, args.host, args.port)
+        print(f"Mock Redis listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
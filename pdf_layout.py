@@ -0,0 +1,247 @@
+"""
+Label/value extraction from the text layer of born-digital PDFs.
+
+DigiLocker Aadhaar, e-PAN and state-issued certificates carry an exact
+text layer with word coordinates. Instead of flattening it and paying an
+LLM round trip to recover "label: value" pairs, extract_fields() finds the
+printed labels of the requested comparator fields and takes the value either on the
+same visual line, after the label, or on the line directly below it. Values
+are checked against the shape of their field (a date, a 12-digit number)
+and returned under the personal_details field names. When every requested
+field is found, the LLM call is skipped altogether.
+
+PDF_LAYOUT=false disables it.
+"""
+import logging
+import os
+import re
+from datetime import datetime
+
+from doc_validator import DocumentValidator
+
+PDF_LAYOUT = os.getenv("PDF_LAYOUT", "true").lower() == "true"
+BELOW_LINES = 1.8  # how far below a label (in line heights) its value may start
+COLUMN_GAP = 2.5   # horizontal gap (in line heights) that ends a value on its line
+ADDRESS_LINES = 4  # continuation lines collected for multi-line addresses
+
+# Printed labels per field. Unlike DocumentComparator's field maps these leave
+# out key spellings (fatherName) and near misses ("Date of Issue" for a DOB).
+LABELS = {
+    "name": ["Name", "Full Name", "Holder's Name", "Name of the Holder", "Applicant Name", "Candidate Name",
+             "Student Name", "Applicant's Name", "Candidate's Name", "Student's Name", "Name of the Applicant",
+             "Name of Applicant", "Name of the Candidate", "Name of Candidate", "Name of the Student",
+             "Name of Student"],
+    "father_name": ["Father's Name", "Father Name", "Name of Father", "Father / Husband Name", "S/O", "D/O",
+                    "F/O", "W/O", "Son of", "Daughter of"],
+    "mother_name": ["Mother's Name", "Mother Name", "Name of Mother"],
+    "date_of_birth": ["Date of Birth", "DOB", "D.O.B", "Birth Date", "Year of Birth"],
+    "contact": ["Mobile", "Mobile No", "Mobile Number", "Phone", "Phone No", "Contact No", "Contact Number"],
+    "address": ["Address", "Residential Address", "Permanent Address"],
+    "aadhar_number": ["Aadhaar No", "Aadhaar Number", "Aadhar No", "Your Aadhaar No", "UID", "VID"],
+    "passport_number": ["Passport No", "Passport Number"],
+    "nationality": ["Nationality"],
+    "place_of_birth": ["Place of Birth"],
+    "university": ["University"],
+    "college": ["College", "College Name", "Institution", "Institute"],
+    "course": ["Course", "Degree", "Programme", "Branch"],
+    "year": ["Academic Year", "Year"],
+    "caste": ["Caste", "Sub Caste", "Caste Name"],
+    "category": ["Category", "Caste Category"],
+    "previous_school": ["Previous School", "School", "School Name", "Last School Attended"],
+    "year_of_passing": ["Year of Passing", "Passing Year"],
+    "marks": ["Marks", "Marks Obtained", "Grade", "Percentage", "CGPA"],
+}
+# Labels printed straight before their value ("S/O Ramesh"); every other label must be
+# followed by a colon, a column gap or the end of its line, so that "Name" does not
+# match the start of "Name of Institution".
+INLINE_LABELS = ["S/O", "D/O", "F/O", "W/O", "Son of", "Daughter of"]
+
+_DATE = re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})[/\-.]((?:19|20)\d{2})\b")
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_AADHAAR = re.compile(r"(?<!\d)(\d{4})\s?(\d{4})\s?(\d{4})(?!\d)")
+_MOBILE = re.compile(r"(?<!\d)(?:\+?91[\s-]?)?([6-9]\d{9})(?!\d)")
+_PASSPORT = re.compile(r"\b[A-Z][0-9]{7}\b")
+
+logger = logging.getLogger(__name__)
+
+
+def _token(word):
+    return word.lower().replace("’", "'").strip(":;.,-")
+
+
+def _label_index():
+    """{first token: [(label tokens, field, inline)]}; earlier fields in LABELS win ties."""
+    index = {}
+    for field, labels in LABELS.items():
+        for label in labels:
+            tokens = tuple(_token(part) for part in label.split())
+            index.setdefault(tokens[0], []).append((tokens, field, label in INLINE_LABELS))
+    return index
+
+
+_LABEL_INDEX = _label_index()
+
+
+def _lines(page):
+    """Words of a page grouped into visual lines (top to bottom, each left to right)."""
+    words = sorted(page.get_text("words"), key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+    lines = []
+    for x0, y0, x1, y1, text, *_ in words:
+        center = (y0 + y1) / 2
+        if lines and abs(center - lines[-1]["center"]) < 0.5 * (y1 - y0):
+            lines[-1]["words"].append((x0, y0, x1, y1, text))
+        else:
+            lines.append({"center": center, "words": [(x0, y0, x1, y1, text)]})
+    for line in lines:
+        line["words"].sort()
+        line["height"] = max(w[3] - w[1] for w in line["words"])
+        line["tokens"] = [_token(w[4]) for w in line["words"]]
+    return lines
+
+
+def _separated(line, start, end):
+    """
+    Whether words[start:end] stand apart as a label: followed by a colon, or
+    starting a line or column and followed by a column gap or the end of the line.
+    """
+    words, gap = line["words"], COLUMN_GAP * line["height"]
+    if end < len(words) and (words[end - 1][4].endswith(":") or words[end][4].startswith(":")):
+        return True
+    if start > 0 and words[start][0] - words[start - 1][2] <= gap:
+        return False  # the last words of a value ("Govt First Grade College")
+    return end >= len(words) or words[end][0] - words[end - 1][2] > gap
+
+
+def _match_labels(line, labels):
+    """[(start, end, field)] of the labels in a line, taking the longest label at each word."""
+    matches, i = [], 0
+    tokens = line["tokens"]
+    while i < len(tokens):
+        best = None
+        for variant, field, inline in labels.get(tokens[i], ()):
+            end = i + len(variant)
+            if tuple(tokens[i:end]) != variant or not (inline or _separated(line, i, end)):
+                continue
+            if best is None or end > best[1]:
+                best = (i, end, field)
+        if best:
+            matches.append(best)
+            i = best[1]
+        else:
+            i += 1
+    return matches
+
+
+def _run(words, start, end, height, after_label=False):
+    """Text of words[start:end], cut at the first column-sized gap (after_label: also before start)."""
+    taken = []
+    for k in range(start, end):
+        if (taken or after_label) and words[k][0] - words[k - 1][2] > COLUMN_GAP * height:
+            break
+        taken.append(words[k][4])
+    return " ".join(taken).strip(" :-,")
+
+
+def _clean(field, value):
+    """Value in the form the LLM is asked for, or None when it does not fit the field."""
+    if not value:
+        return None
+    if field == "date_of_birth":
+        date = _DATE.search(value)
+        if date:
+            day, month, year = (int(part) for part in date.groups())
+            try:
+                return datetime(year, month, day).strftime("%Y-%m-%d")
+            except ValueError:
+                return None
+        year = _YEAR.search(value)
+        return year.group(0) if year else None
+    if field == "year_of_passing":
+        year = _YEAR.search(value)
+        return year.group(0) if year else None
+    if field == "marks":
+        return value if re.search(r"\d", value) else None
+    if field == "aadhar_number":
+        number = _AADHAAR.search(value)
+        return "".join(number.groups()) if number else None
+    if field == "contact":
+        number = _MOBILE.search(value)
+        return number.group(1) if number else None
+    if field == "passport_number":
+        number = _PASSPORT.search(value.upper())
+        return number.group(0) if number else None
+    return value if re.search(r"[A-Za-z]", value) else None
+
+
+def _start_at(line, x0):
+    """Index of the word of line that starts at x0 (within a line height or two), or None."""
+    start = next((k for k, w in enumerate(line["words"]) if w[2] > x0 - line["height"]), None)
+    if start is None or abs(line["words"][start][0] - x0) > 2 * line["height"]:
+        return None
+    return start
+
+
+def _value_below(lines, index, x0, labels):
+    """(value, its line, its x) printed under a label that starts at x0, or (None, None, None)."""
+    line = lines[index]
+    for below in lines[index + 1:]:
+        if below["center"] - line["center"] > BELOW_LINES * line["height"]:
+            break
+        start = _start_at(below, x0)
+        if start is None:
+            continue
+        if any(match[0] == start for match in _match_labels(below, labels)):
+            break  # the next line is another label
+        return _run(below["words"], start, len(below["words"]), below["height"]), below, below["words"][start][0]
+    return None, None, None
+
+
+def _address_continuation(lines, line, x0, labels):
+    """Following lines of a multi-line address that continue at x0."""
+    parts = []
+    for below in lines[lines.index(line) + 1:lines.index(line) + 1 + ADDRESS_LINES]:
+        start = _start_at(below, x0)
+        if below["center"] - line["center"] > BELOW_LINES * line["height"] or start is None:
+            break
+        if any(match[0] >= start for match in _match_labels(below, labels)):
+            break
+        parts.append(_run(below["words"], start, len(below["words"]), below["height"]))
+        line = below
+    return parts
+
+
+def extract_fields(doc, fields):
+    """
+    {field: value} for the requested comparator fields found in the text
+    layer of an open PDF; fields that are not found are left out.
+    """
+    labels = _LABEL_INDEX
+    found = {}
+    for page in doc:
+        lines = _lines(page)
+        for index, line in enumerate(lines):
+            matches = _match_labels(line, labels)
+            for k, (start, end, field) in enumerate(matches):
+                if field not in fields or field in found:
+                    continue
+                next_label = matches[k + 1][0] if k + 1 < len(matches) else len(line["words"])
+                value = _run(line["words"], end, next_label, line["height"], after_label=True)
+                if value:
+                    value_line, x0 = line, line["words"][end][0]
+                else:
+                    value, value_line, x0 = _value_below(lines, index, line["words"][start][0], labels)
+                if field == "address" and value:
+                    value = ", ".join([value] + _address_continuation(lines, value_line, x0, labels))
+                value = _clean(field, value)
+                if value:
+                    found[field] = value
+        if "aadhar_number" in fields and "aadhar_number" not in found:
+            # e-Aadhaar prints the number on its own, without a label; the checksum
+            # tells it apart from other 12-digit runs
+            for number in _AADHAAR.finditer(page.get_text()):
+                if DocumentValidator.validate_aadhaar("".join(number.groups()))[0] == "valid":
+                    found["aadhar_number"] = "".join(number.groups())
+                    break
+        if len(found) == len(set(fields)):
+            break
+    return found
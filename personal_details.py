@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from prompts import FIELD_DESCRIPTIONS
+
+# Nested keys produced by the earlier free-form prompt, flattened with "_"
+KEY_MAPPING = {
+    "Personal Information_Full Name": "name",
+    "Personal Information_Father's Name": "father_name",
+    "Personal Information_Mother's Name": "mother_name",
+    "Personal Information_Date of Birth": "date_of_birth",
+    "Contact Information_Phone Number(s)": "contact",
+    "Contact Information_Email Address(es)": "email",
+    "Contact Information_Full Address": "full_address",
+    "Document Identifiers_Aadhaar Number": "aadhaar_number",
+    "Document Identifiers_PAN Number": "pan_number",
+    "personal information_gender": "gender",
+    "personal information_nationality": "nationality",
+    "personal information_religion": "religion",
+    "personal information_caste / Category": "category",
+    "personal information_marital Status": "marital_status",
+    "personal information_full Name": "name",
+    "personal information_identification Marks": "id_marks",
+    "personal information_father's Name": "father_name",
+    "personal information_mother's Name": "mother_name",
+    "personal information_date of Birth": "date_of_birth",
+    "contact information_phone Number(s)": "contact",
+    "contact information_email Address(es)": "email",
+    "contact information_full Address": "full_address",
+    "document identifiers_aadhaar Number": "aadhaar_number",
+    "document identifiers_pan Number": "pan_number",
+}
+
+
+def flatten_dict(d, parent_key='', sep='_'):
+    items = {}
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict) and v is not None:
+            items.update(flatten_dict(v, new_key, sep=sep))
+        else:
+            items[new_key] = v
+    return items
+
+
+def normalize_personal_details(raw_details, key_mapping=KEY_MAPPING):
+    """Map extracted personal_details onto the comparator's field names."""
+    normalized = {}
+    for original_key, value in flatten_dict(raw_details or {}).items():
+        mapped_key = key_mapping.get(original_key)
+        if not mapped_key and original_key in FIELD_DESCRIPTIONS:
+            mapped_key = original_key  # already a canonical field name
+        if mapped_key:
+            if isinstance(value, list):
+                normalized[mapped_key] = value[0] if len(value) > 0 else None
+            else:
+                normalized[mapped_key] = value
+    dob = normalized.get("date_of_birth")
+    if dob:
+        try:
+            dt = datetime.strptime(dob, "%d/%m/%Y")
+            normalized["date_of_birth"] = dt.strftime("%Y-%m-%d")
+        except Exception:
+            pass
+    return normalized
@@ -0,0 +1,165 @@
+"""
+Per-request stage plans.
+
+Every upload used to run the same pipeline: OCR, Haar face detection,
+signature search and an LLM call for every field the prompt knows. The
+planner decides up front, from docType, the request flags and the fields
+the comparator scores, which of those stages the request needs:
+
+- face detection only when the selfie is to be compared
+  (requireFaceComparison) and the document type carries a holder photo;
+- signature search only for document types that carry the holder's
+  signature;
+- the LLM only for the fields the comparator scores that the document type
+  actually prints, and not at all when the profile has no value for any of
+  them (nothing could match);
+- OCR of scanned PDF pages only until those fields have all been found
+  (ExtractionAgent.analyze, field_detector).
+
+Unknown document types get every stage. Skipped stages are reported with
+the time they would have taken, estimated from the recent runs of the stage
+in this process. PIPELINE_PLANNER=false restores the fixed pipeline.
+"""
+import os
+import threading
+
+from prompts import fields_for
+
+PIPELINE_PLANNER = os.getenv("PIPELINE_PLANNER", "true").lower() == "true"
+
+# What each document type carries: (holder photo, holder signature)
+DOCUMENT_TRAITS = {
+    "aadhaar": (True, False),
+    "pan": (True, True),
+    "passport": (True, True),
+    "driving_license": (True, True),
+    "voter_id": (True, False),
+    "bonafide": (False, False),
+    "caste_certificate": (False, False),
+    "income_certificate": (False, False),
+}
+
+# Comparator fields a document type prints, for types the comparator has no
+# field map of (it then scores every profile field)
+PRINTED_FIELDS = {
+    "pan": ["name", "father_name", "date_of_birth"],
+}
+
+
+class StageCosts:
+    """Moving average of each stage's duration, to estimate what skipping it saves."""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._ms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms):
+        if ms is None:
+            return
+        with self._lock:
+            previous = self._ms.get(stage)
+            self._ms[stage] = ms if previous is None else (1 - self.alpha) * previous + self.alpha * ms
+
+    def observe_analysis(self, pipeline_stats):
+        """Record the detection and per-page OCR timings ExtractionAgent.analyze reports."""
+        if pipeline_stats.get("shared_cache"):
+            return  # timings of the run that filled the cache, recorded by the process that ran them
+        for stage in ("face_detection", "signature_detection"):
+            self.observe(stage, pipeline_stats.get(f"{stage}_ms"))
+        if pipeline_stats.get("pages_ocr") and "ocr_ms" in pipeline_stats:
+            self.observe("ocr_page", pipeline_stats["ocr_ms"] / pipeline_stats["pages_ocr"])
+
+    def estimate(self, stage):
+        with self._lock:
+            return self._ms.get(stage)
+
+
+costs = StageCosts()
+
+
+class StagePlan:
+    """Which optional stages one request runs; picklable, so it can cross the process pool."""
+
+    def __init__(self, doc_type=None, faces=True, signatures=True, llm_fields=None, skipped=None):
+        self.doc_type = doc_type
+        self.faces = faces
+        self.signatures = signatures
+        self.llm_fields = llm_fields  # fields to ask the LLM for
+        self.skipped = dict(skipped or {})  # stage -> (reason, times skipped)
+
+    @property
+    def key(self):
+        """Distinguishes analyses run under different plans (for result sharing)."""
+        # OCR stops once llm_fields are found, so they shape the analysis too
+        return f"faces={int(self.faces)};signatures={int(self.signatures)};fields={','.join(self.llm_fields or ())}"
+
+    def needs_llm(self, profile):
+        """False when the profile has no value for any field the LLM would extract."""
+        if not profile:
+            return False
+        if not PIPELINE_PLANNER or any(str(profile.get(field) or "").strip() for field in self.llm_fields):
+            return True
+        self.skip("llm", "the profile has no value for any field the comparator scores")
+        return False
+
+    def covers(self, extraction):
+        """Whether a stored extraction ran every stage and field this plan needs."""
+        previous = (extraction.get("pipeline_stats") or {}).get("plan")
+        if not previous:
+            return True  # stored before plans existed: the fixed pipeline ran everything
+        return ((previous["face_detection"] or not self.faces)
+                and (previous["signature_detection"] or not self.signatures)
+                and set(self.llm_fields) <= set(previous["llm_fields"] or ()))
+
+    def skip(self, stage, reason, times=1):
+        self.skipped[stage] = (reason, times)
+
+    def observe_analysis(self, pipeline_stats):
+        """Feed an analysis' timings to the stage costs and record the scanned pages it did not OCR."""
+        costs.observe_analysis(pipeline_stats)
+        pages = pipeline_stats.get("pages_skipped")
+        if pages:
+            self.skip("ocr_page", f"{pages} scanned pages after the one where every field was found", pages)
+
+    def report(self):
+        skipped = {}
+        saved = 0.0
+        for stage, (reason, times) in self.skipped.items():
+            estimate = costs.estimate(stage)
+            estimate = None if estimate is None else estimate * times
+            skipped[stage] = {"reason": reason, "estimated_ms": None if estimate is None else round(estimate, 1)}
+            saved += estimate or 0.0
+        return {
+            "doc_type": self.doc_type,
+            "face_detection": self.faces,
+            "signature_detection": self.signatures,
+            "llm_fields": self.llm_fields,
+            "skipped": skipped,
+            "estimated_saved_ms": round(saved, 1),
+        }
+
+
+def plan_request(doc_type=None, require_face_comparison=True):
+    """StagePlan for one upload; every stage when the planner is disabled."""
+    doc_type = doc_type.lower() if doc_type else None
+    llm_fields = fields_for(doc_type)
+    if not PIPELINE_PLANNER:
+        return StagePlan(doc_type, llm_fields=llm_fields)
+
+    plan = StagePlan(doc_type)
+    has_photo, has_signature = DOCUMENT_TRAITS.get(doc_type, (True, True))
+    if not require_face_comparison:
+        plan.faces = False
+        plan.skip("face_detection", "requireFaceComparison is false")
+    elif not has_photo:
+        plan.faces = False
+        plan.skip("face_detection", f"{doc_type} documents carry no holder photo")
+    if not has_signature:
+        plan.signatures = False
+        plan.skip("signature_detection", f"{doc_type} documents carry no holder signature")
+
+    printed = PRINTED_FIELDS.get(doc_type)
+    plan.llm_fields = [field for field in llm_fields if field in printed] if printed else llm_fields
+    return plan
+
@@ -0,0 +1,168 @@
+"""
+Incremental re-verification when applicant profiles change.
+
+Listens to the Firestore `applications` collection and, when a profile is
+edited, re-runs only the comparison against the extractions already held in
+the verification store: no upload, no OCR and no LLM call. Only the fields
+whose profile value changed are rescored; the updated verdicts are written
+back to the store (and to Firestore `verifications` with --write-firestore).
+
+Edits are debounced per uid (PROFILE_WATCH_DEBOUNCE seconds of quiet), so a
+burst of keystroke-level saves costs one recomparison. The initial snapshot
+is handled like any change, which also catches edits made while the watcher
+was down.
+
+    python profile_watcher.py
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python profile_watcher.py --project demo-verification
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+from compare_agent import DocumentComparator
+from firebase_service import FirebaseService
+from personal_details import normalize_personal_details
+from shared_cache import cache as shared_cache
+from structured_logging import setup_logging, correlation_id
+from verification_store import store as verification_store
+
+PROFILE_WATCH_DEBOUNCE = float(os.getenv("PROFILE_WATCH_DEBOUNCE", "5"))
+COLLECTION = "applications"
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileWatcher:
+    def __init__(self, store=verification_store, debounce=PROFILE_WATCH_DEBOUNCE, on_result=None):
+        self.store = store
+        self.debounce = debounce
+        self.on_result = on_result
+        self.pending = {}  # uid -> (latest standardized profile, due time)
+        self.stats = {"events": 0, "reverified_uids": 0, "updated": 0, "fields_rescored": 0}
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    # === EVENTS ===
+    def on_snapshot(self, docs, changes, read_time):
+        """Firestore listener callback; runs on the listener's thread and only queues work."""
+        for change in changes:
+            data = change.document.to_dict() or {}
+            uid = data.get("userId")
+            if not uid:
+                continue
+            if change.type.name == "REMOVED":
+                shared_cache.delete("profile", uid)
+                continue
+            profile = FirebaseService.standardize_profile(data)
+            shared_cache.set("profile", uid, profile)  # the services see the edit before the TTL runs out
+            self.submit(uid, profile)
+
+    def submit(self, uid, profile):
+        """Queue a profile for re-verification; a newer edit replaces it and restarts the wait."""
+        with self._cond:
+            self.stats["events"] += 1
+            self.pending[uid] = (profile, time.monotonic() + self.debounce)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        """Process debounced profiles until stop()."""
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    due = [uid for uid, (_, at) in self.pending.items() if at <= now]
+                    if due:
+                        break
+                    next_due = min((at for _, at in self.pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                if self._stopped:
+                    return
+                batch = [(uid, self.pending.pop(uid)[0]) for uid in due]
+
+            for uid, profile in batch:
+                try:
+                    self.reverify(uid, profile)
+                except Exception as e:
+                    logger.error("Re-verification failed for %s: %s", uid, e, exc_info=True)
+
+    # === RECOMPARISON ===
+    def reverify(self, uid, profile):
+        """Rescore the changed fields of every stored document of a user; returns the updated results."""
+        updated = []
+        with correlation_id(f"profile:{uid}"):
+            for record in self.store.latest_per_document(uid):
+                report = record["report"]
+                previous = report.get("comparison_result") or {}
+                details = normalize_personal_details(report["extracted_data"].get("personal_details", {}))
+                comparator = DocumentComparator(profile, details, record["doc_type"])
+                changed = comparator.changed_fields(previous)
+                if not changed:
+                    continue
+
+                result = comparator.recompare(previous, changed)
+                self.store.update_comparison(record["id"], result, changed)
+                self.stats["updated"] += 1
+                self.stats["fields_rescored"] += len(changed)
+                logger.info("Re-verified %s document %s: %s -> %s (fields %s)", record["doc_type"],
+                            record["doc_hash"][:12], previous.get("verdict"), result["verdict"], changed)
+                if self.on_result:
+                    self.on_result(uid, record, result)
+                updated.append(result)
+        if updated:
+            self.stats["reverified_uids"] += 1
+        return updated
+
+
+def firestore_client(project=None):
+    """Emulator client when FIRESTORE_EMULATOR_HOST is set, else the service's credentials."""
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import firestore
+        return firestore.Client(project=project or os.getenv("FIREBASE_PROJECT_ID", "demo-verification"),
+                                credentials=AnonymousCredentials())
+    return FirebaseService().db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-verify stored documents when applicant profiles change.")
+    parser.add_argument("--project", help="Firestore project id (emulator)")
+    parser.add_argument("--debounce", type=float, default=PROFILE_WATCH_DEBOUNCE)
+    parser.add_argument("--write-firestore", action="store_true",
+                        help="also write updated verdicts to the Firestore verifications collection")
+    args = parser.parse_args()
+    setup_logging()
+
+    client = firestore_client(args.project)
+    if client is None:
+        raise SystemExit("Firestore is not configured")
+
+    on_result = None
+    if args.write_firestore:
+        firebase_service = FirebaseService()
+
+        def on_result(uid, record, result):
+            firebase_service.save_verification_result(uid, dict(
+                result, document_type=record["doc_type"], document_number=record["doc_number"]))
+
+    watcher = ProfileWatcher(debounce=args.debounce, on_result=on_result)
+    watch = client.collection(COLLECTION).on_snapshot(watcher.on_snapshot)
+    logger.info("Watching %s for profile changes (debounce %.1fs)", COLLECTION, args.debounce)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watch.unsubscribe()
+        watcher.stop()
+        logger.info("Stopped: %s", watcher.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import json
+import re
+import unicodedata
+
+from compare_agent import DocumentComparator
+
+# Profile fields compared when no document-specific mapping applies
+# (mirrors the standardized profile built by FirebaseService)
+DEFAULT_FIELDS = [
+    "name", "father_name", "mother_name", "date_of_birth", "contact", "address",
+    "category", "previous_school", "year_of_passing", "marks",
+]
+
+# One short instruction per canonical field the comparator can use
+FIELD_DESCRIPTIONS = {
+    "name": "full name of the document holder",
+    "father_name": "father's name (S/O, D/O, F/O line)",
+    "mother_name": "mother's name",
+    "date_of_birth": "date of birth as YYYY-MM-DD, or the year if only the year is printed",
+    "contact": "10-digit mobile number starting with 6-9",
+    "address": "full address",
+    "aadhar_number": "12-digit Aadhaar number, digits only",
+    "passport_number": "passport number",
+    "nationality": "nationality",
+    "place_of_birth": "place of birth",
+    "university": "university name",
+    "college": "college or institution name",
+    "course": "course or degree",
+    "year": "academic year",
+    "caste": "caste name",
+    "category": "caste category (SC/ST/OBC/General)",
+    "previous_school": "school or college name",
+    "year_of_passing": "year of passing",
+    "marks": "marks, grade or percentage",
+}
+
+DOC_LABELS = {
+    "aadhaar": "Aadhaar card",
+    "pan": "PAN card",
+    "passport": "Indian passport",
+    "bonafide": "bonafide certificate",
+    "driving_license": "driving licence",
+    "caste_certificate": "caste certificate",
+    "voter_id": "voter ID card",
+    "income_certificate": "income certificate",
+}
+
+SYSTEM_PROMPT = "You extract fields from OCR text of Indian documents. Reply with one JSON object only."
+
+USER_TEMPLATE = """Document: {label}
+Extract these fields:
+{field_lines}
+Use null for any field not present. Copy values as printed; do not guess.
+
+OCR text:
+\"\"\"
+{text}
+\"\"\""""
+
+BATCH_SYSTEM_PROMPT = ("You extract fields from OCR text of Indian documents. Several documents are given; "
+                       "reply with one JSON object holding one entry per document.")
+
+BATCH_USER_TEMPLATE = """Extract the listed fields from each document below. Reply with one JSON object whose
+keys are the document ids ({ids}); each value is an object with that document's fields.
+Use null for any field not present. Copy values as printed; do not guess. Never copy a
+value from one document into another.
+{sections}"""
+
+BATCH_SECTION_TEMPLATE = """
+=== {doc_id}: {label} ===
+Fields:
+{field_lines}
+OCR text:
+\"\"\"
+{text}
+\"\"\"
+"""
+
+_NOISE_RUN = re.compile(r"[|_~=*#<>\[\]{}`^\\]{2,}")
+_SPACES = re.compile(r"[ \t\f\v]+")
+
+
+def fields_for(doc_type):
+    """Canonical fields the comparator needs for this document type."""
+    doc_type = doc_type.lower() if doc_type else None
+    if doc_type and doc_type in DocumentComparator.DOCUMENT_FIELD_MAPPINGS:
+        return list(DocumentComparator.field_map_for(doc_type).keys())
+    return list(DEFAULT_FIELDS)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 chars per token) for budgeting before the call."""
+    return (len(text) + 3) // 4
+
+
+def clean_ocr_text(text, max_chars=4000):
+    """
+    Drop OCR noise before it reaches the prompt: control characters, runs of
+    box-drawing symbols, lines with almost no letters or digits, and repeated
+    lines. The result is truncated at a line boundary to max_chars.
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    cleaned, seen, size = [], set(), 0
+    for line in text.splitlines():
+        line = "".join(ch for ch in line if ch.isprintable())
+        line = _SPACES.sub(" ", _NOISE_RUN.sub(" ", line)).strip()
+        alnum = sum(ch.isalnum() for ch in line)
+        if alnum < 2 or alnum < 0.4 * len(line):
+            continue
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        if size + len(line) + 1 > max_chars:
+            break
+        cleaned.append(line)
+        size += len(line) + 1
+    return "\n".join(cleaned)
+
+
+def json_schema_for(fields):
+    return {
+        "type": "object",
+        "properties": {f: {"type": ["string", "null"]} for f in fields},
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+
+
+def _label_and_field_lines(doc_type, fields):
+    label = DOC_LABELS.get((doc_type or "").lower(), "identity or certificate document")
+    field_lines = "\n".join(f"- {f}: {FIELD_DESCRIPTIONS.get(f, f.replace('_', ' '))}" for f in fields)
+    return label, field_lines
+
+
+def build_messages(doc_text, doc_type=None, max_chars=4000, fields=None):
+    """Return (messages, fields, stats) for a docType-specific extraction call (default: fields_for)."""
+    fields = fields or fields_for(doc_type)
+    clean = clean_ocr_text(doc_text, max_chars=max_chars)
+    label, field_lines = _label_and_field_lines(doc_type, fields)
+    user = USER_TEMPLATE.format(label=label, field_lines=field_lines, text=clean)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user},
+    ]
+    stats = {
+        "input_chars_raw": len(doc_text or ""),
+        "input_chars_clean": len(clean),
+        "estimated_prompt_tokens": estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user),
+    }
+    return messages, fields, stats
+
+
+def batch_doc_id(index):
+    return f"doc_{index + 1}"
+
+
+def build_batch_messages(documents, max_chars=4000):
+    """
+    One request extracting several documents: documents is a list of
+    (doc_text, doc_type, fields or None). Returns (messages, fields per
+    document, stats per document); the instructions are sent once instead
+    of once per document.
+    """
+    sections, field_lists, stats = [], [], []
+    for index, (doc_text, doc_type, fields) in enumerate(documents):
+        fields = fields or fields_for(doc_type)
+        clean = clean_ocr_text(doc_text, max_chars=max_chars)
+        label, field_lines = _label_and_field_lines(doc_type, fields)
+        section = BATCH_SECTION_TEMPLATE.format(doc_id=batch_doc_id(index), label=label,
+                                                field_lines=field_lines, text=clean)
+        sections.append(section)
+        field_lists.append(fields)
+        stats.append({
+            "input_chars_raw": len(doc_text or ""),
+            "input_chars_clean": len(clean),
+            "estimated_prompt_tokens": estimate_tokens(section),
+        })
+    ids = ", ".join(batch_doc_id(i) for i in range(len(documents)))
+    user = BATCH_USER_TEMPLATE.format(ids=ids, sections="".join(sections))
+    messages = [
+        {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": user},
+    ]
+    return messages, field_lists, stats
+
+
+def batch_response_format(field_lists):
+    schema = {
+        "type": "object",
+        "properties": {batch_doc_id(i): json_schema_for(fields) for i, fields in enumerate(field_lists)},
+        "required": [batch_doc_id(i) for i in range(len(field_lists))],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "document_batch", "strict": True, "schema": schema},
+    }
+
+
+def response_format_for(fields):
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "document_fields", "strict": True, "schema": json_schema_for(fields)},
+    }
+
+
+def _first_json_object(raw):
+    """Decode the first complete JSON object in raw, ignoring surrounding prose."""
+    decoder = json.JSONDecoder()
+    pos = raw.find("{")
+    while pos != -1:
+        try:
+            obj, _ = decoder.raw_decode(raw, pos)
+            if isinstance(obj, dict):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        pos = raw.find("{", pos + 1)
+    return None
+
+
+def parse_fields(raw, fields):
+    """
+    Validate a model reply against the field contract.
+
+    Returns (data, error). Unknown keys are dropped, null/empty values are
+    omitted and scalars are coerced to stripped strings.
+    """
+    obj = _first_json_object(raw or "")
+    if obj is None:
+        return None, "No JSON object found in response."
+    return coerce_fields(obj, fields), None
+
+
+def parse_batch(raw, field_lists):
+    """
+    Split a multi-document reply into per-document field dicts (as parse_fields
+    builds them); an entry is None when that document's object is missing.
+    """
+    obj = _first_json_object(raw or "") or {}
+    results = []
+    for index, fields in enumerate(field_lists):
+        entry = obj.get(batch_doc_id(index))
+        results.append(coerce_fields(entry, fields) if isinstance(entry, dict) else None)
+    return results
+
+
+def coerce_fields(obj, fields):
+    """Keep the contract fields of a decoded reply object as stripped, non-empty strings."""
+    data = {}
+    for field in fields:
+        value = obj.get(field)
+        if isinstance(value, list):
+            value = next((v for v in value if isinstance(v, (str, int, float)) and str(v).strip()), None)
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            continue
+        value = str(value).strip()
+        if value and value.lower() not in ("null", "none", "n/a", "not available"):
+            data[field] = value
+    return data
@@ -0,0 +1,294 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries X-Profile-Token matching PROFILE_TOKEN,
+or at random with probability PROFILE_SAMPLE_RATE. Two modes:
+
+- sample (default): a background thread samples the stacks of the threads
+  working on the request every PROFILE_SAMPLE_INTERVAL seconds and writes
+  collapsed stacks (.folded), ready for flamegraph.pl or speedscope.
+- cprofile: deterministic cProfile of the same threads, merged into one
+  .prof file (pstats / snakeviz). C calls into OpenCV, fitz and pytesseract
+  appear as builtins.
+
+Traces go to PROFILE_DIR, which keeps at most PROFILE_MAX_TRACES traces
+(oldest evicted first). When no profile is active the cost per request is
+one header lookup and one context variable read per stage.
+"""
+import contextvars
+import cProfile
+import functools
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/verification-profiles")
+PROFILE_MAX_TRACES = int(os.getenv("PROFILE_MAX_TRACES", "50"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+TOKEN_HEADER = "X-Profile-Token"
+MODE_HEADER = "X-Profile-Mode"
+MODES = ("sample", "cprofile")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_active = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, label, mode):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.mode = mode
+        self.meta = {}
+        self.threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stats = None
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.duration = None
+
+    def add_thread(self, ident):
+        with self._lock:
+            self.threads.add(ident)
+
+    def remove_thread(self, ident):
+        """Returns True when no thread is left working on the request."""
+        with self._lock:
+            self.threads.discard(ident)
+            return not self.threads
+
+    def thread_idents(self):
+        with self._lock:
+            return tuple(self.threads)
+
+    # --- cProfile mode: one profiler per participating thread, merged at exit ---
+    def add_cprofile(self, profiler):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+
+class _Sampler:
+    """Single background thread sampling the threads of every active profile."""
+
+    def __init__(self):
+        self.profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            self.profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile):
+        with self._lock:
+            self.profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                profiles = list(self.profiles)
+                if not profiles:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in profiles:
+                for ident in profile.thread_idents():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.stacks[_collapse(frame)] += 1
+                        profile.samples += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_sampler = _Sampler()
+
+
+# === CAPTURE ===
+def should_profile(headers):
+    """Mode to profile this request with, or None (the common, near-free path)."""
+    token = headers.get(TOKEN_HEADER)
+    if token and PROFILE_TOKEN and hmac.compare_digest(token, PROFILE_TOKEN):
+        mode = headers.get(MODE_HEADER, PROFILE_MODE)
+        return mode if mode in MODES else PROFILE_MODE
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_MODE
+    return None
+
+
+@contextmanager
+def profile(label, mode=PROFILE_MODE):
+    """Profile the enclosed block and the stage threads it fans out to; yields the profile."""
+    request_profile = RequestProfile(label, mode)
+    token = _active.set(request_profile)
+    try:
+        with thread_scope():
+            yield request_profile
+    finally:
+        _active.reset(token)
+        request_profile.duration = time.time() - request_profile.started
+        store.save(request_profile)
+
+
+@contextmanager
+def thread_scope():
+    """Include the current thread in the active profile, if any (wrap work run on pools)."""
+    request_profile = _active.get()
+    if request_profile is None:
+        yield
+        return
+
+    ident = threading.get_ident()
+    if request_profile.mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler owns this interpreter (3.12+)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            request_profile.add_cprofile(profiler)
+        return
+
+    request_profile.add_thread(ident)
+    _sampler.add(request_profile)
+    try:
+        yield
+    finally:
+        if request_profile.remove_thread(ident):
+            _sampler.remove(request_profile)
+
+
+def profiled(label_fn=None):
+    """
+    Flask view decorator: profile the request when should_profile() says so.
+    label_fn(request) names the trace (e.g. by docType).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, make_response
+            mode = should_profile(request.headers)
+            if mode is None:
+                return view(*args, **kwargs)
+
+            label = label_fn(request) if label_fn else view.__name__
+            with profile(label, mode) as request_profile:
+                response = make_response(view(*args, **kwargs))
+                request_profile.meta["status"] = response.status_code
+            response.headers["X-Profile-Id"] = request_profile.id
+            return response
+        return wrapper
+    return decorator
+
+
+# === STORAGE ===
+class TraceStore:
+    """Bounded on-disk ring buffer of traces: <id>.folded|.prof plus <id>.json metadata."""
+
+    def __init__(self, directory, max_traces):
+        self.directory = directory
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+
+    def save(self, request_profile):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, request_profile.id)
+        if request_profile.mode == "cprofile":
+            if request_profile.stats is None:
+                return
+            path = base + ".prof"
+            request_profile.stats.dump_stats(path)
+        else:
+            path = base + ".folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in request_profile.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        meta = dict(request_profile.meta, **{
+            "id": request_profile.id,
+            "label": request_profile.label,
+            "mode": request_profile.mode,
+            "created": request_profile.started,
+            "duration_ms": round(request_profile.duration * 1000, 1),
+            "samples": request_profile.samples,
+            "file": os.path.basename(path),
+            "bytes": os.path.getsize(path),
+        })
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            traces = self.list()
+            for meta in traces[self.max_traces:]:
+                for name in (meta["file"], meta["id"] + ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        """Trace metadata, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        traces = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    traces.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(traces, key=lambda meta: meta["created"], reverse=True)
+
+    def path_for(self, trace_id):
+        """Path of a stored trace file, or None (ids are validated before touching disk)."""
+        if not _TRACE_ID.match(trace_id or ""):
+            return None
+        for ext in (".folded", ".prof"):
+            path = os.path.join(self.directory, trace_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+store = TraceStore(PROFILE_DIR, PROFILE_MAX_TRACES)
+
+
+def authorized(headers):
+    """The trace endpoints need the profiling token; they are disabled without one."""
+    token = headers.get(TOKEN_HEADER)
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
@@ -0,0 +1,70 @@
+import base64
+
+import numpy as np
+
+ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def bytes_to_base64_in_dict(d, _encoded=None):
+    # The same bytes object (e.g. the first face) can appear more than once; encode it once
+    _encoded = {} if _encoded is None else _encoded
+    if isinstance(d, dict):
+        return {k: bytes_to_base64_in_dict(v, _encoded) for k, v in d.items()}
+    elif isinstance(d, list):
+        return [bytes_to_base64_in_dict(i, _encoded) for i in d]
+    elif isinstance(d, bytes):
+        if id(d) not in _encoded:
+            _encoded[id(d)] = base64.b64encode(d).decode('utf-8')
+        return _encoded[id(d)]
+    else:
+        return d
+
+
+def convert_ndarray_to_list(obj):
+    if isinstance(obj, dict):
+        return {k: convert_ndarray_to_list(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_ndarray_to_list(i) for i in obj]
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    else:
+        return obj
+
+
+def matched_document_face(extracted_data, face_result):
+    """Data URL of the document face the selfie matched best (the first face when unknown)."""
+    index = (face_result or {}).get("matchedFaceIndex") or 0
+    faces = extracted_data.get("faces") or []
+    if index >= len(faces) or faces[index] is extracted_data.get("face_image_bytes"):
+        return extracted_data.get("face_image_base64")
+    return f"data:image/jpeg;base64,{base64.b64encode(faces[index]).decode('utf-8')}"
+
+
+def build_verification_response(extracted_data, result, face_result, face_images,
+                                filename, doc_type, doc_number, validation):
+    """JSON body of /upload-and-verify, shared by the Flask and ASGI apps."""
+    response_data = {
+        'results': [{
+            'extracted_data': bytes_to_base64_in_dict(extracted_data),
+            'comparison_result': {
+                'verdict': result['verdict'],
+                'similarity_score': result.get('similarity_score', 0),
+                'details': result.get('details', {})
+            },
+            'face_comparison': face_result,
+            'face_images': face_images,
+            'file_name': filename,
+            'document_type': doc_type,
+            'document_number': doc_number,
+            'personal_details': extracted_data.get("personal_details", {}),
+            'validation': {
+                'status': validation[0] if validation else None,
+                'message': validation[1] if validation else "No validation performed"
+            }
+        }]
+    }
+    return convert_ndarray_to_list(response_data)
@@ -0,0 +1,470 @@
+"""
+Cache tier shared by every worker process (and, with Redis, every instance).
+
+In-process memoization is duplicated per gunicorn worker, gets a low hit
+rate and is lost on every --max-requests recycle. Extraction results,
+standardized Firestore profiles, LLM outputs and face templates are stored
+here instead, each namespace with its own TTL. SHARED_CACHE_URL selects the
+backend:
+
+- redis://[:password@]host:6379/0 -- any Redis-protocol server with EVAL,
+  through the small RESP client below (mock_redis_server.py is a local fake);
+- disk:///dev/shm/extractor-cache -- one file per entry, for the workers of
+  a single host (a tmpfs path keeps it in shared memory);
+- unset -- no shared cache.
+
+Values are pickled (only plain containers and numpy arrays are accepted
+when loading) and zlib-compressed above 1 KB. get_or_set() guards against
+stampedes: on a miss one caller across all workers takes a lock, renewed
+for as long as it computes the value, while the others wait for it; a lock
+left by a crashed worker expires after SHARED_CACHE_LOCK_TTL. A lock holds
+a random owner token and is only renewed or released by its owner. Cache errors are logged
+and treated as misses, and a backend that keeps failing is skipped for a
+while, so the cache can never fail a request.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import pickle
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import unquote, urlparse
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+SHARED_CACHE_TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", "0.25"))  # seconds per Redis round trip
+SHARED_CACHE_LOCK_TTL = float(os.getenv("SHARED_CACHE_LOCK_TTL", "30"))  # lifetime of a lock not renewed
+TTLS = {
+    "analysis": float(os.getenv("SHARED_CACHE_TTL_ANALYSIS", "3600")),
+    "llm": float(os.getenv("SHARED_CACHE_TTL_LLM", "86400")),
+    "profile": float(os.getenv("SHARED_CACHE_TTL_PROFILE", "60")),
+    "face": float(os.getenv("SHARED_CACHE_TTL_FACE", "86400")),
+}
+KEY_PREFIX = "extractor:"
+COMPRESS_ABOVE = 1024
+BACKOFF_SECONDS = 30  # a failing backend is skipped for this long
+
+# Compare-and-act on a lock's owner token, so a worker whose lock expired cannot
+# extend or delete the lock another worker took after it
+RENEW_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end return 0"
+RELEASE_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+
+logger = logging.getLogger(__name__)
+
+
+# === SERIALIZATION ===
+_RAW, _ZLIB = b"\x00", b"\x01"
+_ALLOWED_GLOBALS = {
+    ("numpy", "ndarray"), ("numpy", "dtype"),
+    ("numpy.core.multiarray", "_reconstruct"), ("numpy.core.multiarray", "scalar"),
+    ("numpy._core.multiarray", "_reconstruct"), ("numpy._core.multiarray", "scalar"),
+    ("numpy.core.numeric", "_frombuffer"), ("numpy._core.numeric", "_frombuffer"),
+}
+
+
+class _Unpickler(pickle.Unpickler):
+    """Loads plain containers and numpy arrays only, so a poisoned entry cannot run code."""
+
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in cached values")
+
+
+def dumps(value):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > COMPRESS_ABOVE:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _RAW + data
+
+
+def loads(blob):
+    data = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    return _Unpickler(io.BytesIO(data)).load()
+
+
+def hash_key(*parts):
+    """Short stable key for bytes/str parts (uploads, texts) of any size."""
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# === REDIS (RESP) BACKEND ===
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """Minimal RESP2 client: GET, SET (PX, NX), DEL and EVAL over a small pool of sockets."""
+
+    def __init__(self, url, timeout=SHARED_CACHE_TIMEOUT, pool_size=8):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(conn, "AUTH", self.password)
+        if self.db:
+            self._roundtrip(conn, "SELECT", self.db)
+        return conn
+
+    def _command(self, *args):
+        with self._lock:
+            conn = self._pool.pop() if self._pool else None
+        try:
+            conn = conn or self._connect()
+            reply = self._roundtrip(conn, *args)
+        except (OSError, RedisError):
+            if conn:
+                conn[0].close()
+            raise
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                conn = None
+        if conn:
+            conn[0].close()
+        return reply
+
+    @staticmethod
+    def _roundtrip(conn, *args):
+        sock, reader = conn
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        sock.sendall(b"".join(out))
+        return RedisBackend._read_reply(reader)
+
+    @staticmethod
+    def _read_reply(reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise OSError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = reader.read(size + 2)
+            if len(data) != size + 2:
+                raise OSError("connection closed")
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [RedisBackend._read_reply(reader) for _ in range(size)]
+        raise RedisError(f"unexpected reply {line[:20]!r}")
+
+    def get(self, key):
+        return self._command("GET", key)
+
+    def set(self, key, blob, ttl, only_new=False):
+        args = ["SET", key, blob, "PX", max(1, int(ttl * 1000))] + (["NX"] if only_new else [])
+        return self._command(*args) is not None
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+    def renew(self, key, token, ttl):
+        """Extend a lock still holding token; False when it expired or changed hands."""
+        return self._command("EVAL", RENEW_SCRIPT, 1, key, token, max(1, int(ttl * 1000))) == 1
+
+    def release(self, key, token):
+        """Delete a lock still holding token."""
+        return self._command("EVAL", RELEASE_SCRIPT, 1, key, token) == 1
+
+
+# === DISK / SHARED-MEMORY BACKEND ===
+class DiskBackend:
+    """One file per key: 8-byte expiry timestamp, then the value. Locks are O_EXCL files."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._writes = 0
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires, = struct.unpack("<d", f.read(8))
+                if expires < time.time():
+                    return None
+                return f.read()
+        except (OSError, struct.error):
+            return None
+
+    def set(self, key, blob, ttl, only_new=False):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = struct.pack("<d", time.time() + ttl) + blob
+        if only_new:
+            # Lock entries: O_EXCL creation is the atomic "set if absent". An expired
+            # one is removed and creation retried once (at worst two callers compute).
+            for attempt in range(2):
+                try:
+                    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except FileExistsError:
+                    if attempt or self.get(key) is not None:
+                        return False
+                    self.delete(key)
+                    continue
+                with os.fdopen(fd, "wb") as f:
+                    f.write(record)
+                return True
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(record)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self.purge()
+        return True
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def renew(self, key, token, ttl):
+        """Extend a lock still holding token; False when it expired or changed hands."""
+        if self.get(key) != token:
+            return False
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack("<d", time.time() + ttl) + token)
+        os.replace(tmp, path)
+        return True
+
+    def release(self, key, token):
+        """Delete a lock still holding token."""
+        if self.get(key) != token:
+            return False
+        self.delete(key)
+        return True
+
+    def purge(self):
+        """Remove expired entries."""
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    with open(path, "rb") as f:
+                        expires, = struct.unpack("<d", f.read(8))
+                    if expires < now:
+                        os.remove(path)
+                except (OSError, struct.error):
+                    pass
+
+
+# === CACHE ===
+class SharedCache:
+    """Namespaced get/set/get_or_set over a backend; every failure is a miss."""
+
+    def __init__(self, backend=None, lock_ttl=SHARED_CACHE_LOCK_TTL):
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self._down_until = 0.0
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "errors": 0, "lock_waits": 0}
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def metrics(self):
+        with self._stats_lock:
+            return dict(self.stats, backend=type(self.backend).__name__ if self.backend else None)
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _call(self, method, *args):
+        """Backend call; None (and a back-off) on failure."""
+        if self.backend is None or time.monotonic() < self._down_until:
+            return None
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            self._count("errors")
+            self._down_until = time.monotonic() + BACKOFF_SECONDS
+            logger.warning("Shared cache %s failed (%s); skipping the cache for %ds", method, e, BACKOFF_SECONDS)
+            return None
+
+    def get(self, namespace, key):
+        """(value,) on a hit, None on a miss."""
+        blob = self._call("get", KEY_PREFIX + namespace + ":" + key)
+        if blob is None:
+            return None
+        try:
+            value = loads(blob)
+        except Exception as e:
+            logger.warning("Discarding unreadable %s cache entry: %s", namespace, e)
+            return None
+        self._count("hits")
+        return (value,)
+
+    def set(self, namespace, key, value, ttl=None):
+        if self.backend is None:
+            return
+        ttl = TTLS.get(namespace, 3600) if ttl is None else ttl
+        try:
+            blob = dumps(value)
+        except Exception as e:
+            logger.warning("Value for %s cache is not serializable: %s", namespace, e)
+            return
+        # Jitter, so entries written together do not all expire together
+        if self._call("set", KEY_PREFIX + namespace + ":" + key, blob, ttl * random.uniform(0.9, 1.0)):
+            self._count("sets")
+
+    def delete(self, namespace, key):
+        self._call("delete", KEY_PREFIX + namespace + ":" + key)
+
+    def _lock(self, namespace, key):
+        """Owner token when acquired, False when another caller holds it, None when the cache is unavailable."""
+        token = os.urandom(16).hex().encode()
+        acquired = self._call("set", KEY_PREFIX + "lock:" + namespace + ":" + key, token, self.lock_ttl, True)
+        return token if acquired else acquired
+
+    def _unlock(self, namespace, key, token):
+        self._call("release", KEY_PREFIX + "lock:" + namespace + ":" + key, token)
+
+    def _keep_locked(self, namespace, key, token):
+        """
+        Renew a held lock every third of its TTL until the returned event is set,
+        so computations longer than the TTL (LLM retries, long scans) keep it.
+        """
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lock_ttl / 3):
+                if self._call("renew", KEY_PREFIX + "lock:" + namespace + ":" + key, token, self.lock_ttl) is False:
+                    logger.warning("Shared cache lock for %s expired while computing; another caller may compute too",
+                                   namespace)
+                    return
+
+        threading.Thread(target=renew, name="shared-cache-lock", daemon=True).start()
+        return stop
+
+    def get_or_set(self, namespace, key, compute, ttl=None, cache_if=None, on_hit=None):
+        """
+        Cached value (passed through on_hit, if given), or compute() stored
+        for ttl when cache_if(value) allows. On a miss one caller computes;
+        others (in any process) poll for its result while its lock is held,
+        and compute themselves once it is released without a value or expires.
+        """
+        if self.backend is None:
+            return compute()
+        on_hit = on_hit or (lambda value: value)
+        hit = self.get(namespace, key)
+        if hit is not None:
+            return on_hit(hit[0])
+        self._count("misses")
+
+        locked = self._lock(namespace, key)
+        if locked is False:
+            self._count("lock_waits")
+            delay = 0.01
+            while True:
+                time.sleep(delay)
+                hit = self.get(namespace, key)
+                if hit is not None:
+                    return on_hit(hit[0])
+                locked = self._lock(namespace, key)
+                if locked is not False:
+                    break
+                delay = min(delay * 2, 0.2)
+        renewing = self._keep_locked(namespace, key, locked) if locked else None
+        try:
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            if locked:
+                renewing.set()
+                self._unlock(namespace, key, locked)
+
+    async def aget_or_set(self, namespace, key, compute, ttl=None, cache_if=None, on_hit=None):
+        """get_or_set for coroutines: cache I/O runs in threads, waiting does not block the loop."""
+        if self.backend is None:
+            return await compute()
+        on_hit = on_hit or (lambda value: value)
+        hit = await asyncio.to_thread(self.get, namespace, key)
+        if hit is not None:
+            return on_hit(hit[0])
+        self._count("misses")
+
+        locked = await asyncio.to_thread(self._lock, namespace, key)
+        if locked is False:
+            self._count("lock_waits")
+            delay = 0.01
+            while True:
+                await asyncio.sleep(delay)
+                hit = await asyncio.to_thread(self.get, namespace, key)
+                if hit is not None:
+                    return on_hit(hit[0])
+                locked = await asyncio.to_thread(self._lock, namespace, key)
+                if locked is not False:
+                    break
+                delay = min(delay * 2, 0.2)
+        renewing = self._keep_locked(namespace, key, locked) if locked else None
+        try:
+            value = await compute()
+            if cache_if is None or cache_if(value):
+                await asyncio.to_thread(self.set, namespace, key, value, ttl)
+            return value
+        finally:
+            if locked:
+                renewing.set()
+                await asyncio.to_thread(self._unlock, namespace, key, locked)
+
+
+def backend_from_url(url):
+    """Backend for a SHARED_CACHE_URL; None when unset."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme in ("redis", "rediss"):
+        if parsed.scheme == "rediss":
+            raise ValueError("TLS Redis (rediss://) is not supported by the built-in client")
+        return RedisBackend(url)
+    if parsed.scheme == "disk":
+        return DiskBackend(parsed.path)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL scheme: {parsed.scheme}")
+
+
+cache = SharedCache(backend_from_url(SHARED_CACHE_URL))
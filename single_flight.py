@@ -0,0 +1,175 @@
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from shared_cache import dumps, loads
+
+try:
+    import fcntl  # POSIX only; cross-process locking is disabled without it
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(*parts):
+    """Build a stable hash key from bytes/str parts (file content, ext, docType...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(part)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key.
+
+    The first caller (leader) runs the function; callers arriving while it is
+    in flight wait and receive a copy of the same result, or the same exception.
+    Exceptions in retry_on belong to the leader's request alone (its deadline,
+    say): waiters that get one call again instead, in their own context.
+
+    If lock_dir is set (or SINGLE_FLIGHT_LOCK_DIR in the environment), the
+    leader also takes an flock on a per-key file so identical work in other
+    worker processes is serialized. Results accepted by cache_if (by default
+    any truthy one) are written next to the lock, in shared_cache's format
+    (loaded with its restricted unpickler), and reused by other processes
+    for result_ttl seconds.
+    """
+
+    def __init__(self, name, lock_dir=None, result_ttl=None, cache_if=bool, retry_on=()):
+        self.name = name
+        self.cache_if = cache_if
+        self.retry_on = tuple(retry_on)
+        self.lock_dir = lock_dir if lock_dir is not None else os.getenv("SINGLE_FLIGHT_LOCK_DIR")
+        self.result_ttl = float(result_ttl if result_ttl is not None
+                                else os.getenv("SINGLE_FLIGHT_RESULT_TTL", "15"))
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "cross_process_hits": 0}
+
+        if self.lock_dir and fcntl is None:
+            logger.warning("fcntl unavailable; cross-process single-flight disabled")
+            self.lock_dir = None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.stats["leaders"] += 1
+                else:
+                    call.waiters += 1
+                    self.stats["coalesced"] += 1
+            if leader:
+                break
+
+            logger.info(f"[{self.name}] waiting on in-flight call {key[:12]}")
+            call.done.wait()
+            if call.error is None:
+                return copy.deepcopy(call.result)
+            if not isinstance(call.error, self.retry_on):
+                raise call.error
+            logger.info(f"[{self.name}] in-flight call {key[:12]} failed with {call.error!r}; retrying")
+
+        try:
+            call.result = self._run_leader(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                # No caller can join once the call is out of the map, so this count is final
+                shared = call.waiters
+            call.done.set()
+        # Waiters copy call.result; the leader must not hand out that same object to be mutated
+        return copy.deepcopy(call.result) if shared else call.result
+
+    # === CROSS-PROCESS PATH ===
+    def _run_leader(self, key, fn):
+        if not self.lock_dir:
+            return fn()
+
+        base = os.path.join(self.lock_dir, f"{self.name}-{key}")
+        lock_file = self._acquire(base + ".lock")
+        try:
+            cached = self._load_result(base + ".pkl")
+            if cached is not None:
+                self.stats["cross_process_hits"] += 1
+                return cached[0]
+            result = fn()
+            if self.cache_if(result):
+                self._store_result(base + ".pkl", result)
+            return result
+        finally:
+            # Unlinked while still held: processes blocked on the old file notice
+            # in _acquire and retry on a fresh one
+            try:
+                os.remove(base + ".lock")
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    @staticmethod
+    def _acquire(path):
+        """Open and flock path, retrying when the file was unlinked while we waited for it."""
+        while True:
+            lock_file = open(path, "a+b")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _load_result(self, path):
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return (loads(f.read()),)
+        except OSError:
+            return None
+        except Exception as e:
+            logger.warning(f"[{self.name}] discarding unreadable cross-process result: {e}")
+            return None
+
+    def _store_result(self, path, result):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            blob = dumps(result)
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"[{self.name}] could not share result across processes: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -0,0 +1,88 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from request_profiler import thread_scope
+
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+class StageGraph:
+    """
+    Dependency-aware executor for the stages of one request.
+
+    Each stage is a callable that receives the results of the stages it runs
+    after, in order. A stage starts as soon as all of its dependencies have
+    finished, so independent stages overlap and the wall time approaches the
+    critical path rather than the sum of all stages. Stages run in a copy of
+    the caller's context, so the verification deadline applies inside them.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or _executor
+        self.stages = {}
+        self.timings = {}
+        self._started = None
+        self._finished = None
+
+    def stage(self, name, fn, after=()):
+        for dep in after:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self.stages[name] = (fn, tuple(after))
+        return self
+
+    def _timed(self, name, fn, args):
+        started = time.monotonic()
+        try:
+            with thread_scope():
+                return fn(*args)
+        finally:
+            self.timings[name] = (started, time.monotonic())
+
+    def run(self):
+        """Run every stage; returns {name: result}. The first stage error is re-raised."""
+        self._started = time.monotonic()
+        results, pending = {}, {}
+        waiting = dict(self.stages)
+
+        def launch_ready():
+            for name, (fn, after) in list(waiting.items()):
+                if all(dep in results for dep in after):
+                    del waiting[name]
+                    args = [results[dep] for dep in after]
+                    ctx = contextvars.copy_context()
+                    pending[self.executor.submit(ctx.run, self._timed, name, fn, args)] = name
+
+        try:
+            launch_ready()
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+                launch_ready()
+        finally:
+            for future in pending:
+                future.cancel()
+            self._finished = time.monotonic()
+        return results
+
+    def report(self):
+        """Per-stage durations plus the wall time, the serial sum and the critical path."""
+        durations = {name: end - start for name, (start, end) in self.timings.items()}
+        finish = {}
+        for name, (_, after) in self.stages.items():  # insertion order is topological
+            finish[name] = durations.get(name, 0.0) + max((finish[dep] for dep in after), default=0.0)
+
+        def ms(seconds):
+            return round(seconds * 1000, 1)
+
+        return {
+            "stages_ms": {name: ms(d) for name, d in durations.items()},
+            "wall_ms": ms((self._finished or time.monotonic()) - (self._started or time.monotonic())),
+            "serial_ms": ms(sum(durations.values())),
+            "critical_path_ms": ms(max(finish.values(), default=0.0)),
+        }
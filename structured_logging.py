@@ -0,0 +1,163 @@
+"""
+Structured, non-blocking logging.
+
+setup_logging() routes every record through a QueueHandler, so the request
+thread only stamps the correlation id, interpolates the message (and renders
+a traceback, if any) and enqueues; a QueueListener thread formats the record
+as JSON or text and writes it. Threads do not survive a fork, so a forked
+child (a gunicorn --preload worker) gets its own queue and listener. Records are
+JSON lines (LOG_FORMAT=json, the default) or plain text (LOG_FORMAT=text),
+and carry the request's correlation id.
+
+Personal data (profiles, extracted details) is only logged through
+log_payload(), which is gated on DEBUG and LOG_PAYLOADS=true and costs a
+level check otherwise.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+_listener = None
+_handler = None
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+# === CORRELATION IDS ===
+def current_request_id():
+    return _request_id.get()
+
+
+@contextmanager
+def correlation_id(value=None):
+    """Tag every record logged inside the block (and in copied contexts) with one id."""
+    token = _request_id.set(value or uuid.uuid4().hex[:16])
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+
+def bind_request_id(value=None):
+    """Set the id for the rest of the current context (e.g. a Flask request); returns it."""
+    _request_id.set(value or uuid.uuid4().hex[:16])
+    return _request_id.get()
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp the caller's correlation id; handler filters run on the calling thread, before the queue."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+# === FORMATTING ===
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking; when the queue is full the record is dropped."""
+
+    def prepare(self, record):
+        # Runs on the calling thread. The message is interpolated here because its args may
+        # change after the call returns, and the traceback is rendered because exc_info holds
+        # live frames; extra fields stay on the record for the formatter on the listener thread.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class _TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = {k: v for k, v in record.__dict__.items() if k not in _STANDARD_ATTRS and not k.startswith("_")}
+        return f"{line} {json.dumps(extra, default=str)}" if extra else line
+
+
+def setup_logging(level=None):
+    """Install the queue-based handler on the root logger (idempotent)."""
+    global _handler
+    if _handler is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+
+    _handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level or LOG_LEVEL)
+
+    _start_listener(output)
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=lambda: _start_listener(output, fresh_queue=True))
+
+
+def _start_listener(output, fresh_queue=False):
+    """Start the thread that drains the queue; after a fork the parent's queue (and its lock) is left behind."""
+    global _listener
+    if fresh_queue:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+# === PAYLOADS ===
+def log_payload(logger, label, payload, level=logging.DEBUG):
+    """
+    Log a PII-bearing payload (profile, extracted details) only when explicitly
+    enabled; otherwise this is a flag check and nothing is formatted.
+    """
+    if LOG_PAYLOADS and logger.isEnabledFor(level):
+        logger.log(level, "%s", label, extra={"payload": payload})
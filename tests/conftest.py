@@ -0,0 +1,24 @@
+import argparse
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_llm_server  # noqa: E402
+
+
+@pytest.fixture
+def mock_llm():
+    """URL of an in-process mock_llm_server (no latency, fast chunks)."""
+    mock_llm_server.Handler.options = argparse.Namespace(
+        latency=0.0, fail_rate=0.0, fail_status=503, chunk_delay=0.0, extra_fields=20)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), mock_llm_server.Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,52 @@
+import random
+import string
+
+import pytest
+
+from batch_validator import FORMATS, validate_batch
+from doc_validator import DocumentValidator
+
+SAMPLES = ["234123412346", "ABCPS1234K", "A1234567", "MH12AB1234567", "MH12A1234567", "CND1234567890123",
+           "ABC1234567", "IC123456789012"]
+
+
+def random_number(rng):
+    if rng.random() < 0.5:
+        # a valid-looking number with a few characters changed
+        chars = list(rng.choice(SAMPLES))
+        for _ in range(rng.randint(0, 2)):
+            chars[rng.randrange(len(chars))] = rng.choice(string.ascii_letters + string.digits)
+        number = "".join(chars)
+    else:
+        number = "".join(rng.choice(string.ascii_letters + string.digits + " -")
+                         for _ in range(rng.randint(1, 18)))
+    edge = rng.random()
+    if edge < 0.05:
+        number += "\n"
+    elif edge < 0.08:
+        number = number.lower()
+    elif edge < 0.1:
+        number += "é"
+    return number
+
+
+@pytest.mark.parametrize("doc_type", sorted(FORMATS))
+def test_batch_matches_document_validator(doc_type):
+    rng = random.Random(doc_type)
+    numbers = [random_number(rng) for _ in range(5000)]
+    result = validate_batch(doc_type, numbers)
+
+    for number, status, message in zip(numbers, result.status, result.message):
+        assert (status, message) == DocumentValidator.validate(doc_type, number), repr(number)
+
+
+def test_mixed_doc_types_and_missing_numbers():
+    result = validate_batch(["aadhaar", "PAN", "ration_card", "aadhaar"], ["234123412346", "abcps1234k", "x", None])
+
+    assert list(result.status) == ["valid", "valid", "unsupported", "invalid"]
+    assert list(result.reason) == ["ok", "ok", "unsupported_type", "missing"]
+
+
+def test_doc_type_count_must_match():
+    with pytest.raises(ValueError):
+        validate_batch(["pan"], ["ABCPS1234K", "ABCPS1234K"])
@@ -0,0 +1,36 @@
+import json
+
+from bulk_extract import completed_ids
+
+
+def write(path, records, tail=b""):
+    path.write_bytes(b"".join(json.dumps(r).encode() + b"\n" for r in records) + tail)
+
+
+def test_resume_drops_failed_records_and_a_torn_last_line(tmp_path):
+    out = tmp_path / "results.jsonl"
+    write(out, [{"id": "a", "ok": 1}, {"id": "b", "error": "timeout"}, {"id": "c", "ok": 1}], tail=b'{"id": "d", "o')
+
+    assert completed_ids(str(out)) == {"a", "c"}
+    assert [json.loads(line)["id"] for line in out.read_text().splitlines()] == ["a", "c"]
+
+
+def test_retried_failure_leaves_one_record_per_id(tmp_path):
+    out = tmp_path / "results.jsonl"
+    write(out, [{"id": "a", "error": "timeout"}])
+    completed_ids(str(out))
+    with open(out, "a") as f:  # the re-run appends the retry's result
+        f.write(json.dumps({"id": "a", "ok": 1}) + "\n")
+
+    assert completed_ids(str(out)) == {"a"}
+    assert out.read_text().count('"id": "a"') == 1
+
+
+def test_clean_output_is_left_alone(tmp_path):
+    out = tmp_path / "results.jsonl"
+    write(out, [{"id": "a", "ok": 1}])
+    before = out.stat().st_mtime_ns
+
+    assert completed_ids(str(out)) == {"a"}
+    assert out.stat().st_mtime_ns == before
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_comparator import compare_faces
+from face_matcher import face_descriptors, match_face, score_candidates
+
+
+def texture(seed):
+    rng = np.random.default_rng(seed)
+    noise = (rng.random((300, 300)) * 255).astype(np.uint8)
+    return cv2.GaussianBlur(cv2.resize(noise, (1000, 1000), interpolation=cv2.INTER_CUBIC), (3, 3), 0)
+
+
+def crops(image, count, seed):
+    rng = np.random.default_rng(seed)
+    return [cv2.cvtColor(image[y:y + 250, x:x + 250], cv2.COLOR_GRAY2BGR)
+            for y, x in rng.integers(0, 750, (count, 2))]
+
+
+# Seeds 13, 16, 18 and 21 have equidistant neighbours, which BFMatcher breaks by index
+@pytest.mark.parametrize("seed", [0, 1, 2, 13, 16, 18, 21])
+def test_scores_match_compare_faces(seed):
+    selfie, *faces = crops(texture(seed), 5, seed)
+    scores, _ = score_candidates(face_descriptors(selfie), [face_descriptors(face) for face in faces])
+
+    for face, score in zip(faces, scores):
+        assert score * 100 == pytest.approx(compare_faces(face, selfie)["faceSimilarity"], abs=0.01)
+
+
+def test_best_document_face_wins_and_unusable_faces_are_skipped():
+    selfie = crops(texture(0), 1, 0)[0]
+    emblem = crops(texture(1), 1, 1)[0]
+    blank = np.zeros((250, 250, 3), np.uint8)
+
+    result = match_face(selfie, [emblem, blank, selfie.copy()])
+
+    assert result["photoMatch"] == "success" and result["matchedFaceIndex"] == 2
+    assert result["faceSimilarity"] == compare_faces(selfie.copy(), selfie)["faceSimilarity"]
+    assert [c["faceSimilarity"] is None for c in result["candidates"]] == [False, True, False]
@@ -0,0 +1,60 @@
+import fitz
+
+from document_context import DocumentContext
+from extract_agent import ExtractionAgent
+from field_detector import missing_fields
+from pipeline_planner import StagePlan
+
+AADHAAR = ["name", "father_name", "date_of_birth", "aadhar_number"]
+PAGES = [
+    "GOVERNMENT OF INDIA\nName: Ravi Kumar\nS/O Suresh Kumar\nDOB: 05/08/1999",
+    "2341 2341 2346\nVID : 9123 4567 8912 3456",
+    "Unique Identification Authority of India",
+]
+
+
+def test_fields_are_found_by_label_or_value_shape():
+    assert missing_fields(PAGES[0], AADHAAR) == ["aadhar_number"]
+    assert missing_fields("\n".join(PAGES[:2]), AADHAAR) == []
+    assert missing_fields("Born 05-08-1999, mobile 9876543210", ["date_of_birth", "contact"]) == []
+
+
+def test_relation_labels_do_not_count_as_the_name():
+    assert missing_fields("Father's Name: Suresh Kumar", ["name", "father_name"]) == ["name"]
+    assert missing_fields("Mother Name: Lakshmi", ["name", "mother_name"]) == ["name"]
+
+
+def test_unknown_fields_are_always_missing():
+    assert missing_fields("anything at all", ["blood_group", "name"]) == ["blood_group", "name"]
+
+
+def scanned_pdf(pages):
+    """PDF of pages without a text layer, as a scanner produces."""
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=200, height=280)
+    return doc.tobytes()
+
+
+def analyze(monkeypatch, fields, pages=3):
+    agent = ExtractionAgent()
+    texts = iter(PAGES)
+    monkeypatch.setattr(agent.processor, "ocr_image", lambda img_np, gray=None: next(texts))
+    plan = StagePlan("aadhaar", faces=False, signatures=False, llm_fields=fields)
+    return agent.analyze(DocumentContext(scanned_pdf(pages), "aadhaar.pdf"), plan)
+
+
+def test_ocr_stops_once_every_required_field_is_found(monkeypatch):
+    result, text = analyze(monkeypatch, AADHAAR)
+
+    assert result["pipeline_stats"]["pages_ocr"] == 2
+    assert result["pipeline_stats"]["pages_skipped"] == 1
+    assert text.strip() == "\n".join(PAGES[:2])
+
+
+def test_all_pages_are_read_when_a_field_is_never_found(monkeypatch):
+    result, text = analyze(monkeypatch, AADHAAR + ["address"])
+
+    assert result["pipeline_stats"]["pages_ocr"] == 3
+    assert result["pipeline_stats"]["pages_skipped"] == 0
+    assert text.strip() == "\n".join(PAGES)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import Overloaded, _AsyncLimiter, _Limiter
+from llm_backends import (Backend, BackendPool, CircuitBreaker, DeadlineExceeded, RetryableError,
+                          verification_deadline)
+
+
+def make_pool(*names, **kwargs):
+    backends = [Backend(name, f"http://{name}.invalid", "model", api_key_env=None) for name in names]
+    return BackendPool(backends, **kwargs)
+
+
+def test_breaker_opens_after_threshold_and_probes_once_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_slow_primary_is_hedged_to_the_next_backend():
+    pool = make_pool("slow", "fast", hedge_min=0.05, hedge_max=0.05)
+
+    def send(backend, timeout):
+        time.sleep(1.0 if backend.name == "slow" else 0.01)
+        return backend.name
+
+    started = time.monotonic()
+    result, info = pool.call(send)
+    assert result == "fast"
+    assert info["hedged"] and info["attempts"] == 2
+    assert time.monotonic() - started < 0.5
+
+
+def test_retryable_failure_moves_to_another_backend():
+    pool = make_pool("broken", "working")
+
+    def send(backend, timeout):
+        if backend.name == "broken":
+            raise RetryableError("503")
+        return backend.name
+
+    result, info = pool.call(send)
+    assert result == "working"
+
+
+def test_open_circuits_are_skipped():
+    pool = make_pool("only")
+    for _ in range(pool.backends[0].breaker.failure_threshold):
+        pool.backends[0].breaker.record_failure()
+    with pytest.raises(RetryableError):
+        pool.call(lambda backend, timeout: "unreachable")
+
+
+def test_deadline_bounds_the_call():
+    pool = make_pool("slow", hedge_min=5, hedge_max=5)
+    with verification_deadline(0.1), pytest.raises(DeadlineExceeded):
+        pool.call(lambda backend, timeout: time.sleep(1.0))
+
+
+def test_spent_deadline_is_reported_as_such():
+    pool = make_pool("only")
+    with verification_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            pool.call(lambda backend, timeout: "unreachable")
+
+
+def test_retries_cycle_over_the_usable_backends(monkeypatch):
+    monkeypatch.delenv("UNSET_TEST_KEY", raising=False)
+    pool = BackendPool([Backend("no-key", "http://no-key.invalid", "model", api_key_env="UNSET_TEST_KEY"),
+                        Backend("flaky", "http://flaky.invalid", "model", api_key_env=None)], max_attempts=3)
+    calls = []
+
+    def send(backend, timeout):
+        calls.append(backend.name)
+        if len(calls) < 3:
+            raise RetryableError("503")
+        return "ok"
+
+    assert pool.call(send)[0] == "ok"
+    assert calls == ["flaky"] * 3
+
+
+def test_each_attempt_holds_its_own_slot():
+    limiter = _Limiter("llm", capacity=1, max_waiting=4, wait_budget=2.0)
+    pool = make_pool("slow", "fast", hedge_min=0.05, hedge_max=0.05)
+    sent = []
+
+    def send(backend, timeout):
+        sent.append(backend.name)
+        time.sleep(0.3)
+        return backend.name
+
+    result, info = pool.call(send, slot=limiter.slot)
+    time.sleep(0.1)  # the hedge gets the slot once the primary is done
+    assert result == "slow" and info["hedged"]
+    assert sent == ["slow"]  # the hedge waited for a slot and was dropped, never sent
+    assert limiter.metrics()["active"] == 0
+
+
+def test_overloaded_slot_is_not_a_backend_failure():
+    limiter = _Limiter("llm", capacity=1, max_waiting=0, wait_budget=0.1)
+    pool = make_pool("only")
+    held = limiter.acquire()
+    try:
+        with pytest.raises(Overloaded):
+            pool.call(lambda backend, timeout: "unreachable", slot=limiter.slot)
+    finally:
+        limiter.release(held)
+    assert pool.backends[0].breaker.failures == 0
+
+
+def test_async_hedge_waiting_for_a_slot_is_cancelled():
+    limiter = _AsyncLimiter("llm", capacity=1, max_waiting=4, wait_budget=2.0)
+    pool = make_pool("slow", "fast", hedge_min=0.05, hedge_max=0.05)
+    sent = []
+
+    async def send(backend, timeout):
+        sent.append(backend.name)
+        await asyncio.sleep(0.3)
+        return backend.name
+
+    async def run():
+        result = await pool.acall(send, slot=limiter.slot)
+        await asyncio.sleep(0.1)
+        return result
+
+    result, info = asyncio.run(run())
+    assert result == "slow" and info["hedged"]
+    assert sent == ["slow"]
+    assert limiter.metrics()["active"] == 0
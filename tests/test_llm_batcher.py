@@ -0,0 +1,97 @@
+import threading
+import time
+
+from llm_batcher import MicroBatcher
+
+
+class Provider:
+    """Fake LLM: one result per document; the "hold" document blocks until released."""
+
+    def __init__(self, skip=(), fail=False):
+        self.skip = skip
+        self.fail = fail
+        self.release = threading.Event()
+        self.batches, self.singles = [], []
+
+    def run_single(self, doc_text, doc_type, fields):
+        self.singles.append(doc_text)
+        if doc_text == "hold":
+            self.release.wait(5)
+        return {"text": doc_text}
+
+    def run_batch(self, documents):
+        self.batches.append([doc_text for doc_text, _, _ in documents])
+        if self.fail:
+            raise RuntimeError("rejected")
+        return [None if doc_text in self.skip else {"text": doc_text} for doc_text, _, _ in documents]
+
+
+def submit_while_busy(batcher, provider, texts):
+    """Submit `texts` one after another while a single call holds the batcher busy."""
+    results = {}
+
+    def submit(text):
+        results[text] = batcher.submit(text)
+
+    threads = [threading.Thread(target=submit, args=(text,)) for text in ["hold"] + texts]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    provider.release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_idle_call_is_sent_alone_without_waiting():
+    provider = Provider()
+    batcher = MicroBatcher(provider.run_batch, provider.run_single, wait_ms=1000)
+
+    started = time.monotonic()
+    assert batcher.submit("a") == {"text": "a"}
+    assert time.monotonic() - started < 0.5
+    assert provider.singles == ["a"] and provider.batches == []
+
+
+def test_callers_arriving_during_a_call_share_one_batch():
+    provider = Provider()
+    batcher = MicroBatcher(provider.run_batch, provider.run_single, max_docs=3, wait_ms=1000)
+
+    results = submit_while_busy(batcher, provider, ["a", "b", "c"])
+
+    assert provider.batches == [["a", "b", "c"]]
+    assert provider.singles == ["hold"]
+    assert results == {text: {"text": text} for text in ["hold", "a", "b", "c"]}
+    assert batcher.metrics()["in_flight"] == 0
+
+
+def test_batch_is_sent_when_the_next_document_does_not_fit():
+    provider = Provider()
+    batcher = MicroBatcher(provider.run_batch, provider.run_single, max_docs=4, max_chars=2, wait_ms=1000)
+
+    results = submit_while_busy(batcher, provider, ["a", "b", "c", "d"])
+
+    assert provider.batches == [["a", "b"], ["c", "d"]]
+    assert results["d"] == {"text": "d"}
+
+
+def test_documents_the_batch_misses_are_retried_alone():
+    provider = Provider(skip=("b",))
+    batcher = MicroBatcher(provider.run_batch, provider.run_single, max_docs=3, wait_ms=1000)
+
+    results = submit_while_busy(batcher, provider, ["a", "b", "c"])
+
+    assert provider.singles == ["hold", "b"]
+    assert results["b"] == {"text": "b"}
+    assert batcher.stats["fallbacks"] == 1 and batcher.stats["batched_docs"] == 2
+
+
+def test_failed_batch_falls_back_to_single_calls():
+    provider = Provider(fail=True)
+    batcher = MicroBatcher(provider.run_batch, provider.run_single, max_docs=2, wait_ms=1000)
+
+    results = submit_while_busy(batcher, provider, ["a", "b"])
+
+    assert sorted(provider.singles) == ["a", "b", "hold"]
+    assert results == {text: {"text": text} for text in ["hold", "a", "b"]}
+    assert batcher.metrics()["in_flight"] == 0
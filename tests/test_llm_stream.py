@@ -0,0 +1,47 @@
+import json
+
+import requests
+
+from llm_stream import IncrementalFieldParser, read_stream
+from prompts import response_format_for
+
+
+def test_parser_reports_fields_as_they_complete():
+    text = json.dumps({"name": 'Ravi "R" Kumar', "father_name": None, "extra": "x", "date_of_birth": "1990"})
+    parser = IncrementalFieldParser(["name", "father_name", "date_of_birth"])
+    completed = []
+    for char in text:
+        completed += parser.feed(char)
+
+    assert completed == ["name", "father_name", "date_of_birth"]
+    assert parser.values == {"name": 'Ravi "R" Kumar', "father_name": None, "date_of_birth": "1990"}
+    assert parser.complete
+
+
+def test_parser_waits_for_the_value_to_be_closed():
+    parser = IncrementalFieldParser(["name"])
+    assert parser.feed('{"name": "Ravi') == []
+    assert parser.feed(' Kumar"') == []
+    assert parser.feed(", ") == ["name"]
+
+
+def stream(url, fields):
+    body = {"model": "mock", "stream": True, "messages": [], "response_format": response_format_for(fields)}
+    return requests.post(url, json=body, stream=True, timeout=10)
+
+
+def test_stream_closes_once_every_field_is_read(mock_llm):
+    fields = ["name", "date_of_birth"]
+    raw, usage, stats = read_stream(stream(mock_llm, fields), fields, "pan")
+
+    assert json.loads(raw) == {"name": "sample name", "date_of_birth": "sample date of birth"}
+    assert stats["early_stop"]
+    assert usage == {}  # the usage event comes after the fields
+
+
+def test_stream_is_read_to_the_end_when_a_field_never_arrives(mock_llm):
+    raw, usage, stats = read_stream(stream(mock_llm, ["name"]), ["name", "missing"], "pan")
+
+    assert not stats["early_stop"]
+    assert json.loads(raw)["name"] == "sample name"
+    assert usage["completion_tokens"] > 0
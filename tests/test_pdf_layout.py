@@ -0,0 +1,80 @@
+import fitz
+import pytest
+
+from extract_agent import ExtractionAgent
+from pdf_layout import extract_fields
+
+ALL_FIELDS = ["name", "father_name", "date_of_birth", "address", "aadhar_number", "college", "caste", "category"]
+
+
+def make_pdf(lines, fontsize=11):
+    """PDF with one text line per (x, y, text)."""
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for x, y, text in lines:
+        page.insert_text((x, y), text, fontsize=fontsize)
+    return fitz.open("pdf", doc.tobytes())
+
+
+def test_certificate_with_colon_labels():
+    doc = make_pdf([
+        (180, 60, "GOVERNMENT OF KARNATAKA"),
+        (200, 80, "CASTE CERTIFICATE"),
+        (50, 130, "Name of the Applicant : Ravi Kumar"),
+        (50, 150, "Father's Name : Suresh Kumar"),
+        (50, 170, "Date of Birth : 05/08/1999"),
+        (50, 190, "Address : 12 MG Road, Jayanagar"),
+        (99.5, 204, "Bengaluru 560041"),
+        (50, 240, "Caste : Vokkaliga"),
+        (300, 240, "Category : III A"),
+    ])
+    assert extract_fields(doc, ALL_FIELDS) == {
+        "name": "Ravi Kumar",
+        "father_name": "Suresh Kumar",
+        "date_of_birth": "1999-08-05",
+        "address": "12 MG Road, Jayanagar, Bengaluru 560041",
+        "caste": "Vokkaliga",
+        "category": "III A",
+    }
+
+
+@pytest.mark.parametrize("label", ["Name of the Student", "Name of Student", "Name of the Candidate",
+                                   "Student's Name", "Name of Applicant"])
+def test_name_label_variants(label):
+    doc = make_pdf([(50, 100, f"{label}: Ravi Kumar")])
+    assert extract_fields(doc, ["name"]) == {"name": "Ravi Kumar"}
+
+
+def test_name_is_not_read_from_the_start_of_a_longer_label():
+    doc = make_pdf([
+        (50, 100, "Name of Institution: Govt First Grade College"),
+        (50, 120, "Name of the Programme: B.Com"),
+    ])
+    assert extract_fields(doc, ["name", "college"]) == {"college": "Govt First Grade College"}
+
+
+def test_value_printed_below_its_label():
+    doc = make_pdf([
+        (50, 100, "Name"), (300, 100, "Date of Birth"),
+        (50, 114, "Ravi Kumar"), (300, 114, "05-08-1999"),
+    ])
+    assert extract_fields(doc, ["name", "date_of_birth"]) == {"name": "Ravi Kumar", "date_of_birth": "1999-08-05"}
+
+
+def test_relation_prefix_without_separator_and_unlabelled_aadhaar():
+    doc = make_pdf([
+        (50, 100, "Ravi Kumar"),
+        (50, 114, "S/O Suresh Kumar"),
+        (50, 200, "2341 2341 2346"),
+        (50, 220, "1234 5678 9012"),
+    ])
+    assert extract_fields(doc, ["father_name", "aadhar_number"]) == {
+        "father_name": "Suresh Kumar", "aadhar_number": "234123412346"}
+
+
+def test_llm_values_are_not_replaced_by_layout_values():
+    result = {}
+    details = {"name": "Ravi Kumar", "father_name": None, "college": None, "_llm": None}
+    ExtractionAgent.apply_personal_details(result, details, {"name": "of", "father_name": "Suresh Kumar"})
+
+    assert result["personal_details"] == {"name": "Ravi Kumar", "father_name": "Suresh Kumar", "college": None}
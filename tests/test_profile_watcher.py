@@ -0,0 +1,55 @@
+from compare_agent import DocumentComparator
+from profile_watcher import ProfileWatcher
+from verification_store import VerificationStore
+
+EXTRACTED = {"personal_details": {"name": "Ravi Kumar", "father_name": "Suresh Kumar",
+                                  "date_of_birth": "01/02/1990", "aadhar_number": "2341 2341 2346"}}
+PROFILE = {"name": "Ravi Kumar", "father_name": "Anil Sharma", "date_of_birth": "01/02/1990",
+           "aadhar_number": "234123412346"}
+
+
+def edited(**changes):
+    return dict(PROFILE, **changes)
+
+
+def test_changed_fields_are_the_edited_ones():
+    previous = DocumentComparator(PROFILE, EXTRACTED, "aadhaar").compare_fields()
+    comparator = DocumentComparator(edited(father_name="Suresh Kumar"), EXTRACTED, "aadhaar")
+
+    assert comparator.changed_fields(previous) == ["father_name"]
+    assert DocumentComparator(PROFILE, EXTRACTED, "aadhaar").changed_fields(previous) == []
+    # a field the previous result never scored counts as changed
+    assert comparator.changed_fields({"details": {}}) == list(PROFILE)
+
+
+def test_recompare_matches_a_full_compare_and_rescores_only_changed_fields(monkeypatch):
+    previous = DocumentComparator(PROFILE, EXTRACTED, "aadhaar").compare_fields()
+    comparator = DocumentComparator(edited(father_name="Suresh Kumar"), EXTRACTED, "aadhaar")
+    full = comparator.compare_fields()
+
+    scored = []
+    compare_field = DocumentComparator.compare_field
+    monkeypatch.setattr(DocumentComparator, "compare_field",
+                        lambda self, field: scored.append(field) or compare_field(self, field))
+    result = comparator.recompare(previous)
+
+    assert scored == ["father_name"]
+    assert result == full
+    assert result["matched_fields"] == previous["matched_fields"] + 1
+
+
+def test_reverify_updates_stored_documents_whose_fields_changed(tmp_path):
+    store = VerificationStore(str(tmp_path / "verifications.db"))
+    previous = DocumentComparator(PROFILE, EXTRACTED, "aadhaar").compare_fields()
+    verification_id = store.save("uid", "a" * 64, dict(EXTRACTED), previous, None, None,
+                                 "aadhaar.jpg", "aadhaar", "234123412346", ("valid", "ok"))
+    watcher = ProfileWatcher(store=store, debounce=0)
+
+    assert watcher.reverify("uid", PROFILE) == []
+    [result] = watcher.reverify("uid", edited(father_name="Suresh Kumar"))
+
+    record = store.get("uid", "aadhaar")
+    assert record["id"] == verification_id and record["updated"]
+    assert record["similarity"] == result["similarity_score"] > previous["similarity_score"]
+    assert record["report"]["recomparisons"][0]["fields"] == ["father_name"]
+    assert watcher.stats["updated"] == 1 and watcher.stats["fields_rescored"] == 1
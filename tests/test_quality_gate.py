@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from calibrate_quality import DEGRADATIONS, assess, base_images
+from document_context import DocumentContext
+from document_reader import DocumentProcessor, PoorImageQuality
+from extract_agent import ExtractionAgent
+
+SEEDS = range(1)
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return DocumentProcessor()
+
+
+@pytest.mark.parametrize("degradation", sorted(DEGRADATIONS))
+def test_usable_photos_pass_and_hopeless_ones_are_rejected_for_their_defect(processor, degradation):
+    degrade, metric = DEGRADATIONS[degradation]
+    for seed in SEEDS:
+        rng = np.random.default_rng(seed)
+        for kind, image in base_images(rng):
+            report = assess(processor, degrade(image, rng))
+            if metric is None:
+                assert report["ok"], (kind, report)
+            else:
+                assert not report["ok"] and report["reasons"], (kind, report)
+
+
+def test_rejected_photo_is_never_decoded_at_ocr_resolution():
+    _, card = base_images(np.random.default_rng(0))[0]
+    data = cv2.imencode(".jpg", cv2.GaussianBlur(card, (0, 0), 7))[1].tobytes()
+    ctx = DocumentContext(data, "blurry.jpg")
+
+    with pytest.raises(PoorImageQuality) as rejected:
+        ExtractionAgent().analyze(ctx)
+
+    assert any("blurry" in reason for reason in rejected.value.reasons)
+    assert ctx.counters["decodes"] == 1 and "image" not in ctx._cache
@@ -0,0 +1,118 @@
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import shared_cache
+from shared_cache import KEY_PREFIX, DiskBackend, SharedCache, dumps, loads
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KEY = KEY_PREFIX + "lock:llm:key"
+
+
+def test_values_round_trip_with_numpy_arrays():
+    value = {"faces": [np.arange(2000, dtype=np.float32)], "score": np.float64(0.5), "text": "x" * 5000}
+    loaded = loads(dumps(value))
+
+    assert np.array_equal(loaded["faces"][0], value["faces"][0])
+    assert loaded["score"] == 0.5 and loaded["text"] == value["text"]
+    # protocol 5 out-of-band buffers load too
+    array = np.arange(10)
+    assert np.array_equal(loads(b"\x00" + pickle.dumps(array, protocol=5)), array)
+
+
+def test_unpickler_rejects_other_globals():
+    with pytest.raises(pickle.UnpicklingError):
+        loads(b"\x00" + pickle.dumps(os.system))
+
+
+def test_get_or_set_computes_once_across_callers(tmp_path):
+    runs = []
+
+    def compute():
+        runs.append(1)
+        time.sleep(0.3)
+        return {"value": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        SharedCache(DiskBackend(str(tmp_path))).get_or_set("llm", "key", compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(runs) == 1
+    assert results == [{"value": 1}] * 4
+
+
+@pytest.mark.parametrize("backend", ["disk", "redis"])
+def test_lock_is_renewed_while_computing(backend, tmp_path, request):
+    backend = DiskBackend(str(tmp_path)) if backend == "disk" else request.getfixturevalue("redis_backend")
+    runs = []
+
+    def compute():
+        runs.append(1)
+        time.sleep(0.6)
+        return 1
+
+    def caller():
+        SharedCache(backend, lock_ttl=0.2).get_or_set("llm", "slow", compute)
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1
+
+
+def test_cache_if_and_unavailable_backend(tmp_path):
+    cache = SharedCache(DiskBackend(str(tmp_path)))
+    assert cache.get_or_set("llm", "error", lambda: {"error": "x"}, cache_if=lambda v: "error" not in v)
+    assert cache.get("llm", "error") is None
+
+    down = SharedCache(shared_cache.RedisBackend("redis://127.0.0.1:1/0", timeout=0.05))
+    assert down.get_or_set("llm", "key", lambda: 42) == 42
+    assert down.metrics()["errors"] == 1
+
+
+@pytest.fixture
+def redis_backend():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "mock_redis_server.py", "--port", str(port)], cwd=ROOT,
+                              stdout=subprocess.PIPE)
+    try:
+        server.stdout.readline()  # "Mock Redis listening on ..."
+        yield shared_cache.RedisBackend(f"redis://127.0.0.1:{port}/0")
+    finally:
+        server.kill()
+        server.wait()
+
+
+@pytest.mark.parametrize("backend", ["disk", "redis"])
+def test_expired_lock_cannot_be_renewed_or_released_by_its_old_owner(backend, tmp_path, request):
+    backend = DiskBackend(str(tmp_path)) if backend == "disk" else request.getfixturevalue("redis_backend")
+    first, second = SharedCache(backend, lock_ttl=0.1), SharedCache(backend, lock_ttl=5)
+
+    stale = first._lock("llm", "key")
+    assert stale and second._lock("llm", "key") is False
+    time.sleep(0.15)
+    current = second._lock("llm", "key")
+    assert current and current != stale
+
+    assert backend.renew(KEY, stale, 5) is False
+    first._unlock("llm", "key", stale)
+    assert first._lock("llm", "key") is False  # still held by second
+    assert backend.renew(KEY, current, 5) is True
+    second._unlock("llm", "key", current)
+    assert first._lock("llm", "key")
@@ -0,0 +1,101 @@
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+class Late(Exception):
+    pass
+
+
+def run_together(callers):
+    threads = [threading.Thread(target=caller) for caller in callers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_share_one_run_and_get_private_copies():
+    flight = SingleFlight("test")
+    runs, results = [], []
+
+    def work():
+        runs.append(1)
+        time.sleep(0.2)
+        return {"value": [1]}
+
+    run_together([lambda: results.append(flight.do("key", work))] * 5)
+
+    assert len(runs) == 1
+    assert results == [{"value": [1]}] * 5
+    assert len({id(result) for result in results}) == 5
+    assert flight.stats["coalesced"] == 4
+
+
+def test_leader_error_reaches_waiters():
+    flight = SingleFlight("test")
+    errors = []
+
+    def work():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    def caller():
+        try:
+            flight.do("key", work)
+        except ValueError as e:
+            errors.append(e)
+
+    run_together([caller] * 3)
+    assert len(errors) == 3
+
+
+def test_waiters_retry_on_the_leaders_own_errors():
+    flight = SingleFlight("test", retry_on=(Late,))
+    outcomes = []
+    first = threading.Event()
+
+    def work():
+        if not first.is_set():
+            first.set()
+            time.sleep(0.2)
+            raise Late()
+        return "done"
+
+    def caller(delay):
+        time.sleep(delay)
+        try:
+            outcomes.append(flight.do("key", work))
+        except Late:
+            outcomes.append("late")
+
+    run_together([lambda: caller(0), lambda: caller(0.05), lambda: caller(0.05)])
+    assert sorted(outcomes) == ["done", "done", "late"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="cross-process locking needs fcntl")
+def test_cross_process_cache_skips_failures_and_removes_locks(tmp_path):
+    flight = SingleFlight("test", lock_dir=str(tmp_path), result_ttl=60)
+
+    assert flight.do("key", lambda: None) is None
+    assert os.listdir(tmp_path) == []
+
+    assert flight.do("key", lambda: {"ok": 1}) == {"ok": 1}
+    assert flight.do("key", lambda: {"ok": 2}) == {"ok": 1}
+    assert flight.stats["cross_process_hits"] == 1
+    assert os.listdir(tmp_path) == ["test-key.pkl"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="cross-process locking needs fcntl")
+def test_cross_process_result_is_loaded_with_the_restricted_unpickler(tmp_path):
+    flight = SingleFlight("test", lock_dir=str(tmp_path), result_ttl=60)
+    with open(tmp_path / "test-key.pkl", "wb") as f:
+        f.write(b"\x00" + pickle.dumps(os.getpid))
+
+    assert flight.do("key", lambda: {"fresh": True}) == {"fresh": True}
+    assert flight.stats["cross_process_hits"] == 0
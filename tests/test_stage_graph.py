@@ -0,0 +1,47 @@
+import contextvars
+import time
+
+import pytest
+
+from stage_graph import StageGraph
+
+
+def test_stages_receive_their_dependencies_results():
+    graph = (StageGraph()
+             .stage("a", lambda: 2)
+             .stage("b", lambda: 3)
+             .stage("sum", lambda a, b: a + b, after=("a", "b")))
+    assert graph.run() == {"a": 2, "b": 3, "sum": 5}
+
+
+def test_independent_stages_overlap():
+    def slow():
+        time.sleep(0.2)
+
+    graph = StageGraph().stage("a", slow).stage("b", slow).stage("c", lambda a, b: None, after=("a", "b"))
+    graph.run()
+    report = graph.report()
+
+    assert report["wall_ms"] < 350
+    assert report["serial_ms"] >= 400
+    assert report["critical_path_ms"] < 350
+
+
+def test_stage_error_is_reraised():
+    def fail():
+        raise ValueError("boom")
+
+    graph = StageGraph().stage("fail", fail).stage("after", lambda _: None, after=("fail",))
+    with pytest.raises(ValueError):
+        graph.run()
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        StageGraph().stage("a", lambda x: x, after=("missing",))
+
+
+def test_stages_see_the_callers_context():
+    var = contextvars.ContextVar("var", default=None)
+    var.set("caller")
+    assert StageGraph().stage("read", var.get).run() == {"read": "caller"}
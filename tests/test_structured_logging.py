@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import logging, os
+import structured_logging
+structured_logging.setup_logging()
+logging.getLogger("test").info("before fork")
+pid = os.fork()
+logging.getLogger("test").info("in child" if pid == 0 else "in parent")
+if pid:
+    os.waitpid(pid, 0)
+"""
+
+
+def run(script, **env):
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=30,
+                            env={**os.environ, "LOG_FORMAT": "json", **env})
+    assert result.returncode == 0, result.stderr
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def test_forked_child_gets_its_own_listener():
+    messages = [record["msg"] for record in run(SCRIPT)]
+    assert sorted(messages) == ["before fork", "in child", "in parent"]
+
+
+def test_records_carry_the_correlation_id_and_extra_fields():
+    records = run("""
+import logging
+import structured_logging
+structured_logging.setup_logging()
+with structured_logging.correlation_id("abc"):
+    logging.getLogger("test").info("hello %s", "there", extra={"stage": "ocr"})
+""")
+    assert records == [{**records[0], "msg": "hello there", "request_id": "abc", "stage": "ocr"}]
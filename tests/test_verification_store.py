@@ -0,0 +1,105 @@
+import time
+
+import cv2
+import numpy as np
+
+import verification_store
+from verification_store import TOKEN_HEADER, VerificationStore, authorized
+
+HASH_A, HASH_B = "a" * 64, "b" * 64
+FACE = cv2.imencode(".jpg", np.full((8, 8, 3), 128, np.uint8))[1].tobytes()
+SIGNATURE = np.zeros((4, 6), np.uint8)
+
+
+def extraction(name="Ravi Kumar"):
+    return {"personal_details": {"name": name}, "faces": [FACE], "signatures": [SIGNATURE],
+            "face_image_bytes": FACE, "face_image_base64": "data:image/jpeg;base64,...",
+            "pipeline_stats": {"pages_ocr": 1}}
+
+
+def save(store, doc_hash=HASH_A, doc_type="aadhaar", uid="uid", data=None, verdict="correct"):
+    return store.save(uid, doc_hash, data or extraction(), {"verdict": verdict, "similarity_score": 80.0},
+                      None, {"uploaded_face": "data:image/png;base64,iVBORw0K"}, "doc.jpg", doc_type,
+                      "234123412346", ("valid", "ok"))
+
+
+def test_saved_verification_is_read_back_without_binaries_in_the_report(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"))
+    verification_id = save(store)
+
+    record = store.get("uid", HASH_A)
+    assert record["id"] == verification_id == store.get("uid", "aadhaar")["id"]
+    assert record["report"]["extracted_data"]["faces"] == ["face_0.jpg"]
+    assert record["report"]["extracted_data"]["signatures"] == ["signature_0.png"]
+    assert "face_image_bytes" not in record["report"]["extracted_data"]
+    assert {a["name"] for a in record["artifacts"]} == {"face_0.jpg", "signature_0.png", "uploaded_face.png"}
+    assert store.artifact("uid", HASH_A, "face_0.jpg") == ("image/jpeg", FACE)
+    assert store.get("other", HASH_A) is None and store.artifact("uid", HASH_B, "face_0.jpg") is None
+
+
+def test_list_latest_per_document_and_prior_faces(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"))
+    first = save(store, HASH_A)
+    time.sleep(0.01)
+    second = save(store, HASH_B, doc_type="pan", verdict="incorrect")
+    time.sleep(0.01)
+    third = save(store, HASH_A)
+
+    assert [row["id"] for row in store.list("uid")] == [third, second, first]
+    assert [row["id"] for row in store.list("uid", doc_type="pan")] == [second]
+    assert {row["id"] for row in store.latest_per_document("uid")} == {third, second}
+    assert [face["verification_id"] for face in store.prior_faces("uid", exclude_hash=HASH_A)] == [second]
+    assert store.prior_faces("uid", exclude_hash=HASH_A)[0]["image"] == FACE
+
+
+def test_update_comparison_keeps_the_previous_verdict(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"))
+    verification_id = save(store, verdict="incorrect")
+
+    assert store.update_comparison(verification_id, {"verdict": "correct", "similarity_score": 90.0}, ["name"])
+    assert not store.update_comparison(verification_id + 1, {"verdict": "correct"}, ["name"])
+    record = store.get("uid", HASH_A)
+    assert record["verdict"] == "correct" and record["similarity"] == 90.0
+    assert record["report"]["recomparisons"][0]["previous_verdict"] == "incorrect"
+
+
+def test_find_extraction_rebuilds_the_agents_output(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"))
+    verification_id = save(store)
+
+    reused = store.find_extraction("uid", HASH_A, "aadhaar")
+    assert reused["faces"] == [FACE] and reused["face_image_bytes"] == FACE
+    assert np.array_equal(reused["signatures"][0], SIGNATURE)
+    assert reused["pipeline_stats"]["reused_verification"] == verification_id
+    assert store.find_extraction("uid", HASH_A, "pan") is None
+    assert store.find_extraction("other", HASH_A, "aadhaar") is None
+
+
+def test_failed_or_expired_extractions_are_not_reused(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"), reuse_seconds=0.05)
+    save(store, HASH_B, data=dict(extraction(), personal_details={}))
+    save(store, HASH_A)
+
+    assert store.find_extraction("uid", HASH_B, "aadhaar") is None
+    time.sleep(0.1)
+    assert store.find_extraction("uid", HASH_A, "aadhaar") is None
+
+
+def test_purge_removes_old_verifications_and_their_artifacts(tmp_path):
+    store = VerificationStore(str(tmp_path / "v.db"), retention_days=1)
+    save(store)
+
+    assert store.purge(time.time() + 3600) == 0
+    assert store.purge(time.time() + 2 * 86400) == 1
+    assert store.get("uid", HASH_A) is None
+    assert store._conn().execute("SELECT COUNT(*) FROM artifacts").fetchone()[0] == 0
+
+
+def test_authorized_needs_the_configured_token(monkeypatch):
+    monkeypatch.setattr(verification_store, "VERIFICATION_TOKEN", None)
+    assert not authorized({TOKEN_HEADER: "secret"})
+
+    monkeypatch.setattr(verification_store, "VERIFICATION_TOKEN", "secret")
+    assert authorized({TOKEN_HEADER: "secret"})
+    assert not authorized({TOKEN_HEADER: "wrong"})
+    assert not authorized({})
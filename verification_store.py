@@ -0,0 +1,314 @@
+"""
+Local store of verification results and extraction artifacts.
+
+Every completed verification is kept in an SQLite database (VERIFICATION_DB):
+one indexed row per verification (uid, document hash, docType, time) holding
+the extraction output and comparison report as JSON, plus the face and
+signature crops as blobs. Rows older than VERIFICATION_RETENTION_DAYS are
+purged as new ones are written.
+
+The store serves GET /verifications/<uid>[/<doc>] to requests carrying
+X-Verification-Token matching VERIFICATION_TOKEN (the routes are disabled
+without one), and a re-upload of the same document by the same uid within
+VERIFICATION_REUSE_SECONDS reuses the stored extraction instead of running
+OCR and the LLM again.
+"""
+import base64
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import cv2
+import numpy as np
+
+VERIFICATION_DB = os.getenv("VERIFICATION_DB", "verifications.db")
+VERIFICATION_RETENTION_DAYS = float(os.getenv("VERIFICATION_RETENTION_DAYS", "30"))
+VERIFICATION_REUSE_SECONDS = float(os.getenv("VERIFICATION_REUSE_SECONDS", "86400"))
+VERIFICATION_TOKEN = os.getenv("VERIFICATION_TOKEN")
+PURGE_INTERVAL = 3600  # seconds between retention sweeps
+
+TOKEN_HEADER = "X-Verification-Token"
+
+_DOC_HASH = re.compile(r"^[0-9a-f]{64}$")
+_BINARY_FIELDS = ("faces", "signatures", "face_image_bytes", "face_image_base64")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verifications (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL,
+    doc_hash TEXT NOT NULL,
+    doc_type TEXT,
+    doc_number TEXT,
+    file_name TEXT,
+    verdict TEXT,
+    similarity REAL,
+    created REAL NOT NULL,
+    updated REAL,
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verifications_uid ON verifications (uid, created);
+CREATE INDEX IF NOT EXISTS verifications_doc ON verifications (doc_hash, doc_type, created);
+CREATE INDEX IF NOT EXISTS verifications_type ON verifications (doc_type, created);
+CREATE INDEX IF NOT EXISTS verifications_created ON verifications (created);
+CREATE TABLE IF NOT EXISTS artifacts (
+    verification_id INTEGER NOT NULL REFERENCES verifications (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (verification_id, name)
+) WITHOUT ROWID;
+"""
+
+SUMMARY_COLUMNS = "id, uid, doc_hash, doc_type, doc_number, file_name, verdict, similarity, created, updated"
+
+
+def _split_artifacts(extracted_data, face_images):
+    """Extraction output without binaries -> (report fields, {name: (content_type, bytes)})."""
+    extraction = {k: v for k, v in extracted_data.items() if k not in _BINARY_FIELDS}
+    artifacts = {}
+
+    extraction["faces"] = []
+    for i, face in enumerate(extracted_data.get("faces") or []):
+        name = f"face_{i}.jpg"
+        artifacts[name] = ("image/jpeg", face)
+        extraction["faces"].append(name)
+
+    extraction["signatures"] = []
+    for i, signature in enumerate(extracted_data.get("signatures") or []):
+        success, buffer = cv2.imencode(".png", signature)
+        if success:
+            name = f"signature_{i}.png"
+            artifacts[name] = ("image/png", buffer.tobytes())
+            extraction["signatures"].append(name)
+
+    uploaded = (face_images or {}).get("uploaded_face")
+    if uploaded and uploaded.startswith("data:"):
+        header, _, payload = uploaded.partition(",")
+        content_type = header[5:].split(";")[0]
+        artifacts["uploaded_face." + content_type.rsplit("/", 1)[-1]] = (content_type, base64.b64decode(payload))
+    return extraction, artifacts
+
+
+class VerificationStore:
+    def __init__(self, path, retention_days=VERIFICATION_RETENTION_DAYS, reuse_seconds=VERIFICATION_REUSE_SECONDS):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.reuse_seconds = reuse_seconds
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    def _conn(self):
+        """One connection per thread (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    columns = {row["name"] for row in conn.execute("PRAGMA table_info(verifications)")}
+                    if "updated" not in columns:  # databases created before re-verification existed
+                        conn.execute("ALTER TABLE verifications ADD COLUMN updated REAL")
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    # === WRITE ===
+    def save(self, uid, doc_hash, extracted_data, result, face_result, face_images,
+             filename, doc_type, doc_number, validation):
+        """Store one verification (same inputs as build_verification_response); returns its id or None."""
+        extraction, artifacts = _split_artifacts(extracted_data, face_images)
+        report = {
+            "extracted_data": extraction,
+            "comparison_result": result,
+            "face_comparison": face_result,
+            "validation": {
+                "status": validation[0] if validation else None,
+                "message": validation[1] if validation else "No validation performed",
+            },
+        }
+        try:
+            conn = self._conn()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO verifications (uid, doc_hash, doc_type, doc_number, file_name, verdict,"
+                    " similarity, created, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (uid, doc_hash, doc_type, doc_number, filename, result.get("verdict"),
+                     float(result.get("similarity_score", 0)), time.time(), json.dumps(report, default=_jsonable)))
+                conn.executemany(
+                    "INSERT INTO artifacts (verification_id, name, content_type, data) VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, name, content_type, data) for name, (content_type, data) in artifacts.items()])
+            self._maybe_purge()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logger.error("Could not store verification for %s: %s", uid, e)
+            return None
+
+    def update_comparison(self, verification_id, result, fields):
+        """Replace a stored comparison after a profile edit; `fields` are the ones rescored."""
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT verdict, report FROM verifications WHERE id = ?", (verification_id,)).fetchone()
+            if row is None:
+                return False
+            now = time.time()
+            report = json.loads(row["report"])
+            report["comparison_result"] = result
+            report.setdefault("recomparisons", []).append(
+                {"at": now, "fields": sorted(fields), "previous_verdict": row["verdict"]})
+            conn.execute(
+                "UPDATE verifications SET verdict = ?, similarity = ?, updated = ?, report = ? WHERE id = ?",
+                (result.get("verdict"), float(result.get("similarity_score", 0)), now,
+                 json.dumps(report, default=_jsonable), verification_id))
+        return True
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge(now)
+
+    def purge(self, now=None):
+        """Delete verifications (and their artifacts) past the retention period; returns the count."""
+        cutoff = (now or time.time()) - self.retention
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM verifications WHERE created < ?", (cutoff,)).rowcount
+        if deleted:
+            logger.info("Purged %d verifications older than %.0f days", deleted, self.retention / 86400)
+        return deleted
+
+    # === READ ===
+    def list(self, uid, doc_type=None, limit=20, before=None):
+        """Summaries of a user's verifications, newest first."""
+        query = f"SELECT {SUMMARY_COLUMNS} FROM verifications WHERE uid = ?"
+        params = [uid]
+        if doc_type:
+            query += " AND doc_type = ?"
+            params.append(doc_type)
+        if before:
+            query += " AND created < ?"
+            params.append(before)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._conn().execute(query, params)]
+
+    def latest_per_document(self, uid):
+        """The newest verification of each (document, docType) a user has, with reports."""
+        latest = {}
+        for row in self._conn().execute(
+                f"SELECT {SUMMARY_COLUMNS}, report FROM verifications WHERE uid = ? ORDER BY created DESC", (uid,)):
+            key = (row["doc_hash"], row["doc_type"])
+            if key not in latest:
+                latest[key] = dict(row, report=json.loads(row["report"]))
+        return list(latest.values())
+
+    def prior_faces(self, uid, exclude_hash=None, limit=8):
+        """
+        Face crops of a user's other documents (the newest verification of each),
+        as [{"verification_id", "doc_type", "name", "image": JPEG bytes}], newest first.
+        """
+        try:
+            rows = self._conn().execute(
+                "SELECT v.id, v.doc_type, a.name, a.data FROM artifacts a JOIN verifications v"
+                " ON v.id = a.verification_id WHERE v.id IN ("
+                "  SELECT MAX(id) FROM verifications WHERE uid = ? AND doc_hash IS NOT ? GROUP BY doc_hash)"
+                " AND a.name LIKE 'face\\_%' ESCAPE '\\' ORDER BY v.created DESC, a.name LIMIT ?",
+                (uid, exclude_hash, limit)).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Could not read prior faces for %s: %s", uid, e)
+            return []
+        return [{"verification_id": row["id"], "doc_type": row["doc_type"], "name": row["name"],
+                 "image": row["data"]} for row in rows]
+
+    @staticmethod
+    def _doc_column(doc):
+        """Documents are addressed by their SHA-256 or by docType (the latest of that type)."""
+        return "doc_hash" if _DOC_HASH.match(doc) else "doc_type"
+
+    def get(self, uid, doc):
+        """Latest stored verification of a document with its report and artifact list, or None."""
+        row = self._conn().execute(
+            f"SELECT {SUMMARY_COLUMNS}, report FROM verifications WHERE uid = ? AND {self._doc_column(doc)} = ?"
+            " ORDER BY created DESC LIMIT 1", (uid, doc)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["report"] = json.loads(record["report"])
+        record["artifacts"] = [dict(a) for a in self._conn().execute(
+            "SELECT name, content_type, length(data) AS bytes FROM artifacts WHERE verification_id = ?",
+            (row["id"],))]
+        return record
+
+    def artifact(self, uid, doc, name):
+        """(content_type, bytes) of one artifact of the latest verification of a document, or None."""
+        row = self._conn().execute(
+            "SELECT content_type, data FROM artifacts WHERE name = ? AND verification_id = ("
+            f" SELECT id FROM verifications WHERE uid = ? AND {self._doc_column(doc)} = ?"
+            " ORDER BY created DESC LIMIT 1)", (name, uid, doc)).fetchone()
+        return (row["content_type"], row["data"]) if row else None
+
+    def find_extraction(self, uid, doc_hash, doc_type):
+        """
+        A recent successful extraction of the same bytes by the same user, rebuilt
+        into the shape ExtractionAgent produces (face bytes, signature arrays); None
+        when there is nothing to reuse.
+        """
+        if self.reuse_seconds <= 0:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT id, report FROM verifications WHERE uid = ? AND doc_hash = ? AND doc_type IS ?"
+                " AND created >= ? ORDER BY created DESC LIMIT 1",
+                (uid, doc_hash, doc_type, time.time() - self.reuse_seconds)).fetchone()
+            if row is None:
+                return None
+            extraction = json.loads(row["report"])["extracted_data"]
+            if not extraction.get("personal_details"):
+                return None  # the LLM step failed or found nothing last time; run it again
+            blobs = {a["name"]: a["data"] for a in self._conn().execute(
+                "SELECT name, data FROM artifacts WHERE verification_id = ?", (row["id"],))}
+        except sqlite3.Error as e:
+            logger.error("Could not read stored extraction for %s: %s", uid, e)
+            return None
+
+        extraction["faces"] = [blobs[name] for name in extraction["faces"] if name in blobs]
+        extraction["signatures"] = [
+            cv2.imdecode(np.frombuffer(blobs[name], np.uint8), cv2.IMREAD_UNCHANGED)
+            for name in extraction["signatures"] if name in blobs]
+        extraction["face_image_bytes"] = extraction["faces"][0] if extraction["faces"] else None
+        extraction["face_image_base64"] = (
+            "data:image/jpeg;base64," + base64.b64encode(extraction["face_image_bytes"]).decode("utf-8")
+            if extraction["face_image_bytes"] else None)
+        extraction["llm_usage"] = None  # no LLM call is made for this request
+        extraction["pipeline_stats"] = dict(extraction.get("pipeline_stats") or {}, reused_verification=row["id"])
+        return extraction
+
+
+def authorized(headers):
+    """The /verifications endpoints need the verification token; they are disabled without one."""
+    token = headers.get(TOKEN_HEADER)
+    return bool(VERIFICATION_TOKEN and token and hmac.compare_digest(token, VERIFICATION_TOKEN))
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+store = VerificationStore(VERIFICATION_DB)